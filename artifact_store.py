@@ -0,0 +1,208 @@
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from pddl_parser import PDDLParseError, SExpr, parse_sexprs, parse_typed_list, sexpr_to_str
+from tracing import annotate, span
+
+DEFAULT_STORE_PATH = ".cache/artifacts"
+
+# Sezioni e connettivi in cui l'ordine degli elementi non cambia il significato
+_UNORDERED = {":predicates", ":init", ":requirements", "and", "or"}
+_TYPED_LISTS = {":types", ":constants", ":objects"}
+
+
+def _canonical(expr: SExpr) -> SExpr:
+    if isinstance(expr, str):
+        return expr.lower()
+    items = [_canonical(e) for e in expr]
+    head = items[0] if items and isinstance(items[0], str) else None
+    if head in _TYPED_LISTS:
+        typed = sorted(f"{p.name} - {p.type}" for p in parse_typed_list(items[1:]))
+        return [head] + typed
+    if head in _UNORDERED:
+        return [head] + sorted(items[1:], key=sexpr_to_str)
+    if head == "define":
+        # (define (domain|problem nome) sezioni...): le sezioni (azioni comprese) in ordine fisso
+        return items[:2] + sorted(items[2:], key=sexpr_to_str)
+    return items
+
+
+def canonical_pddl(text: str) -> str:
+    """
+    Forma canonica del PDDL: senza commenti e spazi superflui, tutto minuscolo (il PDDL non
+    distingue maiuscole) e con predicati, azioni, init, oggetti e congiunzioni in ordine.
+    Se il testo non è analizzabile si normalizzano solo gli spazi.
+    """
+    try:
+        forms = parse_sexprs(text)
+    except PDDLParseError:
+        return " ".join(text.split()).lower()
+    return "\n".join(sexpr_to_str(_canonical(f)) for f in forms)
+
+
+def artifact_key(domain_text: str, problem_text: str) -> str:
+    payload = canonical_pddl(domain_text) + "\0" + canonical_pddl(problem_text)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class StoredArtifact:
+    key: str
+    path: Path
+    status: str                       # "solved", "unsolvable" o "failed" (timeout o errore: da ripianificare)
+    plan: Optional[List[str]] = None
+    stats: Dict[str, float] = field(default_factory=dict)
+
+    @property
+    def conclusive(self) -> bool:
+        """Esito riutilizzabile al posto di una nuova pianificazione."""
+        return self.status in ("solved", "unsolvable")
+
+
+class ArtifactStore:
+    """
+    Archivio indirizzato per contenuto delle coppie dominio/problema: ogni coppia, dopo la
+    canonicalizzazione, ha una cartella <root>/<hash[:2]>/<hash>/ con domain.pddl, problem.pddl,
+    plan.txt, lore.json e meta.json (esito e statistiche del planner). Un indice SQLite tiene
+    dimensioni e ultimo accesso; oltre max_bytes si eliminano le voci usate meno di recente.
+    """
+
+    def __init__(self, root: str = DEFAULT_STORE_PATH, max_bytes: int = 200 * 2 ** 20):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.root / "index.sqlite"), check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS artifacts (
+                key TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        self._conn.commit()
+
+    def path(self, key: str) -> Path:
+        return self.root / key[:2] / key
+
+    def get(self, domain_text: str, problem_text: str) -> Optional[StoredArtifact]:
+        key = artifact_key(domain_text, problem_text)
+        with span("store.lookup", "store"):
+            artifact = self._load(key)
+            annotate(hit=artifact is not None and artifact.conclusive)
+        return artifact
+
+    def _load(self, key: str) -> Optional[StoredArtifact]:
+        with self._lock:
+            row = self._conn.execute("SELECT status FROM artifacts WHERE key = ?", (key,)).fetchone()
+            meta_path = self.path(key) / "meta.json"
+            if row is None or not meta_path.exists():
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE artifacts SET last_access = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            self.hits += 1
+        meta = json.loads(meta_path.read_text(encoding="utf-8"))
+        return StoredArtifact(key, self.path(key), meta["status"], meta.get("plan"), meta.get("stats", {}))
+
+    def put(self, domain_text: str, problem_text: str, plan: Optional[List[str]], status: Optional[str] = None,
+            stats: Optional[Dict[str, float]] = None, lore=None) -> StoredArtifact:
+        """Salva (o aggiorna) la coppia con il suo esito; status di default: solved se c'è un piano."""
+        key = artifact_key(domain_text, problem_text)
+        status = status or ("solved" if plan else "failed")
+        meta = {"key": key, "status": status, "plan": plan, "stats": stats or {}, "created": time.time()}
+        files = {"domain.pddl": domain_text, "problem.pddl": problem_text,
+                 "meta.json": json.dumps(meta, indent=2, ensure_ascii=False)}
+        if plan:
+            files["plan.txt"] = "\n".join(plan)
+        if lore is not None:
+            files["lore.json"] = json.dumps(lore.dict(), indent=2, ensure_ascii=False)
+
+        target = self.path(key)
+        with span("store.put", "store", status=status):
+            target.parent.mkdir(parents=True, exist_ok=True)
+            # Scrittura in una cartella temporanea e rename: nessun lettore vede voci a metà
+            tmp = Path(tempfile.mkdtemp(prefix=f".{key[:8]}_", dir=target.parent))
+            for name, content in files.items():
+                (tmp / name).write_text(content, encoding="utf-8")
+            size = sum(len(c.encode("utf-8")) for c in files.values())
+            with self._lock:
+                if target.exists():
+                    shutil.rmtree(target, ignore_errors=True)
+                try:
+                    os.replace(tmp, target)
+                except OSError:
+                    # Un altro processo ha appena scritto la stessa voce: stesso contenuto
+                    shutil.rmtree(tmp, ignore_errors=True)
+                now = time.time()
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO artifacts (key, status, size, created, last_access) VALUES (?, ?, ?, ?, ?)",
+                    (key, status, size, now, now),
+                )
+                self._evict()
+                self._conn.commit()
+        return StoredArtifact(key, target, status, plan, stats or {})
+
+    def _evict(self):
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM artifacts").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._conn.execute("SELECT key, size FROM artifacts ORDER BY last_access ASC").fetchall():
+            if total <= self.max_bytes:
+                break
+            self._remove(key)
+            total -= size
+
+    def _remove(self, key: str):
+        shutil.rmtree(self.path(key), ignore_errors=True)
+        self._conn.execute("DELETE FROM artifacts WHERE key = ?", (key,))
+        try:
+            self.path(key).parent.rmdir()  # solo se vuota
+        except OSError:
+            pass
+
+    def clear(self):
+        with self._lock:
+            for (key,) in self._conn.execute("SELECT key FROM artifacts").fetchall():
+                self._remove(key)
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM artifacts").fetchone()
+        return {"hits": self.hits, "misses": self.misses, "entries": entries, "bytes": size}
+
+
+_stores: Dict[Tuple[str, int], ArtifactStore] = {}
+_stores_lock = threading.Lock()
+
+
+def default_artifact_store() -> Optional[ArtifactStore]:
+    """
+    Archivio condiviso dal processo (ARTIFACT_STORE, ARTIFACT_STORE_MAX_MB), così contatori
+    e connessione SQLite restano gli stessi tra le chiamate; ARTIFACT_STORE=0 lo disattiva.
+    """
+    root = os.getenv("ARTIFACT_STORE", DEFAULT_STORE_PATH)
+    if root.lower() in ("0", "false", "no", ""):
+        return None
+    key = (root, int(float(os.getenv("ARTIFACT_STORE_MAX_MB", "200")) * 2 ** 20))
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = _stores[key] = ArtifactStore(*key)
+        return store
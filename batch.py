@@ -0,0 +1,218 @@
+import argparse
+import glob
+import hashlib
+import json
+import os
+import time
+import traceback
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from utils import load_env
+load_env()  # prima degli altri import: alcuni moduli leggono l'ambiente all'import
+
+from interactive_story_generator import InteractiveStoryGenerator
+from llm_interface import LLMInterface
+from lore import LoreDocument
+from tracing import get_tracer, span
+
+
+def _glob_root(pattern: str) -> Path:
+    """Parte fissa di un pattern glob (le componenti prima del primo carattere speciale)."""
+    static = []
+    for part in Path(pattern).parts:
+        if glob.has_magic(part):
+            break
+        static.append(part)
+    return Path(*static) if static else Path(".")
+
+
+def iter_lore_files(inputs: Iterable[str]) -> List[Tuple[Path, str]]:
+    """
+    Espande cartelle e pattern glob nei file YAML di lore, senza duplicati e in ordine stabile.
+    Ogni file è accompagnato dal suo percorso relativo alla radice dell'input (la cartella
+    indicata o la parte fissa del pattern), che non dipende da dove si trova il checkout.
+    """
+    found: Dict[str, Tuple[Path, str]] = {}
+    for entry in inputs:
+        path = Path(entry)
+        if path.is_dir():
+            root = path
+            matches = [p for ext in ("*.yaml", "*.yml") for p in path.rglob(ext)]
+        else:
+            root = _glob_root(entry)
+            matches = [Path(p) for p in glob.glob(entry, recursive=True)]
+        for m in matches:
+            relative = m.relative_to(root) if m != root else Path(m.name)
+            found.setdefault(str(m.resolve()), (m, relative.as_posix()))
+    return [found[k] for k in sorted(found)]
+
+
+def lore_id(path: Path, relative: Optional[str] = None) -> str:
+    """
+    Identificativo della lore: percorso relativo alla radice dell'input più un hash del
+    contenuto, così resta lo stesso spostando il checkout e cambia se la lore viene modificata.
+    Se il file non si può leggere l'hash è del solo percorso: l'errore emerge poi nel caricamento
+    della lore, come record "error", invece di interrompere il batch.
+    """
+    relative = relative or path.name
+    try:
+        content = path.read_bytes()
+    except OSError:
+        content = b""
+    digest = hashlib.sha1(relative.encode("utf-8") + b"\0" + content).hexdigest()[:8]
+    return f"{path.stem}_{digest}"
+
+
+def load_completed(jsonl_path: str) -> Set[str]:
+    """Lore già elaborate in un run precedente (gli errori vengono ritentati)."""
+    done = set()
+    if not os.path.exists(jsonl_path):
+        return done
+    with open(jsonl_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # riga troncata da un run interrotto
+            if record.get("status") in ("success", "failed"):
+                done.add(record["lore_id"])
+    return done
+
+
+def run_one(path: Path, output_root: str, max_iter: int = 3, llm: Optional[LLMInterface] = None,
+            candidates: Optional[int] = None, relative: Optional[str] = None,
+            stream: Optional[bool] = None) -> dict:
+    """
+    Esegue generate → validate → plan su una lore, senza mai chiedere input;
+    relative è il percorso della lore relativo alla radice dell'input (vedi lore_id).
+    """
+    record = {"lore": str(path), "lore_id": lore_id(path, relative)}
+    return run_lore(lambda: LoreDocument.from_yaml(str(path)), record, output_root, max_iter, llm, candidates,
+                    stream)
+
+
+def run_lore(load_lore: Callable[[], LoreDocument], record: dict, output_root: str, max_iter: int = 3,
+             llm: Optional[LLMInterface] = None, candidates: Optional[int] = None,
+             stream: Optional[bool] = None) -> dict:
+    """
+    Come run_one per una lore qualsiasi (anche non letta da file): record deve contenere
+    lore_id, che dà il nome alla cartella degli artefatti; viene completato e restituito.
+    stream=True usa la generazione in streaming (None: variabile PDDL_STREAM).
+    """
+    record.update({"status": "error", "timings": {}})
+    output_dir = os.path.join(output_root, record["lore_id"])
+    record["output_dir"] = output_dir
+    start = time.perf_counter()
+    try:
+        with span("batch.lore", lore_id=record["lore_id"]):
+            generator = InteractiveStoryGenerator(llm=llm, output_dir=output_dir, candidates=candidates,
+                                                  stream=stream)
+            generator.current_lore = load_lore()
+
+            t = time.perf_counter()
+            generator.generate_initial_pddl()
+            record["timings"]["generate"] = round(time.perf_counter() - t, 3)
+
+            t = time.perf_counter()
+            success = generator.validate_and_refine(max_iter=max_iter, interactive=False)
+            record["timings"]["validate_and_plan"] = round(time.perf_counter() - t, 3)
+
+            record["status"] = "success" if success else "failed"
+            record["plan_length"] = len(generator.current_plan) if generator.current_plan else None
+            if generator.plan_report is not None:
+                record["lore_violations"] = generator.plan_report.lore_violations
+            record["artifacts"] = {
+                name: os.path.join(output_dir, name)
+                for name in ("domain.pddl", "problem.pddl", "plan.txt")
+                if os.path.exists(os.path.join(output_dir, name))
+            }
+    except Exception as e:
+        record["error"] = f"{type(e).__name__}: {e}"
+        record["traceback"] = traceback.format_exc()
+    record["timings"]["total"] = round(time.perf_counter() - start, 3)
+    return record
+
+
+def _run_one_in_process(path: Path, output_root: str, max_iter: int, candidates: Optional[int],
+                        relative: Optional[str], stream: Optional[bool]) -> dict:
+    # Nei worker di processo ogni processo crea il proprio client LLM e ha il proprio tracer:
+    # la trace di ogni lore viene salvata accanto ai suoi artefatti
+    tracer = get_tracer()
+    tracer.reset()
+    record = run_one(path, output_root, max_iter, candidates=candidates, relative=relative, stream=stream)
+    tracer.export(record["output_dir"])
+    return record
+
+
+def run_batch(inputs: Iterable[str], output_jsonl: str, output_root: str = "output/batch",
+              workers: int = 4, use_processes: bool = False, resume: bool = True,
+              max_iter: int = 3, candidates: Optional[int] = None,
+              stream: Optional[bool] = None) -> Dict[str, int]:
+    """
+    Elabora un insieme di lore in parallelo (concorrenza limitata a workers) e scrive
+    un record JSONL per lore appena termina. Con resume=True salta quelle già completate.
+    """
+    files = iter_lore_files(inputs)
+    done = load_completed(output_jsonl) if resume else set()
+    todo = [(p, relative) for p, relative in files if lore_id(p, relative) not in done]
+    print(f"📚 {len(files)} lore trovate, {len(files) - len(todo)} già completate, {len(todo)} da elaborare")
+
+    counts = {"success": 0, "failed": 0, "error": 0}
+    if not todo:
+        return counts
+
+    os.makedirs(os.path.dirname(os.path.abspath(output_jsonl)), exist_ok=True)
+    executor: Executor
+    if use_processes:
+        executor = ProcessPoolExecutor(max_workers=workers)
+        submit = lambda p, relative: executor.submit(_run_one_in_process, p, output_root, max_iter, candidates,
+                                                     relative, stream)
+    else:
+        # Nei thread il client LLM (sessione HTTP e cache) è condiviso
+        shared_llm = InteractiveStoryGenerator().llm
+        executor = ThreadPoolExecutor(max_workers=workers)
+        submit = lambda p, relative: executor.submit(run_one, p, output_root, max_iter, shared_llm, candidates,
+                                                     relative, stream)
+
+    with executor, open(output_jsonl, "a" if resume else "w", encoding="utf-8") as out:
+        futures = {submit(p, relative): p for p, relative in todo}
+        for future in as_completed(futures):
+            record = future.result()
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+            counts[record["status"]] += 1
+            print(f"🧾 {record['lore_id']}: {record['status']} ({record['timings'].get('total')}s)")
+
+    if not use_processes:
+        limiter = getattr(shared_llm, "limiter", None)
+        if limiter is not None:
+            print(limiter.format_stats())
+        tracer = get_tracer()
+        tracer.print_summary()
+        tracer.export(output_root)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generazione batch di storie PDDL da file YAML di lore")
+    parser.add_argument("inputs", nargs="+", help="Cartelle o pattern glob di file YAML")
+    parser.add_argument("-o", "--output", default="output/batch/results.jsonl", help="File JSONL dei risultati")
+    parser.add_argument("--output-root", default="output/batch", help="Cartella degli artefatti per lore")
+    parser.add_argument("-j", "--workers", type=int, default=4)
+    parser.add_argument("--processes", action="store_true", help="Usa un pool di processi invece che di thread")
+    parser.add_argument("--no-resume", action="store_true", help="Rielabora anche le lore già completate")
+    parser.add_argument("--max-iter", type=int, default=3)
+    parser.add_argument("--candidates", type=int, help="Varianti di azioni e goal da generare e valutare (default PDDL_CANDIDATES)")
+    parser.add_argument("--stream", action="store_true", default=None,
+                        help="Prima generazione in streaming: predicati, azioni e goal in parallelo (default PDDL_STREAM)")
+    args = parser.parse_args()
+
+    counts = run_batch(args.inputs, args.output, args.output_root, args.workers,
+                       args.processes, not args.no_resume, args.max_iter, args.candidates, args.stream)
+    print(f"\n📊 Successi: {counts['success']}  Falliti: {counts['failed']}  Errori: {counts['error']}")
+
+
+if __name__ == '__main__':
+    main()
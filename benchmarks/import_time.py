@@ -0,0 +1,85 @@
+"""
+Tempo di import dei punti di ingresso (main, batch, ...) misurato in interpreti nuovi con
+python -X importtime: conta per i worker batch e per le invocazioni brevi.
+
+    python benchmarks/import_time.py                      # main e batch, 5 ripetizioni
+    python benchmarks/import_time.py --budget-ms 400      # esce con errore se si supera il budget
+    python benchmarks/import_time.py --top 20             # moduli più pesanti
+
+Oltre al tempo verifica che i moduli pesanti caricati solo su richiesta (langchain, requests,
+yaml) non vengano importati all'avvio: se succede lo script esce con codice 1.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ENTRY_POINTS = ("main", "batch")
+LAZY_MODULES = ("langchain", "langchain_core", "requests", "yaml")
+
+_PROBE = "import sys, {module}; print(' '.join(sorted(m for m in sys.modules if '.' not in m)))"
+
+
+def import_profile(module: str) -> Tuple[float, Dict[str, float], List[str]]:
+    """Un import in un interprete nuovo: (totale ms, cumulativo ms per modulo, moduli caricati)."""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", _PROBE.format(module=module)],
+                          cwd=ROOT, capture_output=True, text=True, check=True,
+                          env={**os.environ, "PYTHONDONTWRITEBYTECODE": "1"})
+    cumulative = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cum, name = line[len("import time:"):].split("|")
+        cumulative[name.strip()] = int(cum) / 1000
+    return cumulative.get(module, 0.0), cumulative, proc.stdout.split()
+
+
+def bench_imports(module: str, repeat: int) -> dict:
+    totals, profiles, loaded = [], [], set()
+    for _ in range(repeat):
+        total, cumulative, modules = import_profile(module)
+        totals.append(total)
+        profiles.append(cumulative)
+        loaded.update(modules)
+    # Per ogni modulo la mediana tra le ripetizioni (la prima può pagare la compilazione dei .pyc)
+    names = set().union(*profiles)
+    per_module = {n: statistics.median(p.get(n, 0.0) for p in profiles) for n in names}
+    return {
+        "median_ms": statistics.median(totals),
+        "min_ms": min(totals),
+        "modules": per_module,
+        "eager_heavy": sorted(m for m in LAZY_MODULES if m in loaded),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del tempo di import dei punti di ingresso")
+    parser.add_argument("modules", nargs="*", default=list(ENTRY_POINTS))
+    parser.add_argument("-n", "--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="Moduli più pesanti da mostrare")
+    parser.add_argument("--budget-ms", type=float, help="Tempo mediano massimo consentito per modulo")
+    args = parser.parse_args()
+
+    failed = False
+    for module in args.modules:
+        r = bench_imports(module, args.repeat)
+        print(f"⏱️ import {module}: mediana {r['median_ms']:.1f} ms (min {r['min_ms']:.1f} ms)")
+        heaviest = sorted(r["modules"].items(), key=lambda kv: kv[1], reverse=True)
+        for name, ms in [kv for kv in heaviest if kv[0] not in (module, "site")][:args.top]:
+            print(f"    {ms:>8.1f} ms  {name}")
+        if r["eager_heavy"]:
+            print(f"❌ {module} importa all'avvio moduli che dovrebbero essere caricati su richiesta: "
+                  f"{', '.join(r['eager_heavy'])}")
+            failed = True
+        if args.budget_ms is not None and r["median_ms"] > args.budget_ms:
+            print(f"❌ {module}: {r['median_ms']:.1f} ms oltre il budget di {args.budget_ms:.0f} ms")
+            failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Benchmark della scrittura del problema su mondi grandi (migliaia-decine di migliaia di luoghi
+e oggetti) per ogni topologia: tempo, memoria di picco e tempo per riga, confrontando la
+scrittura a blocchi su file (write_problem) con la costruzione della stringa in memoria.
+
+    python benchmarks/problem_emission.py                              # 1k, 10k, 50k luoghi
+    python benchmarks/problem_emission.py --sizes 1000 100000 --topologies grid random
+    python benchmarks/problem_emission.py --max-peak-mb 8              # esce con errore oltre il budget
+
+Il tempo per riga deve restare circa costante al crescere del mondo (tempo lineare) e la
+memoria di picco della scrittura su file non deve crescere con il numero di righe.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from lore import TOPOLOGIES, LoreDocument  # noqa: E402
+from pddl_template_manager import PDDLTemplateManager  # noqa: E402
+
+GOAL = "(and (at hero loc_0))"
+
+
+def make_lore(locations: int, topology: str) -> LoreDocument:
+    """Mondo sintetico: un personaggio ogni 10 luoghi, un oggetto ogni 2, posizioni sparse."""
+    locs = [f"loc_{i}" for i in range(locations)]
+    chars = ["hero"] + [f"npc_{i}" for i in range(locations // 10)]
+    items = [f"item_{i}" for i in range(locations // 2)]
+    placements = {name: locs[(i * 7919) % locations] for i, name in enumerate(chars + items)}
+    spec = {"kind": topology, "seed": 42}
+    if topology == "adjacency":
+        # Anello con una scorciatoia ogni 5 luoghi
+        spec["adjacency"] = {l: [locs[(i + 1) % locations]] + ([locs[(i + 17) % locations]] if i % 5 == 0 else [])
+                             for i, l in enumerate(locs)}
+    return LoreDocument(quest_description="Mondo sintetico", branching_factor=(1, 4), depth_constraints=(1, 50),
+                        characters=chars, locations=locs, items=items, topology=spec, placements=placements)
+
+
+def measure(func: Callable[[], object]) -> Tuple[float, float]:
+    """(secondi, picco di memoria allocata in MB) di una chiamata."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak / 2 ** 20
+
+
+def bench(locations: int, topology: str, manager: PDDLTemplateManager, in_memory: bool) -> Dict[str, float]:
+    lore = make_lore(locations, topology)
+    with tempfile.TemporaryDirectory(prefix="bench_problem_") as tmp:
+        path = os.path.join(tmp, "problem.pddl")
+        write_s, write_mb = measure(lambda: manager.write_problem(lore, GOAL, path))
+        size = os.path.getsize(path)
+        with open(path, encoding="utf-8") as f:
+            lines = sum(1 for _ in f)
+    result = {"write_s": write_s, "write_peak_mb": write_mb, "lines": lines, "bytes": size,
+              "us_per_line": write_s / lines * 1e6}
+    if in_memory:
+        result["build_s"], result["build_peak_mb"] = measure(lambda: manager._build_problem(lore, GOAL))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark della scrittura del problema su mondi grandi")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000], help="Numero di luoghi")
+    parser.add_argument("--topologies", nargs="+", default=list(TOPOLOGIES), choices=TOPOLOGIES)
+    parser.add_argument("--no-memory", action="store_true", help="Salta il confronto con la stringa in memoria")
+    parser.add_argument("--max-peak-mb", type=float, help="Picco di memoria massimo della scrittura su file")
+    args = parser.parse_args()
+
+    manager = PDDLTemplateManager()
+    failed = False
+    for topology in args.topologies:
+        print(f"🗺️ Topologia {topology}")
+        for n in sorted(args.sizes):
+            r = bench(n, topology, manager, not args.no_memory)
+            line = (f"    {n:>7} luoghi: {r['lines']:>8} righe, {r['bytes'] / 2 ** 20:6.1f} MB, "
+                    f"file {r['write_s']:6.3f}s ({r['us_per_line']:.2f} µs/riga, picco {r['write_peak_mb']:.2f} MB)")
+            if "build_s" in r:
+                line += f" | in memoria {r['build_s']:6.3f}s (picco {r['build_peak_mb']:.1f} MB)"
+            print(line)
+            if args.max_peak_mb is not None and r["write_peak_mb"] > args.max_peak_mb:
+                print(f"❌ Picco di {r['write_peak_mb']:.2f} MB oltre il budget di {args.max_peak_mb:.1f} MB")
+                failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+Benchmark offline della pipeline: generate_domain, generate_problem e validate_and_refine
+su lore piccole, medie e grandi, con le risposte LLM riprodotte dalle fixture.
+
+    python benchmarks/run_benchmarks.py                       # replay, nessuna chiamata di rete
+    python benchmarks/run_benchmarks.py --latency 0.5         # simula la latenza del provider
+    python benchmarks/run_benchmarks.py --record              # registra i prompt mancanti (serve TOGETHER_API_KEY)
+    python benchmarks/run_benchmarks.py --compare benchmarks/results/<precedente>.json
+
+I risultati vengono salvati in benchmarks/results/ per il confronto tra revisioni.
+I tempi sono misurati con tracemalloc attivo: il sovraccarico è lo stesso in ogni revisione.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from interactive_story_generator import InteractiveStoryGenerator  # noqa: E402
+from lore import LoreDocument  # noqa: E402
+from pddl_template_manager import PDDLTemplateManager  # noqa: E402
+from replay_llm import ReplayLLMClient  # noqa: E402
+from tracing import get_tracer  # noqa: E402
+
+BENCH_DIR = os.path.join(ROOT, "benchmarks")
+SIZES = ("small", "medium", "large")
+
+
+def measure(func: Callable[[], object], setup: Optional[Callable[[], None]] = None) -> Dict[str, float]:
+    """Tempo reale, tempo CPU e picco di memoria Python (tracemalloc) di una chiamata."""
+    if setup is not None:
+        with contextlib.redirect_stdout(io.StringIO()):
+            setup()
+    tracemalloc.start()
+    wall, cpu = time.perf_counter(), time.process_time()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = func()
+    wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"wall": wall, "cpu": cpu, "peak_mb": peak / 2 ** 20, "ok": bool(result)}
+
+
+def aggregate(samples: List[Dict[str, float]]) -> Dict[str, float]:
+    walls = [s["wall"] for s in samples]
+    return {
+        "wall_median": statistics.median(walls),
+        "wall_min": min(walls),
+        "cpu_median": statistics.median(s["cpu"] for s in samples),
+        "peak_mb": max(s["peak_mb"] for s in samples),
+        "ok": all(s["ok"] for s in samples),
+        "runs": len(samples),
+    }
+
+
+def bench_lore(size: str, repeat: int, latency: float, record: bool) -> Dict[str, Dict[str, float]]:
+    lore = LoreDocument.from_yaml(os.path.join(BENCH_DIR, "lores", f"{size}.yaml"))
+    fixture = os.path.join(BENCH_DIR, "fixtures", f"{size}.json")
+    real_llm = None
+    if record:
+        from online_llm_client import OnlineLLMClient
+        from utils import load_env
+        load_env()
+        real_llm = OnlineLLMClient(api_key=os.getenv("TOGETHER_API_KEY", ""))
+    llm = ReplayLLMClient(fixture, real_llm, mode="auto" if record else "replay", latency=latency)
+    manager = PDDLTemplateManager()
+
+    samples: Dict[str, List[Dict[str, float]]] = {"generate_domain": [], "generate_problem": [],
+                                                 "validate_and_refine": []}
+    for _ in range(repeat):
+        get_tracer().reset()
+        samples["generate_domain"].append(measure(lambda: manager.generate_domain(lore, llm)))
+        samples["generate_problem"].append(measure(lambda: manager.generate_problem(lore, llm)))
+        with tempfile.TemporaryDirectory(prefix="bench_") as output_dir:
+            generator = InteractiveStoryGenerator(llm=llm, output_dir=output_dir)
+            generator.current_lore = lore
+            generator.store = None  # niente piani memorizzati: si misura la pianificazione
+            generator.lore_index = None  # niente domini riusati: si misura la generazione
+
+            samples["validate_and_refine"].append(measure(
+                lambda: generator.validate_and_refine(interactive=False),
+                setup=generator.generate_initial_pddl,
+            ))
+    if llm.misses:
+        print(f"⚠️ {size}: {llm.misses} prompt non registrati, usate le risposte più simili (rilanciare con --record)")
+    return {stage: aggregate(s) for stage, s in samples.items()}
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def print_results(results: Dict[str, Dict[str, Dict[str, float]]], baseline: Optional[dict] = None):
+    header = f"{'lore':<8}{'fase':<22}{'wall s':>9}{'cpu s':>9}{'picco MB':>10}{'esito':>7}"
+    if baseline:
+        header += f"{'Δ wall':>9}"
+    print(header)
+    print("-" * len(header))
+    for size, stages in results.items():
+        for stage, r in stages.items():
+            line = (f"{size:<8}{stage:<22}{r['wall_median']:>9.3f}{r['cpu_median']:>9.3f}"
+                    f"{r['peak_mb']:>10.1f}{'ok' if r['ok'] else 'KO':>7}")
+            previous = (baseline or {}).get(size, {}).get(stage)
+            if previous and previous["wall_median"] > 0:
+                delta = (r["wall_median"] - previous["wall_median"]) / previous["wall_median"] * 100
+                line += f"{delta:>+8.1f}%"
+            print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark offline della pipeline PDDL")
+    parser.add_argument("--sizes", nargs="+", default=list(SIZES), choices=SIZES)
+    parser.add_argument("-n", "--repeat", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.0, help="Latenza simulata per chiamata LLM (s)")
+    parser.add_argument("--record", action="store_true", help="Registra con l'API reale i prompt mancanti")
+    parser.add_argument("--compare", help="File di risultati precedente con cui confrontare")
+    parser.add_argument("-o", "--output", help="File JSON dei risultati (default benchmarks/results/...)")
+    args = parser.parse_args()
+
+    results = {}
+    for size in args.sizes:
+        print(f"⏱️ Benchmark lore '{size}' ({args.repeat} ripetizioni)...")
+        results[size] = bench_lore(size, args.repeat, args.latency, args.record)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+    print()
+    print_results(results, baseline)
+
+    revision = git_revision()
+    output = args.output or os.path.join(
+        BENCH_DIR, "results", f"{datetime.now():%Y%m%d_%H%M%S}_{revision}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({
+            "revision": revision,
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "config": {"repeat": args.repeat, "latency": args.latency},
+            "results": results,
+        }, f, indent=2)
+    print(f"\n📂 Risultati salvati in {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+import time
+from dataclasses import dataclass, field
+from typing import List, Optional, Sequence, Tuple
+
+from pddl_parser import (
+    Domain, PDDLParseError, Problem, check_domain, check_problem, iter_atoms, parse_domain, parse_problem,
+)
+from reachability import analyze_reachability
+from tracing import span
+
+
+@dataclass
+class CandidateScore:
+    """Valutazione locale (senza planner) di una coppia dominio/problema candidata."""
+    parsed: bool = False
+    issues: int = 0                   # errori semantici (predicati non dichiarati, arità, variabili...)
+    coverage: float = 0.0             # frazione degli atomi di azioni e goal con predicati dichiarati
+    actions: int = 0
+    reachable: Optional[bool] = None  # goal raggiungibile nel rilassato; None se non analizzato
+    unreachable_goals: List[str] = field(default_factory=list)
+    elapsed: float = 0.0
+
+    def static_key(self) -> Tuple:
+        return (self.parsed, -self.issues, self.coverage, self.actions > 0)
+
+    def key(self) -> Tuple:
+        """Chiave di ordinamento, più alta è meglio: la raggiungibilità conta più dei controlli statici."""
+        return (self.parsed, self.reachable is True) + self.static_key()[1:]
+
+    @property
+    def promising(self) -> bool:
+        """Vale la pena mandarla al planner."""
+        return self.parsed and self.issues == 0 and self.reachable is not False
+
+    def summary(self) -> str:
+        if not self.parsed:
+            return "non analizzabile"
+        reach = {True: "goal raggiungibile", False: "goal irraggiungibile", None: "raggiungibilità non verificata"}
+        return (f"{self.issues} errori, copertura predicati {self.coverage:.0%}, "
+                f"{self.actions} azioni, {reach[self.reachable]}")
+
+
+def _coverage(domain: Domain, problem: Problem) -> float:
+    declared = {p.name for p in domain.predicates}
+    atoms = [atom for a in domain.actions for f in (a.precondition, a.effect) for atom, _ in iter_atoms(f)]
+    atoms += [atom for atom, _ in iter_atoms(problem.goal)]
+    if not atoms:
+        return 0.0
+    return sum(1 for a in atoms if a.predicate in declared) / len(atoms)
+
+
+def score_candidate(domain_text: str, problem_text: str, check_reachability: bool = True,
+                    max_ground_actions: int = 20000) -> CandidateScore:
+    """
+    Controlli rapidi su un candidato: parsing, errori semantici, copertura dei predicati
+    dichiarati e, se i controlli statici passano, raggiungibilità rilassata del goal.
+    """
+    start = time.perf_counter()
+    score = CandidateScore()
+    try:
+        domain = parse_domain(domain_text)
+        problem = parse_problem(problem_text)
+    except PDDLParseError:
+        score.elapsed = time.perf_counter() - start
+        return score
+    score.parsed = True
+    score.issues = len(check_domain(domain)) + len(check_problem(problem, domain))
+    score.coverage = _coverage(domain, problem)
+    score.actions = len(domain.actions)
+    if check_reachability and score.issues == 0:
+        report = analyze_reachability(domain, problem, max_ground_actions)
+        if report.analyzed:
+            score.reachable = not report.hopeless
+            score.unreachable_goals = report.unreachable_goals
+    score.elapsed = time.perf_counter() - start
+    return score
+
+
+def rank_candidates(candidates: Sequence[Tuple[str, str]], keep: int = 2,
+                    check_reachability: bool = True) -> List[Tuple[int, CandidateScore]]:
+    """
+    Ordina le coppie (dominio, problema) dalla migliore. La raggiungibilità (la parte costosa:
+    grounding) si calcola solo per i candidati migliori secondo i controlli statici, finché non
+    se ne trovano keep promettenti. A parità di punteggio vince l'ordine originale.
+    """
+    with span("candidates.rank", "candidates", candidates=len(candidates)):
+        scores = [score_candidate(d, p, check_reachability=False) for d, p in candidates]
+        order = sorted(range(len(candidates)), key=lambda i: scores[i].static_key(), reverse=True)
+        if check_reachability:
+            found = 0
+            for i in order:
+                if found >= keep or not scores[i].parsed or scores[i].issues:
+                    break
+                scores[i] = score_candidate(*candidates[i])
+                found += scores[i].promising
+        order.sort(key=lambda i: scores[i].key(), reverse=True)
+        return [(i, scores[i]) for i in order]
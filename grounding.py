@@ -0,0 +1,351 @@
+from collections import Counter, deque
+from dataclasses import dataclass, field
+from itertools import product
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from pddl_parser import Action, And, Atom, Compound, Domain, Formula, Not, Problem, iter_atoms
+
+Fact = Tuple[str, ...]  # (predicato, arg1, arg2, ...)
+
+
+class GroundingError(Exception):
+    """Dominio non supportato (non STRIPS) o grounding oltre il budget."""
+    pass
+
+
+@dataclass
+class GroundAction:
+    name: str
+    args: Tuple[str, ...]
+    pre_pos: int = 0
+    pre_neg: int = 0
+    add: int = 0
+    delete: int = 0
+
+    def label(self) -> str:
+        return "(" + " ".join((self.name,) + self.args) + ")"
+
+
+@dataclass
+class GroundTask:
+    """
+    Task STRIPS grounded: i fatti sono interi e gli stati sono bitset (int Python),
+    dove il bit i vale 1 se il fatto facts[i] è vero.
+    """
+    facts: List[Fact] = field(default_factory=list)
+    fact_index: Dict[Fact, int] = field(default_factory=dict)
+    init: int = 0
+    goal_pos: int = 0
+    goal_neg: int = 0
+    actions: List[GroundAction] = field(default_factory=list)
+    _index: Optional["_ApplicabilityIndex"] = field(default=None, init=False, repr=False, compare=False)
+
+    def intern(self, fact: Fact) -> int:
+        idx = self.fact_index.get(fact)
+        if idx is None:
+            idx = len(self.facts)
+            self.facts.append(fact)
+            self.fact_index[fact] = idx
+        return idx
+
+    def fact_name(self, idx: int) -> str:
+        return "(" + " ".join(self.facts[idx]) + ")"
+
+    def is_applicable(self, state: int, action: GroundAction) -> bool:
+        return state & action.pre_pos == action.pre_pos and not state & action.pre_neg
+
+    def apply(self, state: int, action: GroundAction) -> int:
+        return (state & ~action.delete) | action.add
+
+    def applicable_actions(self, state: int) -> Iterator[int]:
+        """
+        Indici delle azioni applicabili: si esaminano solo le azioni la cui precondizione
+        più selettiva è vera nello stato (più quelle senza precondizioni positive).
+        """
+        index = self._applicability_index()
+        for i in index.free:
+            a = self.actions[i]
+            if not state & a.pre_neg:
+                yield i
+        for f in iter_bits(state & index.key_mask):
+            for i in index.by_key[f]:
+                a = self.actions[i]
+                if state & a.pre_pos == a.pre_pos and not state & a.pre_neg:
+                    yield i
+
+    def _applicability_index(self) -> "_ApplicabilityIndex":
+        # Ricostruito solo se nel frattempo sono state aggiunte azioni o fatti
+        if self._index is None or self._index.size != (len(self.actions), len(self.facts)):
+            self._index = _ApplicabilityIndex(self)
+        return self._index
+
+    def is_goal(self, state: int) -> bool:
+        return state & self.goal_pos == self.goal_pos and not state & self.goal_neg
+
+    def action_by_label(self) -> Dict[str, int]:
+        return {a.label(): i for i, a in enumerate(self.actions)}
+
+
+class _ApplicabilityIndex:
+    """
+    Strutture per il test di applicabilità: ogni azione è indicizzata sulla precondizione
+    positiva che compare in meno azioni.
+    """
+
+    def __init__(self, task: GroundTask):
+        actions = task.actions
+        self.size = (len(actions), len(task.facts))
+        frequency = Counter(f for a in actions for f in iter_bits(a.pre_pos))
+        self.free: List[int] = []
+        self.by_key: Dict[int, List[int]] = {}
+        self.key_mask = 0
+        for i, a in enumerate(actions):
+            if not a.pre_pos:
+                self.free.append(i)
+                continue
+            key = min(iter_bits(a.pre_pos), key=frequency.__getitem__)
+            self.by_key.setdefault(key, []).append(i)
+            self.key_mask |= 1 << key
+
+
+def iter_bits(mask: int) -> Iterator[int]:
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def objects_by_type(domain: Domain, problem: Problem) -> Dict[str, List[str]]:
+    """Oggetti (e costanti) raggruppati per tipo, inclusi i supertipi."""
+    objects = dict(domain.constants)
+    objects.update(problem.objects)
+    result: Dict[str, List[str]] = {"object": []}
+    for obj, typ in objects.items():
+        result["object"].append(obj)
+        seen = set()
+        while typ and typ not in seen and typ != "object":
+            seen.add(typ)
+            result.setdefault(typ, []).append(obj)
+            typ = domain.types.get(typ, "object")
+    return result
+
+
+def _literals(formula: Optional[Formula], where: str) -> List[Tuple[Atom, bool]]:
+    """Appiattisce una congiunzione di letterali, rifiutando costrutti non STRIPS."""
+    if formula is None:
+        return []
+    if isinstance(formula, Compound) or (isinstance(formula, Not) and not isinstance(formula.arg, Atom)):
+        raise GroundingError(f"{where}: costrutto non supportato {formula.to_pddl()}")
+    if isinstance(formula, And):
+        for sub in formula.args:
+            if not isinstance(sub, (Atom, Not)):
+                raise GroundingError(f"{where}: costrutto non supportato {sub.to_pddl()}")
+    return list(iter_atoms(formula))
+
+
+def _fact(atom: Atom, binding: Dict[str, str]) -> Fact:
+    return (atom.predicate,) + tuple(binding.get(a, a) for a in atom.args)
+
+
+def static_predicates(domain: Domain) -> Set[str]:
+    """Predicati che nessuna azione modifica (es. connected)."""
+    used = {p.name for p in domain.predicates}
+    changed = set()
+    for action in domain.actions:
+        used.update(atom.predicate for atom, _ in iter_atoms(action.precondition))
+        changed.update(atom.predicate for atom, _ in iter_atoms(action.effect))
+    return used - changed
+
+
+@dataclass
+class _Schema:
+    """Schema d'azione preparato per il grounding: parametri tipati e letterali già separati."""
+    action: Action
+    names: List[str]
+    types: Dict[str, Set[str]]  # variabile -> oggetti ammessi
+    pos: List[Atom]
+    neg: List[Atom]
+    effects: List[Tuple[Atom, bool]]
+
+
+class _Grounder:
+    """
+    Grounding guidato dalla raggiungibilità rilassata (come il translator di Fast Downward):
+    si parte dai fatti iniziali e ogni nuovo fatto raggiungibile innesca solo le join delle
+    precondizioni in cui compare. Le istanze con precondizioni mai raggiungibili, comprese
+    quelle statiche false (es. connected), non vengono mai generate; i letterali sui predicati
+    statici sono poi tolti dalle precondizioni ground, perché il loro valore non cambia mai.
+    """
+
+    def __init__(self, domain: Domain, problem: Problem, task: GroundTask, max_actions: Optional[int]):
+        self.task = task
+        self.max_actions = max_actions
+        self.by_type = objects_by_type(domain, problem)
+        self.init_facts = {(a.predicate,) + tuple(a.args) for a in problem.init}
+        self.deleted = {atom.predicate for a in domain.actions for atom, neg in iter_atoms(a.effect) if neg}
+        self.static = static_predicates(domain)
+
+        self.reachable: Set[Fact] = set()
+        self.by_pred: Dict[str, List[Fact]] = {}
+        self.by_arg: Dict[Tuple[str, int, str], List[Fact]] = {}
+        self.queue: deque = deque()
+        self.seen: Set[Tuple[int, Tuple[str, ...]]] = set()
+
+        self.schemas: List[_Schema] = []
+        self.triggers: Dict[str, List[Tuple[_Schema, int]]] = {}
+        for action in domain.actions:
+            literals = _literals(action.precondition, f"Azione '{action.name}'")
+            schema = _Schema(
+                action, [p.name for p in action.parameters],
+                {p.name: set(self.by_type.get(p.type, [])) for p in action.parameters},
+                [atom for atom, neg in literals if not neg],
+                [atom for atom, neg in literals if neg],
+                _literals(action.effect, f"Azione '{action.name}'"),
+            )
+            self.schemas.append(schema)
+            for i, atom in enumerate(schema.pos):
+                self.triggers.setdefault(atom.predicate, []).append((schema, i))
+
+    def run(self):
+        for fact in sorted(self.init_facts):
+            self._add_fact(fact)
+        for schema in self.schemas:
+            if not schema.pos:
+                self._join(schema, [], {})
+        while self.queue:
+            fact = self.queue.popleft()
+            for schema, i in self.triggers.get(fact[0], []):
+                binding = self._unify(schema, schema.pos[i], fact, {})
+                if binding is not None:
+                    self._join(schema, schema.pos[:i] + schema.pos[i + 1:], binding)
+
+    def _add_fact(self, fact: Fact):
+        if fact in self.reachable:
+            return
+        self.reachable.add(fact)
+        self.by_pred.setdefault(fact[0], []).append(fact)
+        for i, value in enumerate(fact[1:]):
+            self.by_arg.setdefault((fact[0], i, value), []).append(fact)
+        self.queue.append(fact)
+
+    def _unify(self, schema: _Schema, atom: Atom, fact: Fact, binding: Dict[str, str]) -> Optional[Dict[str, str]]:
+        if len(atom.args) != len(fact) - 1:
+            return None
+        result = binding
+        for arg, value in zip(atom.args, fact[1:]):
+            if not arg.startswith("?"):
+                if arg != value:
+                    return None
+            elif arg in result:
+                if result[arg] != value:
+                    return None
+            elif arg in schema.types and value in schema.types[arg]:
+                if result is binding:
+                    result = dict(binding)
+                result[arg] = value
+            else:
+                return None
+        return result
+
+    def _candidates(self, atom: Atom, binding: Dict[str, str]) -> List[Fact]:
+        """Fatti raggiungibili compatibili con gli argomenti già legati (lista più corta tra gli indici)."""
+        best = self.by_pred.get(atom.predicate, [])
+        for i, arg in enumerate(atom.args):
+            value = binding.get(arg) if arg.startswith("?") else arg
+            if value is not None:
+                facts = self.by_arg.get((atom.predicate, i, value), [])
+                if len(facts) < len(best):
+                    best = facts
+        return best[:]  # copia: la join può aggiungere nuovi fatti
+
+    def _join(self, schema: _Schema, atoms: List[Atom], binding: Dict[str, str]):
+        if not atoms:
+            self._emit_all(schema, binding)
+            return
+        # Prima l'atomo con più argomenti già legati: è il più selettivo
+        atom = max(atoms, key=lambda a: sum(1 for x in a.args if x in binding or not x.startswith("?")))
+        rest = [a for a in atoms if a is not atom]
+        for fact in self._candidates(atom, binding):
+            extended = self._unify(schema, atom, fact, binding)
+            if extended is not None:
+                self._join(schema, rest, extended)
+
+    def _emit_all(self, schema: _Schema, binding: Dict[str, str]):
+        free = [n for n in schema.names if n not in binding]
+        if not free:
+            self._emit(schema, binding)
+            return
+        # Parametri che non compaiono in precondizioni positive: tutti gli oggetti del tipo
+        domains = [sorted(schema.types[n]) for n in free]
+        combos = 1
+        for d in domains:
+            combos *= len(d)
+        if self.max_actions is not None and combos > 10 * self.max_actions:
+            raise GroundingError(f"Azione '{schema.action.name}': {combos} istanze possibili, oltre il budget")
+        for values in product(*domains):
+            extended = dict(binding)
+            extended.update(zip(free, values))
+            self._emit(schema, extended)
+
+    def _emit(self, schema: _Schema, binding: Dict[str, str]):
+        values = tuple(binding[n] for n in schema.names)
+        key = (id(schema), values)
+        if key in self.seen:
+            return
+        self.seen.add(key)
+
+        task = self.task
+        ga = GroundAction(schema.action.name, values)
+        for atom in schema.neg:
+            f = _fact(atom, binding)
+            # Un fatto iniziale che nessuna azione cancella resta vero per sempre
+            if f[0] not in self.deleted and f in self.init_facts:
+                return
+            if f[0] in self.static:
+                continue  # statico e assente da :init: sempre falso, la precondizione vale sempre
+            ga.pre_neg |= 1 << task.intern(f)
+        for atom in schema.pos:
+            # Le precondizioni statiche positive sono già garantite dalla join sui fatti raggiungibili
+            # (i fatti statici sono solo quelli iniziali) e restano vere: non servono nel bitset
+            if atom.predicate not in self.static:
+                ga.pre_pos |= 1 << task.intern(_fact(atom, binding))
+        added = []
+        for atom, neg in schema.effects:
+            f = _fact(atom, binding)
+            bit = 1 << task.intern(f)
+            if neg:
+                ga.delete |= bit
+            else:
+                ga.add |= bit
+                added.append(f)
+        # Con la semantica PDDL le aggiunte prevalgono sulle cancellazioni
+        ga.delete &= ~ga.add
+        if ga.pre_pos & ga.pre_neg:
+            return
+        task.actions.append(ga)
+        if self.max_actions is not None and len(task.actions) > self.max_actions:
+            raise GroundingError(f"Più di {self.max_actions} azioni ground")
+        for f in added:
+            self._add_fact(f)
+
+
+def ground(domain: Domain, problem: Problem, max_actions: Optional[int] = None) -> GroundTask:
+    """
+    Grounding delle azioni sugli oggetti del problema: i parametri sono filtrati per tipo e
+    vengono istanziate solo le azioni le cui precondizioni positive sono raggiungibili
+    nel problema rilassato (le precondizioni statiche false sono quindi scartate a priori).
+    """
+    task = GroundTask()
+    init_facts = {(a.predicate,) + tuple(a.args) for a in problem.init}
+    for fact in sorted(init_facts):
+        task.init |= 1 << task.intern(fact)
+
+    for atom, negated in _literals(problem.goal, "Goal"):
+        bit = 1 << task.intern((atom.predicate,) + tuple(atom.args))
+        if negated:
+            task.goal_neg |= bit
+        else:
+            task.goal_pos |= bit
+
+    _Grounder(domain, problem, task, max_actions).run()
+    return task
@@ -0,0 +1,247 @@
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Set, Tuple
+
+from candidate_scoring import CandidateScore, rank_candidates
+from llm_interface import LLMInterface
+from llm_pddl_refiner import LLM_PDDLRefiner
+from lore import LoreDocument
+from pddl_inferencer import PDDLInferencer
+from pddl_parser import Issue, PDDLParseError, parse_action
+from pddl_template_manager import PDDLTemplateManager
+
+
+def fingerprint(value: Any) -> str:
+    return hashlib.sha256(repr(value).encode("utf-8")).hexdigest()
+
+
+class ArtifactGraph:
+    """
+    Grafo di dipendenze tra artefatti. Ogni nodo ricorda l'impronta dei propri input
+    e viene ricostruito solo se un input è cambiato o se è stato invalidato.
+    """
+
+    def __init__(self):
+        self._deps: Dict[str, Tuple[str, ...]] = {}
+        self._builders: Dict[str, Callable[..., Any]] = {}
+        self._values: Dict[str, Any] = {}
+        self._prints: Dict[str, str] = {}
+        self._input_prints: Dict[str, Tuple[str, ...]] = {}
+        self._dirty: Set[str] = set()
+        self.rebuilt: List[str] = []
+
+    def add(self, name: str, deps: Sequence[str], build: Callable[..., Any]):
+        self._deps[name] = tuple(deps)
+        self._builders[name] = build
+
+    def set(self, name: str, value: Any):
+        """Imposta direttamente il valore di un nodo (sorgente o corretto a mano)."""
+        self._values[name] = value
+        self._prints[name] = fingerprint(value)
+        self._dirty.discard(name)
+        if name in self._deps:
+            self._input_prints[name] = tuple(self._prints.get(d, "") for d in self._deps[name])
+
+    def invalidate(self, name: str):
+        self._dirty.add(name)
+
+    def is_stale(self, name: str) -> bool:
+        """Vero se il nodo non è mai stato costruito o è stato invalidato."""
+        return name not in self._values or name in self._dirty
+
+    def get(self, name: str) -> Any:
+        deps = self._deps.get(name)
+        if deps is None:
+            return self._values[name]
+        inputs = {d: self.get(d) for d in deps}
+        input_prints = tuple(self._prints[d] for d in deps)
+        if name in self._values and name not in self._dirty and self._input_prints.get(name) == input_prints:
+            return self._values[name]
+
+        value = self._builders[name](**inputs)
+        self._values[name] = value
+        self._prints[name] = fingerprint(value)
+        self._input_prints[name] = input_prints
+        self._dirty.discard(name)
+        self.rebuilt.append(name)
+        return value
+
+
+@dataclass
+class Diagnosis:
+    """Componenti da rigenerare e relativo feedback."""
+    predicates: bool = False
+    actions: Dict[str, List[str]] = field(default_factory=dict)  # nome azione -> errori
+    goal: bool = False
+    init: Set[str] = field(default_factory=set)  # atomi/oggetti dell'init da scartare
+    full: bool = False
+    feedback: str = ""
+
+    def is_empty(self) -> bool:
+        return not (self.predicates or self.actions or self.goal or self.init or self.full)
+
+
+def diagnose(issues: Sequence[Issue], feedback: str = "") -> Diagnosis:
+    """Associa ogni errore al componente che lo ha prodotto."""
+    diagnosis = Diagnosis(feedback=feedback)
+    for issue in issues:
+        if issue.component == "predicates":
+            diagnosis.predicates = True
+        elif issue.component == "action":
+            diagnosis.actions.setdefault(issue.subject, []).append(issue.message)
+        elif issue.component == "goal":
+            diagnosis.goal = True
+        elif issue.component == "init":
+            diagnosis.init.add(issue.subject)
+        else:
+            diagnosis.full = True
+    return diagnosis
+
+
+class IncrementalPDDLBuilder:
+    """
+    Costruisce dominio e problema come grafo di artefatti:
+      lore -> predicates, actions, goal, init;  predicates + actions -> domain;
+      lore + goal + init -> problem.
+    Dopo una diagnosi si rigenerano solo i nodi guasti e ciò che ne dipende.
+    Il problema non resta in memoria: il nodo lo scrive a blocchi in output_dir/problem.pddl e
+    ne tiene solo l'impronta; anche init tiene solo gli elementi esclusi, i fatti si rigenerano.
+    """
+
+    def __init__(self, lore: LoreDocument, llm: LLMInterface, template_manager: PDDLTemplateManager,
+                 candidates: int = 1, output_dir: str = "output"):
+        self.manager = template_manager
+        self.problem_path = os.path.join(output_dir, "problem.pddl")
+        self.inferencer = PDDLInferencer(lore, llm)
+        self.refiner = LLM_PDDLRefiner(llm)
+        self.feedback: Dict[str, Optional[str]] = {}
+        self.init_blacklist: Set[str] = set()
+        # Generazione speculativa: azioni e goal in più varianti, scelte con controlli locali
+        self.candidates = candidates
+        self._pending: Dict[str, List[Any]] = {}
+        self.alternatives: List[Tuple[List[str], str, CandidateScore]] = []
+        self.selected: Optional[CandidateScore] = None
+
+        g = self.graph = ArtifactGraph()
+        g.set("lore", lore)
+        g.add("predicates", ["lore"], lambda lore: self.manager._infer_predicates(
+            self.inferencer, self.refiner, self.feedback.pop("predicates", None)))
+        g.add("actions", ["lore"], self._build_actions)
+        g.add("goal", ["lore"], self._build_goal)
+        g.add("init", ["lore"], self._build_init)
+        g.add("domain", ["predicates", "actions"], lambda predicates, actions: self.manager._build_domain(predicates, actions))
+        g.add("problem", ["lore", "goal", "init"], lambda lore, goal, init: self.manager.write_problem(
+            lore, goal, self.problem_path, self._init_lines(lore, init)))
+
+    def _build_actions(self, lore: LoreDocument) -> List[str]:
+        feedback = self.feedback.pop("actions", None)
+        if self.candidates <= 1:
+            return self.manager._infer_actions(self.inferencer, feedback)
+        options = self.manager._infer_actions_candidates(self.inferencer, self.candidates, feedback)
+        self._pending["actions"] = options
+        return options[0]
+
+    def _build_goal(self, lore: LoreDocument) -> str:
+        feedback = self.feedback.pop("goal", None)
+        if self.candidates <= 1:
+            return self.manager._infer_goal(self.inferencer, self.refiner, feedback)
+        options = self.manager._infer_goal_candidates(self.inferencer, self.refiner, self.candidates, feedback)
+        self._pending["goal"] = options
+        return options[0]
+
+    def _build_init(self, lore: LoreDocument) -> Tuple[str, ...]:
+        return tuple(sorted(self.init_blacklist))
+
+    def _init_lines(self, lore: LoreDocument, blacklist: Sequence[str]) -> Iterator[str]:
+        # Scarta gli atomi che coinvolgono elementi segnalati dalla diagnosi
+        excluded = set(blacklist)
+        for line in self.manager._iter_init(lore):
+            if not set(line.strip("()").split()) & excluded:
+                yield line
+
+    def build(self) -> Tuple[str, str]:
+        """Dominio (testo) e percorso del file del problema, scritto solo se è cambiato."""
+        self.graph.rebuilt = []
+        # I nodi LLM ancora da costruire sono indipendenti: li calcolo in parallelo
+        pending = [n for n in ("predicates", "actions", "goal") if self.graph.is_stale(n)]
+        if len(pending) > 1:
+            with ThreadPoolExecutor(max_workers=len(pending)) as pool:
+                list(pool.map(self.graph.get, pending))
+        for name in pending:
+            self.graph.get(name)
+        if self._pending:
+            self._select_candidates()
+        self.graph.get("problem")
+        return self.graph.get("domain"), self.problem_path
+
+    def _select_candidates(self):
+        """
+        Combina le varianti appena generate di azioni e goal, le valuta localmente
+        (parsing, errori, copertura, raggiungibilità) e tiene la migliore; la seconda,
+        se promettente, resta come alternativa da provare prima di richiamare l'LLM.
+        """
+        action_sets = self._pending.pop("actions", None) or [self.graph.get("actions")]
+        goals = self._pending.pop("goal", None) or [self.graph.get("goal")]
+        predicates = self.graph.get("predicates")
+        lore = self.graph.get("lore")
+        init = list(self._init_lines(lore, self.graph.get("init")))
+
+        pairs = [(a, g) for a in action_sets for g in goals]
+        texts = [(self.manager._build_domain(predicates, a), self.manager._build_problem(lore, g, init))
+                 for a, g in pairs]
+        ranked = rank_candidates(texts, keep=2)
+        best, self.selected = ranked[0]
+        self.alternatives = [(pairs[i][0], pairs[i][1], score) for i, score in ranked[1:2] if score.promising]
+        print(f"🎯 Scelto il candidato {best + 1}/{len(pairs)}: {self.selected.summary()}")
+        self.graph.set("actions", pairs[best][0])
+        self.graph.set("goal", pairs[best][1])
+
+    def next_alternative(self) -> Optional[Tuple[str, str]]:
+        """Passa al prossimo candidato promettente già generato (senza chiamate LLM), se c'è."""
+        if not self.alternatives:
+            return None
+        actions, goal, self.selected = self.alternatives.pop(0)
+        self.graph.set("actions", actions)
+        self.graph.set("goal", goal)
+        self.graph.get("problem")
+        return self.graph.get("domain"), self.problem_path
+
+    def apply(self, diagnosis: Diagnosis):
+        """Invalida solo i componenti indicati dalla diagnosi."""
+        self.alternatives = []  # generate per la versione precedente
+        if diagnosis.full:
+            for name in ("predicates", "actions", "goal", "init"):
+                self.graph.invalidate(name)
+            for name in ("predicates", "actions", "goal"):
+                self.feedback[name] = diagnosis.feedback or None
+            return
+        if diagnosis.predicates:
+            self.feedback["predicates"] = diagnosis.feedback or None
+            self.graph.invalidate("predicates")
+        if diagnosis.goal:
+            self.feedback["goal"] = diagnosis.feedback or None
+            self.graph.invalidate("goal")
+        if diagnosis.init:
+            self.init_blacklist |= diagnosis.init
+            self.graph.invalidate("init")
+        if diagnosis.actions:
+            self._regenerate_actions(diagnosis.actions)
+
+    def _regenerate_actions(self, broken: Dict[str, List[str]]):
+        actions = list(self.graph.get("actions"))
+        declared = self.graph.get("predicates")
+        updated = []
+        for text in actions:
+            try:
+                name = parse_action(text).name
+            except PDDLParseError:
+                name = None
+            if name in broken:
+                fixed = self.manager._regenerate_action(self.inferencer, text, broken[name], declared)
+                if fixed is None:
+                    continue  # azione irrecuperabile: meglio scartarla
+                text = fixed
+            updated.append(text)
+        self.graph.set("actions", updated)
@@ -2,26 +2,54 @@
 from lore import LoreDocument
 from pddl_template_manager import PDDLTemplateManager
 from reflection_agent import ReflectionAgent
-from utils import write_to_file
-from validation import validate_pddl_syntax, run_fast_downward
-from online_llm_client import OnlineLLMClient
+from utils import load_env, read_file, write_to_file
+from validation import validate_pddl_syntax, find_pddl_issues, find_plan
+from reachability import analyze_pddl
+from plan_validator import validate_plan
+from grounding import GroundingError
+from pddl_parser import PDDLParseError
+from artifact_store import default_artifact_store
+from lore_index import default_lore_index
+from incremental_pipeline import Diagnosis, IncrementalPDDLBuilder, diagnose
+from streaming_pipeline import PipelineEvent, StreamingPDDLPipeline, describe_event
+from llm_cache import CachedLLMClient
+from llm_interface import LLMInterface
+from tracing import span, traced
+from typing import Iterator, Optional
 
 import os
-from dotenv import load_dotenv
-
-load_dotenv()  # Carica le variabili da .env
-api_key = os.getenv("TOGETHER_API_KEY")
 
 
 class InteractiveStoryGenerator:
-    def __init__(self):
-        self.llm = OnlineLLMClient(api_key=api_key)
-        print(f"🤖 Modello attivo: {self.llm.model}")
+    def __init__(self, llm: Optional[LLMInterface] = None, output_dir: str = "output",
+                 candidates: Optional[int] = None, stream: Optional[bool] = None):
+        if llm is None:
+            # Client online (e requests) caricati solo se non ne viene passato uno
+            from online_llm_client import OnlineLLMClient
+            load_env()  # Carica le variabili da .env
+            llm = CachedLLMClient(OnlineLLMClient(api_key=os.getenv("TOGETHER_API_KEY", "")))
+        self.llm = llm
+        self.output_dir = output_dir
+        # Archivio per contenuto delle coppie dominio/problema già pianificate (None = disattivato)
+        self.store = default_artifact_store()
+        # Domini di esecuzioni riuscite, riusabili da lore simili (None = disattivato)
+        self.lore_index = default_lore_index()
+        # Varianti di azioni e goal generate in parallelo e valutate localmente (1 = disattivato)
+        self.candidates = candidates or int(os.getenv("PDDL_CANDIDATES", "1"))
+        # Prima generazione in streaming (PDDL_STREAM=1): predicati, azioni e goal in parallelo,
+        # azioni controllate appena chiuse; le varianti di PDDL_CANDIDATES valgono solo senza
+        if stream is None:
+            stream = os.getenv("PDDL_STREAM", "0").lower() in ("1", "true", "yes")
+        self.stream = stream
+        print(f"🤖 Modello attivo: {getattr(self.llm, 'model', type(self.llm).__name__)}")
         self.template_manager = PDDLTemplateManager()
         self.reflection_agent = ReflectionAgent(self.llm)
         self.current_lore = None
         self.current_domain = None
         self.current_problem = None
+        self.current_plan = None
+        self.plan_report = None
+        self.builder = None
 
     def create_lore_document(self, interactive: bool = True) -> LoreDocument:
         if interactive:
@@ -55,34 +83,175 @@ class InteractiveStoryGenerator:
         )
         return self.current_lore
 
+    @traced("pipeline.generate")
     def generate_initial_pddl(self):
-        self.current_domain = self.template_manager.generate_domain(self.current_lore, self.llm)
-        self.current_problem = self.template_manager.generate_problem(self.current_lore, self.llm)
+        self.builder = IncrementalPDDLBuilder(self.current_lore, self.llm, self.template_manager,
+                                              candidates=self.candidates, output_dir=self.output_dir)
+        if self.reuse_domain() or not self.stream:
+            self.current_domain, problem_path = self.builder.build()
+            write_to_file(self.current_domain, "domain.pddl", self.output_dir)
+            self._load_problem(problem_path)
+            return
+        for event in self.stream_initial_pddl():
+            print(f"📡 [{event.elapsed:5.1f}s] {describe_event(event)}")
+
+    def _load_problem(self, path: str):
+        # Il builder scrive il problema a blocchi direttamente su file: il testo serve ai controlli
+        print(f"📂 File salvato: {path}")
+        self.current_problem = read_file(path)
+
+    def stream_initial_pddl(self, plan: bool = False) -> Iterator[PipelineEvent]:
+        """
+        Come generate_initial_pddl, ma restituisce gli eventi della pipeline (predicati, ogni
+        azione appena chiusa, goal, dominio, problema, piano) man mano che sono pronti.
+        Alla fine il builder incrementale adotta dominio e problema assemblati dalla pipeline,
+        senza ricostruirli, e riparte da lì per le rigenerazioni.
+        """
+        self.builder = IncrementalPDDLBuilder(self.current_lore, self.llm, self.template_manager,
+                                              output_dir=self.output_dir)
+        pipeline = StreamingPDDLPipeline(self.current_lore, self.llm, self.template_manager, self.output_dir,
+                                         plan=plan, store=self.store, inferencer=self.builder.inferencer)
+        yield from pipeline.events()
+
+        graph = self.builder.graph
+        graph.set("predicates", pipeline.predicates)
+        graph.set("actions", pipeline.actions)
+        graph.set("goal", pipeline.goal)
+        graph.get("init")  # nessun elemento escluso: nessuna chiamata LLM
+        graph.set("domain", pipeline.domain)
+        graph.set("problem", pipeline.problem_digest)
+        self.current_domain = pipeline.domain
+        self._load_problem(pipeline.problem_path)
+        self.current_plan = pipeline.plan
+
+    def reuse_domain(self) -> bool:
+        """
+        Se una quest già risolta è abbastanza simile, ne riusa predicati e azioni:
+        il builder genera solo goal e problema.
+        """
+        if self.lore_index is None:
+            return False
+        match = self.lore_index.find_domain(self.current_lore)
+        if match is None:
+            return False
+        print(f"♻️ Riuso il dominio di una quest simile (similarità {match.similarity:.2f}, "
+              f"{len(match.actions)} azioni, {match.dropped} scartate): \"{match.source[:60]}\"")
+        self.builder.graph.set("predicates", match.predicates)
+        self.builder.graph.set("actions", match.actions)
+        return True
+
+    def remember_domain(self):
+        """Registra il dominio della quest appena risolta nell'indice delle lore."""
+        if self.lore_index is None or self.builder is None:
+            return
+        graph = self.builder.graph
+        self.lore_index.add(self.current_lore, graph.get("predicates"), graph.get("actions"))
+
+    @traced("pipeline.regenerate")
+    def regenerate(self, diagnosis: Diagnosis):
+        """Rigenera solo i componenti guasti indicati dalla diagnosi (e ciò che ne dipende)."""
+        if self.builder is None:
+            return self.generate_initial_pddl()
+        if diagnosis.is_empty():
+            # Nessun errore localizzato: il sospettato principale è il goal
+            diagnosis.goal = True
+        self.builder.apply(diagnosis)
+        domain, problem_path = self.builder.build()
+        print(f"♻️ Rigenerati: {', '.join(self.builder.graph.rebuilt) or 'nessun componente'}")
 
-        write_to_file(self.current_domain, "domain.pddl")
-        write_to_file(self.current_problem, "problem.pddl")
+        if domain != self.current_domain:
+            self.current_domain = domain
+            write_to_file(domain, "domain.pddl", self.output_dir)
+        if "problem" in self.builder.graph.rebuilt:
+            self._load_problem(problem_path)
 
-    def validate_and_refine(self, max_iter=3):
+    def try_alternative(self) -> bool:
+        """Passa al candidato alternativo già valutato, se esiste: nessuna chiamata LLM."""
+        alternative = self.builder.next_alternative() if self.builder else None
+        if alternative is None:
+            return False
+        print(f"🔀 Provo il candidato alternativo ({self.builder.selected.summary()})")
+        self.current_domain, problem_path = alternative
+        write_to_file(self.current_domain, "domain.pddl", self.output_dir)
+        self._load_problem(problem_path)
+        return True
+
+    @traced("pipeline.check_lore_constraints")
+    def check_lore_constraints(self, plan):
+        """Confronta profondità e branching del piano con i limiti della lore (solo avvisi)."""
+        try:
+            self.plan_report = validate_plan(self.current_domain, self.current_problem, plan, self.current_lore)
+        except (PDDLParseError, GroundingError) as e:
+            print(f"↪️ Controllo dei vincoli della lore saltato ({e}).")
+            return None
+        for violation in self.plan_report.lore_violations:
+            print(f"⚠️ {violation}")
+        return self.plan_report
+
+    def validate_and_refine(self, max_iter=3, interactive: bool = True):
+        """
+        Valida e pianifica. Se qualcosa non va, rigenera solo i componenti diagnosticati
+        come guasti. Con interactive=False non chiede conferma e rigenera automaticamente.
+        """
         for i in range(max_iter):
-            print(f"\nITERAZIONE {i+1}")
-            if not (validate_pddl_syntax(self.current_domain) and validate_pddl_syntax(self.current_problem)):
-                print("❌ Sintassi non valida. Provo a correggere...")
-                reflection = self.reflection_agent.analyze_pddl_errors(self.current_domain, self.current_problem, ["Errore sintattico"])
-                print(reflection["suggestions"])
-                continue
-
-            plan = run_fast_downward("output/domain.pddl", "output/problem.pddl", lore=self.current_lore)
-            if plan:
-                print(f"✅ Piano trovato con {len(plan)} azioni:")
-                for a in plan:
-                    print(f"  ➤ {a}")
-                write_to_file("\n".join(plan), "plan.txt")
-                return True
-
-            print("❌ Nessun piano trovato. Suggerimenti:")
-            suggestion = self.reflection_agent.suggest_improvements(self.current_lore, self.current_domain, self.current_problem)
-            print(suggestion["suggestions"])
-            choice = input("Vuoi rigenerare? [y/n]: ").lower()
-            if choice == 'y':
-                self.generate_initial_pddl()
-        return False
\ No newline at end of file
+            with span("pipeline.iteration", iteration=i + 1):
+                print(f"\nITERAZIONE {i+1}")
+                with span("pipeline.syntax_check"):
+                    syntax_ok = validate_pddl_syntax(self.current_domain) and validate_pddl_syntax(self.current_problem)
+                if not syntax_ok:
+                    print("❌ Sintassi non valida. Provo a correggere...")
+                    reflection = self.reflection_agent.analyze_pddl_errors(self.current_domain, self.current_problem, ["Errore sintattico"])
+                    print(reflection["suggestions"])
+                    issues = find_pddl_issues(self.current_domain, self.current_problem)
+                    diagnosis = diagnose(issues, reflection["suggestions"])
+                else:
+                    with span("pipeline.semantic_check"):
+                        issues = find_pddl_issues(self.current_domain, self.current_problem)
+                    if issues:
+                        print("❌ Errori semantici nel PDDL:")
+                        for e in issues:
+                            print(f"  ➤ {e}")
+                        reflection = self.reflection_agent.analyze_pddl_errors(
+                            self.current_domain, self.current_problem, [str(e) for e in issues], issues)
+                        print(reflection["suggestions"])
+                        diagnosis = diagnose(issues, reflection["suggestions"])
+                    else:
+                        with span("pipeline.reachability"):
+                            report = analyze_pddl(self.current_domain, self.current_problem)
+                        if report is not None and report.hopeless:
+                            print(f"🚫 Analisi statica ({report.elapsed * 1000:.1f} ms): goal irraggiungibile, salto il planner.")
+                            print(report.summary())
+                            if self.try_alternative():
+                                continue
+                            diagnosis = diagnose(report.issues, report.summary())
+                            choice = input("Vuoi rigenerare? [y/n]: ").lower() if interactive else 'y'
+                            if choice == 'y':
+                                self.regenerate(diagnosis)
+                            continue
+
+                        with span("pipeline.find_plan"):
+                            plan = find_plan(os.path.join(self.output_dir, "domain.pddl"),
+                                             os.path.join(self.output_dir, "problem.pddl"), lore=self.current_lore,
+                                             store=self.store)
+                        if plan:
+                            print(f"✅ Piano trovato con {len(plan)} azioni:")
+                            for a in plan:
+                                print(f"  ➤ {a}")
+                            write_to_file("\n".join(plan), "plan.txt", self.output_dir)
+                            self.current_plan = plan
+                            self.check_lore_constraints(plan)
+                            self.remember_domain()
+                            return True
+
+                        if self.try_alternative():
+                            continue
+
+                        print("❌ Nessun piano trovato. Suggerimenti:")
+                        suggestion = self.reflection_agent.suggest_improvements(self.current_lore, self.current_domain, self.current_problem)
+                        print(suggestion["suggestions"])
+                        diagnosis = Diagnosis(feedback=suggestion["suggestions"])
+
+                choice = input("Vuoi rigenerare? [y/n]: ").lower() if interactive else 'y'
+                if choice == 'y':
+                    self.regenerate(diagnosis)
+        return False
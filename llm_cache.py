@@ -0,0 +1,206 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from llm_interface import LLMInterface
+from tracing import annotate, span
+
+DEFAULT_CACHE_PATH = ".cache/llm_responses.sqlite"
+
+
+class ResponseCache:
+    """
+    Cache persistente su SQLite delle risposte LLM, indirizzata per contenuto.
+    Le voci più vecchie di max_age secondi vengono scartate; oltre max_entries
+    si eliminano quelle usate meno di recente.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_entries: int = 5000,
+                 max_age: float = 30 * 24 * 3600):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        if path != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                model TEXT,
+                response TEXT NOT NULL,
+                created REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(model: str, system: str, prompt: str, temperature: float, max_tokens: int) -> str:
+        payload = json.dumps(
+            {
+                "model": model,
+                "system": system,
+                "prompt": prompt,
+                "temperature": temperature,
+                "max_tokens": max_tokens,
+            },
+            sort_keys=True,
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.max_age:
+                if row is not None:
+                    self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self._conn.commit()
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, model: str, response: str):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, response, created, last_access) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, model, response, now, now),
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now: float):
+        self._conn.execute("DELETE FROM responses WHERE created < ?", (now - self.max_age,))
+        count = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        excess = count - self.max_entries
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM responses WHERE key IN "
+                "(SELECT key FROM responses ORDER BY last_access ASC LIMIT ?)",
+                (excess,),
+            )
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "entries": entries}
+
+
+class CachedLLMClient(LLMInterface):
+    """
+    Avvolge un qualsiasi LLMInterface e memorizza le risposte su disco.
+    La chiave include modello, messaggio di sistema, prompt, temperature e max_tokens
+    del client avvolto. Con enabled=False (o LLM_CACHE_BYPASS=1) la cache viene ignorata.
+    Le risposte in streaming interrotte da stop_when si memorizzano solo se la condizione
+    di stop ha un cache_key (vedi pddl_stream).
+    """
+
+    def __init__(self, llm: LLMInterface, cache: Optional[ResponseCache] = None,
+                 enabled: Optional[bool] = None):
+        self.llm = llm
+        self.cache = cache if cache is not None else ResponseCache()
+        if enabled is None:
+            enabled = os.getenv("LLM_CACHE_BYPASS", "") not in ("1", "true", "yes")
+        self.enabled = enabled
+
+    def __getattr__(self, name):
+        # Espone gli attributi del client avvolto (es. model)
+        if name == "llm":
+            raise AttributeError(name)
+        return getattr(self.llm, name)
+
+    def _key(self, prompt: str) -> str:
+        return ResponseCache.make_key(
+            model=getattr(self.llm, "model", type(self.llm).__name__),
+            system=getattr(self.llm, "system_message", ""),
+            prompt=prompt,
+            temperature=getattr(self.llm, "temperature", None),
+            max_tokens=getattr(self.llm, "max_tokens", None),
+        )
+
+    def _lookup(self, prompt: str):
+        key = self._key(prompt)
+        with span("llm.cache_lookup", "llm"):
+            cached = self.cache.get(key)
+            annotate(hit=cached is not None)
+        return cached, key
+
+    def run_prompt(self, prompt: str) -> str:
+        if not self.enabled:
+            return self.llm.run_prompt(prompt)
+
+        cached, key = self._lookup(prompt)
+        if cached is not None:
+            return cached
+
+        result = self.llm.run_prompt(prompt)
+        self.cache.put(key, getattr(self.llm, "model", type(self.llm).__name__), result)
+        return result
+
+    def run_prompt_streaming(self, prompt: str, stop_when: Optional[Callable[[str], bool]] = None) -> str:
+        if not hasattr(self.llm, "run_prompt_streaming"):
+            return self.run_prompt(prompt)
+        if not self.enabled:
+            return self.llm.run_prompt_streaming(prompt, stop_when)
+
+        # Una condizione di stop con cache_key (es. stop_after_goal) rende la risposta troncata
+        # riproducibile: la si memorizza sotto una chiave che include la condizione. Senza
+        # cache_key una risposta interrotta non si memorizza: sotto la chiave di run_prompt
+        # verrebbe restituita anche a chi chiede il testo completo.
+        stop_key = getattr(stop_when, "cache_key", None)
+        cached, key = self._lookup(prompt if stop_key is None else prompt + f"\n#stop={stop_key}")
+        if cached is not None:
+            return cached
+
+        stopped = False
+
+        def stop(text: str) -> bool:
+            nonlocal stopped
+            stopped = stop_when(text)
+            return stopped
+
+        result = self.llm.run_prompt_streaming(prompt, stop if stop_when is not None else None)
+        if stop_key is not None or not stopped:
+            self.cache.put(key, getattr(self.llm, "model", type(self.llm).__name__), result)
+        return result
+
+    def run_prompt_candidates(self, prompt: str, n: int) -> List[str]:
+        if n == 1:
+            return [self.run_prompt(prompt)]
+        if not self.enabled:
+            return self.llm.run_prompt_candidates(prompt, n)
+
+        cached, key = self._lookup(prompt + f"\n#candidates={n}")
+        if cached is not None:
+            return json.loads(cached)
+
+        results = self.llm.run_prompt_candidates(prompt, n)
+        self.cache.put(key, getattr(self.llm, "model", type(self.llm).__name__), json.dumps(results))
+        return results
+
+    def stats(self) -> Dict[str, int]:
+        return self.cache.stats()
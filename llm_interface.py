@@ -1,8 +1,25 @@
 # llm_interface.py
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
 
 class LLMInterface(ABC):
     @abstractmethod
     def run_prompt(self, prompt: str) -> str:
         pass
 
+    def run_prompt_candidates(self, prompt: str, n: int) -> List[str]:
+        """
+        n risposte alternative allo stesso prompt. Di default n chiamate in parallelo:
+        la prima con il prompt invariato, le altre con una richiesta di variante
+        (prompt diversi, così cache e replay non restituiscono sempre la stessa risposta).
+        """
+        prompts = [prompt] + [candidate_prompt(prompt, i) for i in range(1, n)]
+        if n == 1:
+            return [self.run_prompt(prompt)]
+        with ThreadPoolExecutor(max_workers=n) as pool:
+            return list(pool.map(self.run_prompt, prompts))
+
+
+def candidate_prompt(prompt: str, index: int) -> str:
+    return f"{prompt}\n\n(Proposta alternativa n. {index + 1}: segui un'impostazione diversa dalle precedenti.)"
@@ -1,5 +1,7 @@
 from llm_interface import LLMInterface
-from typing import Literal
+from prompt_builder import PromptBuilder
+from tracing import traced
+from typing import Literal, Optional
 
 class LLM_PDDLRefiner:
     """
@@ -7,22 +9,23 @@ class LLM_PDDLRefiner:
     Lavora SOLO a livello sintattico e semantico, senza aggiunte creative.
     """
 
-    def __init__(self, llm: LLMInterface):
+    def __init__(self, llm: LLMInterface, prompt_budget: Optional[int] = None):
         self.llm = llm
+        self.prompt_budget = prompt_budget
 
+    @traced("refiner.refine_goal", "refine")
     def refine_goal(self, goal: str, declared_predicates: list[str]) -> str:
         """
         Elimina o corregge predicati non presenti tra quelli dichiarati.
         """
-        prompt = f"""
-Sei un assistente per la validazione di PDDL.
-
-Ecco la lista dei predicati dichiarati nel dominio:
-{chr(10).join(f"- {p}" for p in declared_predicates)}
-
-Ecco il goal attuale (può contenere predicati errati):
-{goal}
-
+        # Qui i predicati non si possono tagliare: servono tutti per correggere il goal
+        prompt = (
+            PromptBuilder(max_tokens=self.prompt_budget)
+            .add("Sei un assistente per la validazione di PDDL.", required=True)
+            .add("\n".join(f"- {p}" for p in declared_predicates),
+                 "Ecco la lista dei predicati dichiarati nel dominio", required=True)
+            .add(goal, "Ecco il goal attuale (può contenere predicati errati)", required=True)
+            .add("""
 ✅ Compito:
 - Rimuovi o correggi i predicati che NON sono nella lista.
 - Non aggiungere nulla.
@@ -30,9 +33,12 @@ Ecco il goal attuale (può contenere predicati errati):
 - Non usare commenti né spiegazioni.
 
 Risultato:
-"""
+""", required=True)
+            .build()
+        )
         return self.llm.run_prompt(prompt).strip()
 
+    @traced("refiner.refine_predicates", "refine")
     def refine_predicates(self, raw_predicates: list[str]) -> list[str]:
         """
         Rimuove predicati non validi (con nomi narrativi, variabili malformate o assenti).
@@ -56,7 +62,11 @@ REGOLE:
 
 Restituisci solo quelli validi, uno per riga:
 """
-        input_block = "\n".join(raw_predicates)
-        full_prompt = f"{prompt}\n{input_block}"
+        full_prompt = (
+            PromptBuilder(max_tokens=self.prompt_budget)
+            .add(prompt, required=True)
+            .add("\n".join(raw_predicates), required=True)
+            .build()
+        )
         cleaned = self.llm.run_prompt(full_prompt).strip()
         return [line.strip() for line in cleaned.splitlines() if line.startswith("(")]
@@ -1,8 +1,36 @@
 from pydantic import BaseModel, Field, validator
-from typing import List, Tuple, Optional
-import yaml
+from typing import Dict, List, Tuple, Optional
 import os
 
+TOPOLOGIES = ("chain", "adjacency", "grid", "random")
+
+
+class Topology(BaseModel):
+    """
+    Mappa dei luoghi: "chain" collega i luoghi in fila (comportamento storico), "adjacency"
+    usa le liste di adiacenza, "grid" dispone i luoghi per righe di width colonne, "random"
+    genera una mappa connessa (albero casuale più extra_edges archi medi per luogo) da seed.
+    """
+    kind: str = "chain"
+    adjacency: Dict[str, List[str]] = Field(default_factory=dict)
+    width: Optional[int] = None
+    seed: int = 0
+    extra_edges: float = 0.5
+    bidirectional: bool = True
+
+    @validator("kind")
+    def check_kind(cls, v):
+        if v not in TOPOLOGIES:
+            raise ValueError(f"Topologia sconosciuta '{v}' (ammesse: {', '.join(TOPOLOGIES)})")
+        return v
+
+    @validator("width")
+    def check_width(cls, v):
+        if v is not None and v <= 0:
+            raise ValueError("La larghezza della griglia deve essere positiva")
+        return v
+
+
 class LoreDocument(BaseModel):
     quest_description: str
     branching_factor: Tuple[int, int]
@@ -12,6 +40,9 @@ class LoreDocument(BaseModel):
     locations: List[str] = Field(default_factory=list)
     items: List[str] = Field(default_factory=list)
     constraints: List[str] = Field(default_factory=list)
+    topology: Topology = Field(default_factory=Topology)
+    # Posizione iniziale esplicita (entità -> luogo); senza, personaggi nel primo luogo e oggetti nell'ultimo
+    placements: Dict[str, str] = Field(default_factory=dict)
 
     @validator("branching_factor", "depth_constraints")
     def check_tuple_length(cls, v):
@@ -19,13 +50,35 @@ class LoreDocument(BaseModel):
             raise ValueError("I vincoli devono avere esattamente due elementi (min, max)")
         return v
 
+    @validator("topology")
+    def check_topology(cls, v, values):
+        locations = {l.strip() for l in values.get("locations", [])}
+        for a, neighbours in v.adjacency.items():
+            for name in [a] + neighbours:
+                if name.strip() not in locations:
+                    raise ValueError(f"Luogo sconosciuto nella mappa: '{name}'")
+        return v
+
+    @validator("placements")
+    def check_placements(cls, v, values):
+        locations = {l.strip() for l in values.get("locations", [])}
+        entities = {e.strip() for e in values.get("characters", []) + values.get("items", [])}
+        for entity, location in v.items():
+            if entity.strip() not in entities:
+                raise ValueError(f"Entità sconosciuta nelle posizioni iniziali: '{entity}'")
+            if location.strip() not in locations:
+                raise ValueError(f"Luogo sconosciuto per '{entity}': '{location}'")
+        return v
+
     def to_yaml(self, path: str):
+        import yaml  # importato solo quando serve: rallenta l'avvio
         os.makedirs(os.path.dirname(path), exist_ok=True)
         with open(path, 'w', encoding='utf-8') as f:
             yaml.dump(self.dict(), f, allow_unicode=True)
 
     @staticmethod
     def from_yaml(path: str) -> 'LoreDocument':
+        import yaml
         with open(path, 'r', encoding='utf-8') as f:
             data = yaml.safe_load(f)
         return LoreDocument(**data)
@@ -0,0 +1,221 @@
+import hashlib
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+from lore import LoreDocument
+from pddl_inferencer import normalize_name
+from pddl_parser import PDDLParseError, iter_atoms, parse_action
+from tracing import annotate, span
+
+DEFAULT_INDEX_PATH = ".cache/lore_index.sqlite"
+
+_WORD = re.compile(r"[^\W_]+")
+_STOPWORDS = {
+    # italiano
+    "che", "del", "della", "delle", "dei", "degli", "dal", "dalla", "nel", "nella", "nei", "con", "per",
+    "una", "uno", "gli", "le", "il", "lo", "la", "di", "da", "in", "su", "tra", "fra", "non", "sono",
+    "suo", "sua", "loro", "deve", "devono", "dove", "come", "anche", "alla", "allo", "agli", "alle",
+    # inglese
+    "the", "and", "for", "with", "from", "that", "this", "into", "must", "are", "has", "have", "its",
+}
+
+
+def _words(text: str) -> List[str]:
+    return [w for w in _WORD.findall((text or "").lower()) if len(w) > 2 and w not in _STOPWORDS]
+
+
+def lore_terms(lore: LoreDocument) -> Counter:
+    """
+    Termini della lore per la similarità: parole di descrizione e contesto, più i nomi delle
+    entità prefissati dalla loro categoria (character:, location:, item:).
+    """
+    terms = Counter(_words(lore.quest_description) + _words(lore.world_context))
+    for kind, names in (("character", lore.characters), ("location", lore.locations), ("item", lore.items)):
+        for name in names or []:
+            for word in _words(name.replace("_", " ")):
+                terms[f"{kind}:{word}"] += 1
+    return terms
+
+
+def adapt_actions(actions: List[str], lore: LoreDocument) -> List[str]:
+    """
+    Adattamento leggero di azioni riusate: si scartano quelle che nominano costanti
+    (personaggi, luoghi, oggetti) che non esistono nella nuova lore. Il confronto usa la
+    stessa normalizzazione dei nomi dell'inferencer e non distingue maiuscole (come il PDDL).
+    """
+    objects = {normalize_name(n) for n in (lore.characters or []) + (lore.locations or []) + (lore.items or [])}
+    kept = []
+    for text in actions:
+        try:
+            action = parse_action(text)
+        except PDDLParseError:
+            continue
+        constants = {normalize_name(arg) for f in (action.precondition, action.effect)
+                     for atom, _ in iter_atoms(f) for arg in atom.args if not arg.startswith("?")}
+        if constants <= objects:
+            kept.append(text)
+    return kept
+
+
+@dataclass
+class ReusedDomain:
+    similarity: float
+    predicates: List[str]
+    actions: List[str]
+    source: str           # descrizione della quest da cui viene il dominio
+    dropped: int = 0      # azioni scartate dall'adattamento
+
+
+class LoreIndex:
+    """
+    Indice di similarità (TF-IDF, coseno) sulle lore delle esecuzioni riuscite, con i loro
+    predicati e azioni. Una nuova lore abbastanza simile a una già risolta può riusarne il
+    dominio: restano da generare solo goal e problema. Le voci stanno in SQLite; in memoria
+    si tengono termini, frequenze di documento e liste invertite, sincronizzate con le righe
+    aggiunte da altri processi a ogni ricerca.
+    """
+
+    def __init__(self, path: str = DEFAULT_INDEX_PATH, threshold: float = 0.6, min_kept: float = 0.5):
+        self.path = path
+        self.threshold = threshold
+        self.min_kept = min_kept  # frazione minima di azioni che devono sopravvivere all'adattamento
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._terms: Dict[int, Counter] = {}
+        self._df: Counter = Counter()
+        self._postings: Dict[str, Set[int]] = {}
+        self._last_id = 0
+
+        if path != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS runs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                key TEXT UNIQUE NOT NULL,
+                description TEXT NOT NULL,
+                terms TEXT NOT NULL,
+                predicates TEXT NOT NULL,
+                actions TEXT NOT NULL,
+                created REAL NOT NULL,
+                uses INTEGER NOT NULL DEFAULT 0
+            )
+            """
+        )
+        self._conn.commit()
+        with self._lock:
+            self._sync()
+
+    def _sync(self):
+        rows = self._conn.execute("SELECT id, terms FROM runs WHERE id > ? ORDER BY id", (self._last_id,)).fetchall()
+        for run_id, terms in rows:
+            counts = Counter(json.loads(terms))
+            self._terms[run_id] = counts
+            self._df.update(counts.keys())
+            for term in counts:
+                self._postings.setdefault(term, set()).add(run_id)
+            self._last_id = run_id
+
+    def _weights(self, counts: Counter) -> Dict[str, float]:
+        n = len(self._terms)
+        return {t: (1 + math.log(c)) * (math.log((1 + n) / (1 + self._df.get(t, 0))) + 1)
+                for t, c in counts.items()}
+
+    @staticmethod
+    def _cosine(a: Dict[str, float], b: Dict[str, float]) -> float:
+        dot = sum(w * b[t] for t, w in a.items() if t in b)
+        norm = math.sqrt(sum(w * w for w in a.values())) * math.sqrt(sum(w * w for w in b.values()))
+        return dot / norm if norm else 0.0
+
+    def search(self, lore: LoreDocument, k: int = 3) -> List[Tuple[float, int]]:
+        """Le k esecuzioni più simili come (similarità, id), dalla più simile."""
+        query = lore_terms(lore)
+        with self._lock:
+            self._sync()
+            # Solo i documenti che condividono almeno un termine con la lore
+            candidates = set().union(*(self._postings.get(t, set()) for t in query)) if query else set()
+            q = self._weights(query)
+            scored = [(self._cosine(q, self._weights(self._terms[i])), i) for i in candidates]
+        return sorted(scored, key=lambda s: (-s[0], -s[1]))[:k]
+
+    def add(self, lore: LoreDocument, predicates: List[str], actions: List[str]) -> bool:
+        """Registra il dominio di un'esecuzione riuscita; False se era già presente."""
+        payload = json.dumps([lore.dict(), sorted(predicates), sorted(actions)], sort_keys=True, ensure_ascii=False)
+        key = hashlib.sha256(payload.encode("utf-8")).hexdigest()
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO runs (key, description, terms, predicates, actions, created) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, lore.quest_description, json.dumps(lore_terms(lore), ensure_ascii=False),
+                 json.dumps(predicates, ensure_ascii=False), json.dumps(actions, ensure_ascii=False), time.time()),
+            )
+            self._conn.commit()
+            self._sync()
+        return cursor.rowcount > 0
+
+    def find_domain(self, lore: LoreDocument) -> Optional[ReusedDomain]:
+        """Dominio riusabile per la lore: il più simile sopra soglia che sopravvive all'adattamento."""
+        with span("lore_index.lookup", "store"):
+            for similarity, run_id in self.search(lore):
+                if similarity < self.threshold:
+                    break
+                with self._lock:
+                    description, predicates, actions = self._conn.execute(
+                        "SELECT description, predicates, actions FROM runs WHERE id = ?", (run_id,)).fetchone()
+                actions = json.loads(actions)
+                kept = adapt_actions(actions, lore)
+                if not kept or len(kept) < self.min_kept * len(actions):
+                    continue
+                with self._lock:
+                    self._conn.execute("UPDATE runs SET uses = uses + 1 WHERE id = ?", (run_id,))
+                    self._conn.commit()
+                    self.hits += 1
+                annotate(hit=True, similarity=round(similarity, 3))
+                return ReusedDomain(similarity, json.loads(predicates), kept, description, len(actions) - len(kept))
+            with self._lock:
+                self.misses += 1
+            annotate(hit=False)
+        return None
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM runs")
+            self._conn.commit()
+            self._terms.clear()
+            self._df.clear()
+            self._postings.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM runs").fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "entries": entries}
+
+
+_indexes: Dict[str, LoreIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def default_lore_index() -> Optional[LoreIndex]:
+    """
+    Indice condiviso dal processo (LORE_INDEX, soglia LORE_REUSE_THRESHOLD);
+    LORE_INDEX=0 disattiva il riuso dei domini.
+    """
+    path = os.getenv("LORE_INDEX", DEFAULT_INDEX_PATH)
+    if path.lower() in ("0", "false", "no", ""):
+        return None
+    with _indexes_lock:
+        index = _indexes.get(path)
+        if index is None:
+            index = _indexes[path] = LoreIndex(path, float(os.getenv("LORE_REUSE_THRESHOLD", "0.6")))
+        return index
@@ -1,5 +1,9 @@
 # main.py
+from utils import load_env
+load_env()  # prima degli altri import: alcuni moduli leggono l'ambiente all'import
+
 from interactive_story_generator import InteractiveStoryGenerator
+from tracing import get_tracer
 
 def main():
     print("\U0001F3AE GENERATORE INTERATTIVO DI STORIE PDDL")
@@ -26,5 +30,23 @@ def main():
     else:
         print("\n❌ Fallita generazione storia")
 
+    stats = generator.llm.stats()
+    print(f"🗄️ Cache LLM: {stats['hits']} hit, {stats['misses']} miss, {stats['entries']} voci")
+    if generator.store is not None:
+        stats = generator.store.stats()
+        print(f"📦 Archivio artefatti: {stats['hits']} esiti riusati, {stats['entries']} voci "
+              f"({stats['bytes'] / 2 ** 20:.1f} MB)")
+    if generator.lore_index is not None:
+        stats = generator.lore_index.stats()
+        print(f"♻️ Indice delle lore: {stats['hits']} domini riusati, {stats['entries']} quest indicizzate")
+    limiter = getattr(generator.llm, "limiter", None)
+    if limiter is not None:
+        print(limiter.format_stats())
+
+    tracer = get_tracer()
+    tracer.print_summary()
+    tracer.export(generator.output_dir)
+    print(f"🧭 Trace salvata in {generator.output_dir}/trace.json (Chrome: trace.chrome.json)")
+
 if __name__ == '__main__':
     main()
\ No newline at end of file
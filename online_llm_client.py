@@ -1,47 +1,185 @@
-# online_llm_client.py
-import requests
+import json
 import time
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Callable, Iterator, List, Optional, Tuple
 from llm_interface import LLMInterface
-import os
-from dotenv import load_dotenv
+from prompt_builder import count_tokens
+from rate_limiter import RateLimiter, backoff_delay, get_rate_limiter, retry_after_seconds
+from tracing import annotate, get_tracer, span
 
-load_dotenv()
-api_key = os.getenv("TOGETHER_API_KEY")
+if TYPE_CHECKING:
+    import requests
+    from rate_limiter import _Slot
+
+# Risposte che indicano sovraccarico del provider: si riprova dopo una pausa
+THROTTLE_STATUS = (429, 503)
 
 class OnlineLLMClient(LLMInterface):
-    def __init__(self, model: str = "deepseek-ai/DeepSeek-R1", api_key: str = ""):
-        self.api_url = "https://api.together.xyz/v1/chat/completions"
+    def __init__(self, model: str = "deepseek-ai/DeepSeek-R1", api_key: str = "",
+                 temperature: float = 0.7, max_tokens: int = 1024,
+                 api_url: str = "https://api.together.xyz/v1/chat/completions",
+                 pool_size: int = 8, timeout: float = 300, max_retries: int = 6,
+                 rate_limiter: Optional[RateLimiter] = None):
+        self.api_url = api_url
         self.headers = {
             "Authorization": f"Bearer {api_key}",
             "Content-Type": "application/json"
         }
         self.model = model
+        self.system_message = "Sei un assistente esperto in PDDL."
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+        self.timeout = timeout
+        self.max_retries = max_retries
+        # Condiviso da tutti i client dello stesso endpoint/modello nel processo
+        self.limiter = rate_limiter or get_rate_limiter(api_url, model)
 
-    def run_prompt(self, prompt: str) -> str:
+        # requests pesa all'avvio: si importa solo quando serve davvero un client online
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        # Sessione con connessioni keep-alive riutilizzate tra i prompt (e tra i thread)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update(self.headers)
+        self.transport_errors = (requests.ConnectionError, requests.Timeout)
+
+    def _build_body(self, prompt: str, stream: bool = False) -> dict:
         body = {
             "model": self.model,
             "messages": [
-                {"role": "system", "content": "Sei un assistente esperto in PDDL."},
+                {"role": "system", "content": self.system_message},
                 {"role": "user", "content": prompt}
             ],
-            "max_tokens": 1024,
-            "temperature": 0.7
+            "max_tokens": self.max_tokens,
+            "temperature": self.temperature
         }
+        if stream:
+            body["stream"] = True
+        return body
+
+    @contextmanager
+    def _request(self, body: dict, stream: bool = False) -> Iterator[Tuple["requests.Response", "_Slot"]]:
+        """
+        POST passando dal limitatore condiviso: lo slot resta occupato finché la risposta
+        (anche in streaming) non è stata letta. 429/503, connessioni rifiutate o cadute e timeout
+        sono trattati come sovraccarico del provider: si segnalano al limitatore (pausa e
+        riduzione della concorrenza) e si ripete rispettando Retry-After, fino a max_retries.
+        Gli errori durante la lettura di una risposta già iniziata non vengono ripetuti.
+        """
+        estimate = count_tokens(body["messages"][-1]["content"]) + body["max_tokens"] * body.get("n", 1)
+        for attempt in range(self.max_retries + 1):
+            with self.limiter.slot(estimate) as slot:
+                try:
+                    response = self.session.post(self.api_url, json=body, stream=stream, timeout=self.timeout)
+                except self.transport_errors as e:
+                    reason, retry_after = f"Errore di connessione ({type(e).__name__}: {e})", None
+                else:
+                    if response.status_code not in THROTTLE_STATUS:
+                        try:
+                            response.raise_for_status()
+                        except Exception as e:
+                            print(f"❌ Errore nella risposta LLM: {e}")
+                            print("👉 Risposta server:", response.text)
+                            response.close()
+                            raise
+                        try:
+                            yield response, slot
+                        finally:
+                            response.close()
+                        return
+                    response.close()
+                    # Respinta senza elaborarla: la prenotazione non va contata due volte col nuovo tentativo
+                    slot.refund()
+                    reason, retry_after = f"Rate limit ({response.status_code})", retry_after_seconds(response.headers)
 
-        for attempt in range(3):
-            response = requests.post(self.api_url, json=body, headers=self.headers)
-            if response.status_code == 429:
-                wait = 2 ** attempt
-                print(f"⚠️ Rate limit. Riprovo tra {wait}s...")
-                time.sleep(wait)
-                continue
+                # Sovraccarico: la pausa vale per tutti i thread del processo, anche all'ultimo tentativo
+                wait = backoff_delay(attempt, retry_after)
+                slot.throttle(wait)
+                if attempt == self.max_retries:
+                    raise RuntimeError(f"❌ Troppi tentativi falliti ({self.max_retries + 1}), ultimo errore: {reason}")
+                print(f"⚠️ {reason}. Riprovo tra {wait:.1f}s...")
+                get_tracer().increment("retries")
+
+    def run_prompt(self, prompt: str) -> str:
+        with span("llm.run_prompt", "llm", model=self.model, retries=0):
+            with self._request(self._build_body(prompt)) as (response, slot):
+                try:
+                    data = response.json()
+                    content = data["choices"][0]["message"]["content"].strip()
+                except Exception as e:
+                    print(f"❌ Errore nella risposta LLM: {e}")
+                    print("👉 Risposta server:", response.text)
+                    raise
+                usage = data.get("usage") or {}
+                prompt_tokens = usage.get("prompt_tokens", count_tokens(prompt))
+                completion_tokens = usage.get("completion_tokens", count_tokens(content))
+                slot.settle(prompt_tokens + completion_tokens)
+            annotate(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+            return content
+
+    def run_prompt_candidates(self, prompt: str, n: int) -> List[str]:
+        """n risposte alternative con una sola richiesta (parametro n dell'API)."""
+        if n == 1:
+            return [self.run_prompt(prompt)]
+        with span("llm.run_prompt_candidates", "llm", model=self.model, retries=0, n=n):
+            body = self._build_body(prompt)
+            body["n"] = n
+            with self._request(body) as (response, slot):
+                data = response.json()
+                contents = [c["message"]["content"].strip() for c in data.get("choices") or []]
+                usage = data.get("usage") or {}
+                completion_tokens = usage.get("completion_tokens", sum(count_tokens(c) for c in contents))
+                slot.settle(usage.get("prompt_tokens", count_tokens(prompt)) + completion_tokens)
+            annotate(completion_tokens=completion_tokens)
+            if not contents:
+                raise RuntimeError("❌ Nessuna risposta dal provider.")
+            return contents
+
+    def stream_prompt(self, prompt: str) -> Iterator[str]:
+        """
+        Invia il prompt in modalità streaming (SSE) e restituisce i token man mano che arrivano.
+        Chiudere il generatore chiude anche la connessione.
+        """
+        with self._request(self._build_body(prompt, stream=True), stream=True) as (response, slot):
+            used = count_tokens(prompt)
+            try:
+                for line in response.iter_lines(decode_unicode=True):
+                    if not line or not line.startswith("data:"):
+                        continue
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]":
+                        break
+                    choices = json.loads(data).get("choices") or []
+                    if not choices:
+                        continue
+                    token = (choices[0].get("delta") or {}).get("content")
+                    if token:
+                        used += 1  # i chunk SSE contengono di norma un token
+                        yield token
+            finally:
+                slot.settle(used)  # anche se lo stream viene chiuso in anticipo
 
+    def run_prompt_streaming(self, prompt: str, stop_when: Optional[Callable[[str], bool]] = None) -> str:
+        """
+        Come run_prompt, ma legge la risposta in streaming e interrompe la generazione
+        appena stop_when(testo_accumulato) restituisce True.
+        """
+        with span("llm.run_prompt_streaming", "llm", model=self.model, retries=0, stopped_early=False):
+            start = time.perf_counter()
+            text = ""
+            stream = self.stream_prompt(prompt)
             try:
-                response.raise_for_status()
-                return response.json()["choices"][0]["message"]["content"].strip()
-            except Exception as e:
-                print(f"❌ Errore nella risposta LLM: {e}")
-                print("👉 Risposta server:", response.text)
-                raise
-
-        raise RuntimeError("❌ Troppi tentativi falliti.")
+                for token in stream:
+                    if not text:
+                        annotate(first_token_s=round(time.perf_counter() - start, 3))
+                    text += token
+                    if stop_when is not None and stop_when(text):
+                        annotate(stopped_early=True)
+                        break
+            finally:
+                stream.close()
+            annotate(prompt_tokens=count_tokens(prompt), completion_tokens=count_tokens(text))
+            return text.strip()
@@ -1,65 +1,123 @@
-from typing import List
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
 from lore import LoreDocument
-from online_llm_client import OnlineLLMClient
-from langchain.prompts import ChatPromptTemplate
+from llm_interface import LLMInterface
+from pddl_stream import SExprStreamSplitter, stop_after_actions, stop_after_goal
+from prompt_templates import ChatTemplate, register_prompt
+from prompt_builder import PromptBuilder, lore_context
+from tracing import traced
+from pddl_parser import (
+    And, Atom, Not, PDDLParseError, SExpr, build_action, build_formula, iter_atoms,
+    parse_action, parse_predicate, parse_sexpr, parse_sexprs, parse_typed_list,
+)
 import re
 
+_PREDICATES_PROMPT = register_prompt("inferencer.predicates", [
+    ("system", """
+⚠️ ATTENZIONE: Genera SOLO predicati validi in sintassi PDDL STRIPS.
+Non usare testo narrativo. Ogni riga è un predicato.
+
+✅ Formato accettato:
+(nome_predicato ?x - tipo ?y - tipo)
+❌ NON usare ":predicate", "function", testo libero.
+
+Esempi validi:
+(at ?c - character ?l - location)
+(has ?c - character ?i - item)
+(alive ?c - character)
+(connected ?from - location ?to - location)
+
+✅ Restituisci SOLO predicati, uno per riga, senza descrizione.
+"""),
+
+    ("human", "Predicati:")
+])
+
+_ACTIONS_PROMPT = register_prompt("inferencer.actions", [
+    ("system", """
+    ATTENZIONE: genera SOLO azioni PDDL valide in STRIPS.
+    Ogni azione deve seguire esattamente questo template:
+
+    (:action <nome>
+    :parameters (?p1 - tipo1 ?p2 - tipo2 ...)
+    :precondition (and ...)
+    :effect (and ...)
+    )
+
+    Tutte le variabili usate in precondition/effect devono essere dichiarate in :parameters!
+    """),
+    ("human", "Azioni:")
+])
+
+_GOAL_PROMPT = register_prompt("inferencer.goal", [
+    ("system", """
+    ATTENZIONE: genera SOLO il goal PDDL valido.
+    ❌ NON usare variabili con '- tipo' nel goal.
+    ✅ Usa predicati concreti, uno per riga, nel blocco (and ...)
+
+    Esempio corretto:
+    (and (not (alive bandit_leader)) (at hero village))
+    """),
+    ("human", "Goal:")
+])
+
+_ACTION_REPAIR_PROMPT = register_prompt("inferencer.action_repair", [
+    ("system", """
+    ATTENZIONE: correggi SOLO l'azione PDDL indicata e restituiscila in STRIPS valido.
+    Usa esclusivamente i predicati dichiarati, con il numero corretto di argomenti.
+    Tutte le variabili usate in precondition/effect devono essere dichiarate in :parameters!
+    Restituisci una sola azione (:action ...), senza spiegazioni.
+    """),
+    ("human", "Azione da correggere:\n{action}\n\nErrori:\n{errors}\n\nAzione corretta:")
+])
+
+
 class PDDLInferencer:
-    def __init__(self, lore: LoreDocument, llm: OnlineLLMClient):
+    def __init__(self, lore: LoreDocument, llm: LLMInterface, max_actions: Optional[int] = None,
+                 prompt_budget: Optional[int] = None):
         self.lore = lore
         self.llm = llm
+        self.max_actions = max_actions
+        self.prompt_budget = prompt_budget
+        self.lore_prefix = lore_context(lore)  # calcolato una volta, identico in tutti i prompt
         self.replacement_map = self._build_replacement_map()
+        self.entity_matcher = compile_entity_matcher(tuple(self.replacement_map.items()))
 
-    def _build_replacement_map(self) -> dict:
-        def normalize_name(name: str) -> str:
-            # Rimuove spazi e caratteri non validi nei nomi di variabili
-            return name.strip().lower().replace(" ", "_").replace("-", "_")
+    def _run_prompt(self, prompt_text: str, stop_when: Optional[Callable[[str], bool]] = None) -> str:
+        # Se il client supporta lo streaming, interrompe la generazione appena l'output utile è completo
+        if stop_when is not None and hasattr(self.llm, "run_prompt_streaming"):
+            return self.llm.run_prompt_streaming(prompt_text, stop_when)
+        return self.llm.run_prompt(prompt_text)
 
+    def _build_replacement_map(self) -> dict:
         mapping = {}
 
+        # A parità di nome (senza distinzione di maiuscole) vince la prima definizione:
+        # personaggi, poi luoghi, poi oggetti
         for c in self.lore.characters or []:
             var = normalize_name(c)
-            mapping[c] = f"?char_{var} - character"
+            if var:
+                mapping.setdefault(c.strip(), f"?char_{var} - character")
 
         for l in self.lore.locations or []:
             var = normalize_name(l)
-            mapping[l] = f"?loc_{var} - location"
+            if var:
+                mapping.setdefault(l.strip(), f"?loc_{var} - location")
 
         for i in self.lore.items or []:
             var = normalize_name(i)
-            mapping[i] = f"?item_{var} - item"
+            if var:
+                mapping.setdefault(i.strip(), f"?item_{var} - item")
 
         return mapping
 
     def _normalize_text(self, text: str) -> str:
-        for concrete, variable in self.replacement_map.items():
-            pattern = re.compile(rf'\b{re.escape(concrete)}\b', re.IGNORECASE)
-            text = pattern.sub(variable, text)
-        return text
-
-    def infer_predicates(self) -> List[str]:
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", """
-⚠️ ATTENZIONE: Genera SOLO predicati validi in sintassi PDDL STRIPS.
-Non usare testo narrativo. Ogni riga è un predicato.
+        # Un solo passaggio su tutto il testo: i nomi già sostituiti non vengono più toccati
+        return self.entity_matcher.replace(text)
 
-✅ Formato accettato:
-(nome_predicato ?x - tipo ?y - tipo)
-❌ NON usare ":predicate", "function", testo libero.
-
-Esempi validi:
-(at ?c - character ?l - location)
-(has ?c - character ?i - item)
-(alive ?c - character)
-(connected ?from - location ?to - location)
-
-✅ Restituisci SOLO predicati, uno per riga, senza descrizione.
-"""),
-
-            ("human", "Lore: {lore}\n\nPredicati:")
-        ])
-        formatted_prompt = prompt.format_messages(lore=self._format_lore())
-        prompt_text = "\n".join(m.content for m in formatted_prompt)
+    @traced("inferencer.infer_predicates", "inference")
+    def infer_predicates(self, feedback: Optional[str] = None) -> List[str]:
+        prompt_text = self._compose(_PREDICATES_PROMPT, feedback)
         result = self.llm.run_prompt(prompt_text)
         raw_preds = self._parse_list(result)
         normalized_preds = [self._normalize_text(p) for p in raw_preds]
@@ -67,110 +125,152 @@ Esempi validi:
         return sanitized_preds
 
     def _sanitize_predicate(self, predicate: str) -> str:
+        try:
+            decl = parse_predicate(predicate)
+        except PDDLParseError:
+            return predicate
 
         # Rimuove predicati con nomi malformati come knows-?x
-        predicate = re.sub(r'([^\s(]+)-\?[\w_]+', r'\1', predicate)
+        decl.name = decl.name.split("-?")[0]
 
         # Rimuove variabili usate come tipo (!)
-        predicate = re.sub(r'-\s*\?[a-zA-Z0-9_]+', '- object', predicate)
+        for param in decl.params:
+            if param.type.startswith("?"):
+                param.type = "object"
 
-        return predicate
+        return decl.to_pddl()
 
 
-    def infer_actions(self) -> List[str]:
+    @traced("inferencer.infer_actions", "inference")
+    def infer_actions(self, feedback: Optional[str] = None) -> List[str]:
     
 
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", """
-    ATTENZIONE: genera SOLO azioni PDDL valide in STRIPS.
-    Ogni azione deve seguire esattamente questo template:
-
-    (:action <nome>
-    :parameters (?p1 - tipo1 ?p2 - tipo2 ...)
-    :precondition (and ...)
-    :effect (and ...)
-    )
-
-    Tutte le variabili usate in precondition/effect devono essere dichiarate in :parameters!
-    """),
-            ("human", f"Lore: {self._format_lore()}\n\nAzioni:")
-        ])
-
-        formatted_prompt = prompt.format_messages()
-        prompt_text = "\n".join(m.content for m in formatted_prompt)
-        result = self.llm.run_prompt(prompt_text)
+        prompt_text = self._compose(_ACTIONS_PROMPT, feedback)
+        stop_when = stop_after_actions(self.max_actions) if self.max_actions else None
+        return self._parse_actions(self._run_prompt(prompt_text, stop_when))
+
+    @traced("inferencer.infer_actions_candidates", "inference")
+    def infer_actions_candidates(self, n: int, feedback: Optional[str] = None) -> List[List[str]]:
+        """n insiemi di azioni alternativi, generati in parallelo (il primo è quello di infer_actions)."""
+        if n <= 1:
+            return [self.infer_actions(feedback)]
+        results = self.llm.run_prompt_candidates(self._compose(_ACTIONS_PROMPT, feedback), n)
+        return [self._parse_actions(r) for r in results]
+
+    @traced("inferencer.infer_actions_streaming", "inference")
+    def infer_actions_streaming(self, on_action: Callable[[str], None],
+                                feedback: Optional[str] = None) -> List[str]:
+        """
+        Come infer_actions, ma ogni azione viene pulita e passata a on_action appena il suo
+        blocco (:action ...) si chiude nella risposta, mentre il resto è ancora in arrivo.
+        """
+        prompt_text = self._compose(_ACTIONS_PROMPT, feedback)
+        splitter = SExprStreamSplitter()
+        emitted: List[str] = []
+
+        def emit(actions: List[str]):
+            for action in actions:
+                if action not in emitted:
+                    emitted.append(action)
+                    on_action(action)
+
+        def on_text(text: str) -> bool:
+            for form in splitter.feed(text[len(splitter.text):]):
+                if form.lstrip("( \n\t").startswith(":action"):
+                    emit(self._parse_actions(form))
+            return self.max_actions is not None and len(emitted) >= self.max_actions
+
+        result = self._run_prompt(prompt_text, on_text)
+        # Risposta arrivata tutta insieme (cache, client senza streaming) o blocchi rimasti
+        # aperti: il parsing della risposta completa recupera le azioni non ancora emesse
+        emit(self._parse_actions(result))
+        return emitted
+
+    def _parse_actions(self, result: str) -> List[str]:
         actions = self._split_actions(result)
         normalized = [self._normalize_text(a) for a in actions]
         cleaned = [self._fix_malformed_pddl_action_block(a) for a in normalized]
         return list(dict.fromkeys(cleaned))
 
     def _fix_malformed_pddl_action_block(self, action_text: str) -> str:
-
-        def fix_params_block(match):
-            raw = match.group(1)
-            tokens = raw.strip().split()
-            fixed = []
-            seen = set()
-            for i in range(0, len(tokens) - 1, 2):
-                var, typ = tokens[i], tokens[i + 1]
-                if var.startswith("?") and "-" not in var and (var, typ) not in seen:
-                    fixed.append(f"{var} {typ}")
-                    seen.add((var, typ))
-            return f":parameters ({' '.join(fixed)})"
-
-        action_text = re.sub(r":parameters\s*\(([^)]*)\)", fix_params_block, action_text)
-        action_text = re.sub(r"([a-zA-Z0-9_()-]+)-\s*\?", r"\1 ?", action_text)
-        action_text = action_text.replace("\\?", "?").replace("\\", "")
-        action_text = re.sub(r"\(:action\s+([^\s()]+)", lambda m: f"(:action {re.sub(r'[^a-zA-Z0-9_]', '_', m.group(1))}", action_text)
-        return action_text
-
-
-
-    def infer_goal(self) -> str:
+        action_text = action_text.replace("\\", "")
+        try:
+            action = build_action(_split_glued_variables(parse_sexpr(action_text, tolerant=True)))
+        except PDDLParseError:
+            return action_text
+
+        # Parametri: solo variabili valide, senza duplicati
+        params = {}
+        for param in action.parameters:
+            if param.name.startswith("?") and "-" not in param.name and param.name not in params:
+                params[param.name] = param
+        action.parameters = list(params.values())
+
+        # Le sostituzioni di _normalize_text lasciano "?var - tipo" dentro gli atomi:
+        # il tipo viene tolto dall'atomo e usato per dichiarare il parametro mancante
+        for formula in (action.precondition, action.effect):
+            for atom, _ in iter_atoms(formula):
+                typed = parse_typed_list(atom.args)
+                atom.args = [t.name for t in typed]
+                for t in typed:
+                    if t.name.startswith("?") and t.name not in params:
+                        params[t.name] = t
+                        action.parameters.append(t)
+
+        action.name = re.sub(r'[^a-zA-Z0-9_]', '_', action.name)
+        return action.to_pddl()
+
+
+
+    @traced("inferencer.infer_goal", "inference")
+    def infer_goal(self, feedback: Optional[str] = None) -> str:
    
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", """
-    ATTENZIONE: genera SOLO il goal PDDL valido.
-    ❌ NON usare variabili con '- tipo' nel goal.
-    ✅ Usa predicati concreti, uno per riga, nel blocco (and ...)
-
-    Esempio corretto:
-    (and (not (alive bandit_leader)) (at hero village))
-    """),
-            ("human", f"Lore: {self._format_lore()}\n\nGoal:")
-        ])
-
-        formatted_prompt = prompt.format_messages()
-        prompt_text = "\n".join(m.content for m in formatted_prompt)
-        result = self.llm.run_prompt(prompt_text)
+        prompt_text = self._compose(_GOAL_PROMPT, feedback)
+        result = self._run_prompt(prompt_text, stop_after_goal())
         raw = result.strip()
 
         # Pulizia finale
         return self._sanitize_goal(raw)
-    def _sanitize_goal(self, goal: str) -> str:
-   
-        goal = re.sub(r'\(and\s+\.\.\.\)', '', goal)
-        goal = re.sub(r'(\?[a-zA-Z0-9_]+)\s*-\s*\w+', r'\1', goal)
-        goal = re.sub(r'\(\s*\)', '', goal)
-        tokens = re.findall(r'\([^\)]+\)', goal)
-        unique = list(dict.fromkeys(tokens))
-        if not unique:
-            return "(and (true))"
-        elif len(unique) == 1:
-            return unique[0]
-        else:
-            return f"(and {' '.join(unique)})"
 
+    @traced("inferencer.infer_goal_candidates", "inference")
+    def infer_goal_candidates(self, n: int, feedback: Optional[str] = None) -> List[str]:
+        """n goal alternativi, generati in parallelo (il primo è quello di infer_goal)."""
+        if n <= 1:
+            return [self.infer_goal(feedback)]
+        results = self.llm.run_prompt_candidates(self._compose(_GOAL_PROMPT, feedback), n)
+        return [self._sanitize_goal(r.strip()) for r in results]
+
+    @traced("inferencer.infer_action", "inference")
+    def infer_action(self, action_text: str, errors: List[str], declared_predicates: List[str]) -> Optional[str]:
+        """Rigenera una sola azione difettosa, lasciando invariate le altre."""
+        # L'elenco dei predicati può essere lungo: è la prima sezione a essere tagliata
+        prompt_text = self._compose(
+            _ACTION_REPAIR_PROMPT,
+            sections=[("Predicati dichiarati", "\n".join(declared_predicates), 0)],
+            action=action_text,
+            errors="\n".join(errors),
+        )
+        result = self._run_prompt(prompt_text, stop_after_actions(1))
+        actions = self._split_actions(result)
+        if not actions:
+            return None
+        return self._fix_malformed_pddl_action_block(self._normalize_text(actions[0]))
 
-    def _format_lore(self) -> str:
-        return f"""
-Descrizione: {self.lore.quest_description}
-Contesto: {self.lore.world_context}
-Personaggi: {', '.join(self.lore.characters or [])}
-Luoghi: {', '.join(self.lore.locations or [])}
-Oggetti: {', '.join(self.lore.items or [])}
-Vincoli: {', '.join(self.lore.constraints or [])}
+    def _compose(self, prompt: ChatTemplate, feedback: Optional[str] = None,
+                 sections: Sequence[Tuple[str, str, int]] = (), **values) -> str:
         """
+        Prompt finale: contesto della lore come prefisso stabile, poi istruzioni,
+        sezioni facoltative, feedback e richiesta, entro il budget di token.
+        """
+        system, *human = prompt.format_messages(**values)
+        builder = PromptBuilder(self.lore_prefix, self.prompt_budget)
+        builder.add(system.content, required=True)
+        for title, text, priority in sections:
+            builder.add(text, title, priority)
+        builder.add(feedback or "", "Problemi della versione precedente da evitare", priority=-1)
+        for message in human:
+            builder.add(message.content, required=True)
+        return builder.build()
 
     def _parse_list(self, text: str) -> List[str]:
         lines = text.splitlines()
@@ -208,52 +308,99 @@ Vincoli: {', '.join(self.lore.constraints or [])}
         return [a.strip() for a in actions if a.strip().startswith("(:action")]
 
     def _fix_action(self, action_text: str) -> str:
-        def wrap_clause(text, keyword):
-            pattern = rf"(:{keyword})\\s*\\(([^()]+)\\)"
-            return re.sub(pattern, rf":{keyword} (and (\2))", text)
-        fixed = wrap_clause(action_text, "precondition")
-        fixed = wrap_clause(fixed, "effect")
-        return fixed
+        # Racchiude in (and ...) precondizioni ed effetti composti da un solo letterale
+        try:
+            action = parse_action(action_text)
+        except PDDLParseError:
+            return action_text
+        if isinstance(action.precondition, (Atom, Not)):
+            action.precondition = And([action.precondition])
+        if isinstance(action.effect, (Atom, Not)):
+            action.effect = And([action.effect])
+        return action.to_pddl()
 
     def _sanitize_goal(self, goal: str) -> str:
-        goal = goal.replace("present", "at")
-        if goal.startswith("(and") and goal.endswith(")"):
-            return goal
-        matches = re.findall(r'\([^\(\)]+\)', goal)
-        if not matches:
-            return f"(and {goal})"
-        return f"(and {' '.join(matches)})"
-    
-    def _ensure_parameters_match_variables(self, action_text: str) -> str:
-        """
-        Controlla che tutte le variabili usate in precondition/effect siano nei :parameters.
-        Se manca qualcosa, la aggiunge con tipo generico - object (fallback sicuro).
-        """
-        import re
-
-        # Estrai parametri esistenti
-        param_block = re.search(r":parameters\s*\(([^)]*)\)", action_text)
-        existing_vars = set()
-        param_list = []
-
-        if param_block:
-            tokens = param_block.group(1).split()
-            for i in range(0, len(tokens) - 1, 2):  # (?x - type)
-                if tokens[i].startswith("?"):
-                    existing_vars.add(tokens[i])
-                    param_list.append((tokens[i], tokens[i + 1]))
-
-        # Trova tutte le variabili usate nel testo
-        used_vars = set(re.findall(r"\?[\w_]+", action_text))
+        # Ignora il ragionamento <think>...</think> dei modelli R1
+        goal = goal.split("</think>")[-1]
+        forms = [build_formula(f) for f in parse_sexprs(goal, tolerant=True) if isinstance(f, list)]
+        for formula in forms:
+            for atom, _ in iter_atoms(formula):
+                if atom.predicate == "present":
+                    atom.predicate = "at"
+
+        conjunctions = [f for f in forms if isinstance(f, And)]
+        if conjunctions:
+            return conjunctions[0].to_pddl()
+        literals = [f for f in forms if isinstance(f, (Atom, Not))]
+        if not literals:
+            return "(and (true))"
+        return And(literals).to_pddl()
 
-        # Variabili mancanti
-        missing = used_vars - existing_vars
 
-        # Aggiungi variabili mancanti con tipo generico - object
-        if missing:
-            additions = [(v, "- object") for v in sorted(missing)]
-            new_param_str = " ".join(f"{v} {t}" for v, t in param_list + additions)
-            action_text = re.sub(r":parameters\s*\([^)]*\)", f":parameters ({new_param_str})", action_text)
+def normalize_name(name: str) -> str:
+    """Nome di entità in forma PDDL: minuscolo, spazi e trattini sostituiti da '_'."""
+    return name.strip().lower().replace(" ", "_").replace("-", "_")
 
-        return action_text
 
+def _split_glued_variables(expr: SExpr) -> SExpr:
+    """Separa token come 'knows-?x' o 'knows-' + '?x' in 'knows' '?x'."""
+    if isinstance(expr, str):
+        return expr
+    result = []
+    for item in expr:
+        if isinstance(item, str) and "-?" in item and not item.startswith("?"):
+            head, var = item.split("-?", 1)
+            result.extend([head, "?" + var])
+        elif isinstance(item, str) and len(item) > 1 and item.endswith("-") and not item.startswith("?"):
+            result.append(item[:-1])
+        else:
+            result.append(_split_glued_variables(item))
+    return result
+
+
+class EntityMatcher:
+    """
+    Sostituisce in un solo passaggio tutti i nomi di entità della lore.
+    I nomi sono compilati in un'unica regex a trie: a parità di posizione vince il nome
+    più lungo ("bandit_leader" prima di "bandit"), senza distinzione di maiuscole.
+    """
+
+    def __init__(self, mapping: Tuple[Tuple[str, str], ...]):
+        self.lookup: Dict[str, str] = {}
+        for name, variable in mapping:
+            if name:
+                self.lookup.setdefault(name.lower(), variable)
+        self.pattern = re.compile(rf"\b{_trie_regex(self.lookup)}\b", re.IGNORECASE) if self.lookup else None
+
+    def replace(self, text: str) -> str:
+        if self.pattern is None:
+            return text
+        return self.pattern.sub(lambda m: self.lookup[m.group(0).lower()], text)
+
+
+@lru_cache(maxsize=32)
+def compile_entity_matcher(mapping: Tuple[Tuple[str, str], ...]) -> EntityMatcher:
+    """Matcher condiviso tra tutti gli inferencer della stessa lore."""
+    return EntityMatcher(mapping)
+
+
+def _trie_regex(words) -> str:
+    """Regex equivalente all'alternanza delle parole, fattorizzata sui prefissi comuni."""
+    trie: dict = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[""] = True
+    return _trie_node_regex(trie)
+
+
+def _trie_node_regex(node: dict) -> str:
+    # Rami in ordine fisso; la fine parola è resa con un gruppo opzionale (greedy = match più lungo)
+    branches = [re.escape(ch) + _trie_node_regex(child) for ch, child in sorted(node.items()) if ch]
+    if not branches:
+        return ""
+    body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+    if "" in node:
+        return f"(?:{body})?"
+    return body
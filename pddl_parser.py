@@ -0,0 +1,465 @@
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Union
+
+# Connettivi logici riconosciuti nelle formule (tutto il resto è un predicato)
+CONNECTIVES = {"and", "or", "not", "imply", "forall", "exists", "when", "="}
+
+SExpr = Union[str, list]
+
+
+class PDDLParseError(ValueError):
+    pass
+
+
+# ---------------------------------------------------------------------------
+# Tokenizer e parser di s-espressioni (passata singola)
+# ---------------------------------------------------------------------------
+
+def tokenize(text: str) -> List[str]:
+    """Divide il testo in '(', ')' e atomi, scartando i commenti ';'."""
+    tokens = []
+    i, n = 0, len(text)
+    while i < n:
+        ch = text[i]
+        if ch in "()":
+            tokens.append(ch)
+            i += 1
+        elif ch == ";":
+            while i < n and text[i] != "\n":
+                i += 1
+        elif ch.isspace():
+            i += 1
+        else:
+            start = i
+            while i < n and not text[i].isspace() and text[i] not in "();":
+                i += 1
+            tokens.append(text[start:i])
+    return tokens
+
+
+def parse_sexprs(text: str, tolerant: bool = False) -> List[SExpr]:
+    """
+    Restituisce le s-espressioni di primo livello del testo.
+    In modalità tolerant le parentesi mancanti vengono chiuse a fine testo e quelle
+    in eccesso ignorate, come serve per l'output grezzo degli LLM.
+    """
+    root: List[SExpr] = []
+    stack = [root]
+    for tok in tokenize(text):
+        if tok == "(":
+            node: list = []
+            stack[-1].append(node)
+            stack.append(node)
+        elif tok == ")":
+            if len(stack) == 1:
+                if tolerant:
+                    continue
+                raise PDDLParseError("Parentesi ')' in eccesso")
+            stack.pop()
+        else:
+            stack[-1].append(tok.lower() if tok.startswith(":") else tok)
+    if len(stack) > 1 and not tolerant:
+        raise PDDLParseError(f"{len(stack) - 1} parentesi non chiuse")
+    return root
+
+
+def parse_sexpr(text: str, tolerant: bool = False) -> list:
+    forms = [f for f in parse_sexprs(text, tolerant) if isinstance(f, list)]
+    if not forms:
+        raise PDDLParseError("Nessuna espressione tra parentesi")
+    return forms[0]
+
+
+def sexpr_to_str(expr: SExpr) -> str:
+    if isinstance(expr, list):
+        return "(" + " ".join(sexpr_to_str(e) for e in expr) + ")"
+    return expr
+
+
+# ---------------------------------------------------------------------------
+# AST
+# ---------------------------------------------------------------------------
+
+@dataclass
+class TypedParam:
+    name: str
+    type: str = "object"
+
+    def to_pddl(self) -> str:
+        return f"{self.name} - {self.type}"
+
+
+def params_to_pddl(params: List[TypedParam]) -> str:
+    return " ".join(p.to_pddl() for p in params)
+
+
+@dataclass
+class PredicateDecl:
+    name: str
+    params: List[TypedParam] = field(default_factory=list)
+
+    @property
+    def arity(self) -> int:
+        return len(self.params)
+
+    def to_pddl(self) -> str:
+        if not self.params:
+            return f"({self.name})"
+        return f"({self.name} {params_to_pddl(self.params)})"
+
+
+@dataclass
+class Atom:
+    predicate: str
+    args: List[str] = field(default_factory=list)
+
+    def to_pddl(self) -> str:
+        return "(" + " ".join([self.predicate] + self.args) + ")"
+
+
+@dataclass
+class Not:
+    arg: "Formula"
+
+    def to_pddl(self) -> str:
+        return f"(not {self.arg.to_pddl()})"
+
+
+@dataclass
+class And:
+    args: List["Formula"] = field(default_factory=list)
+
+    def to_pddl(self) -> str:
+        return "(and " + " ".join(a.to_pddl() for a in self.args) + ")" if self.args else "(and)"
+
+
+@dataclass
+class Compound:
+    """Formula non STRIPS (or, forall, when, ...) o malformata: conservata così com'è."""
+    op: str
+    items: List[SExpr] = field(default_factory=list)
+
+    def to_pddl(self) -> str:
+        return sexpr_to_str([self.op] + self.items)
+
+
+Formula = Union[Atom, Not, And, Compound]
+
+
+def iter_atoms(formula: Optional[Formula], negated: bool = False) -> Iterator[tuple]:
+    """Visita gli atomi di una formula restituendo coppie (atomo, negato)."""
+    if formula is None:
+        return
+    if isinstance(formula, Atom):
+        yield formula, negated
+    elif isinstance(formula, Not):
+        yield from iter_atoms(formula.arg, not negated)
+    elif isinstance(formula, And):
+        for a in formula.args:
+            yield from iter_atoms(a, negated)
+
+
+@dataclass
+class Action:
+    name: str
+    parameters: List[TypedParam] = field(default_factory=list)
+    precondition: Optional[Formula] = None
+    effect: Optional[Formula] = None
+
+    def to_pddl(self) -> str:
+        lines = [f"(:action {self.name}", f"    :parameters ({params_to_pddl(self.parameters)})"]
+        if self.precondition is not None:
+            lines.append(f"    :precondition {self.precondition.to_pddl()}")
+        if self.effect is not None:
+            lines.append(f"    :effect {self.effect.to_pddl()}")
+        lines.append(")")
+        return "\n".join(lines)
+
+
+@dataclass
+class Domain:
+    name: str
+    requirements: List[str] = field(default_factory=list)
+    types: Dict[str, str] = field(default_factory=dict)  # tipo -> supertipo
+    constants: Dict[str, str] = field(default_factory=dict)
+    predicates: List[PredicateDecl] = field(default_factory=list)
+    actions: List[Action] = field(default_factory=list)
+
+    def predicate_map(self) -> Dict[str, PredicateDecl]:
+        return {p.name: p for p in self.predicates}
+
+    def to_pddl(self) -> str:
+        out = [f"(define (domain {self.name})"]
+        if self.requirements:
+            out.append(f"  (:requirements {' '.join(self.requirements)})")
+        if self.types:
+            out.append(f"  (:types {_typed_names_to_pddl(self.types)})")
+        if self.constants:
+            out.append(f"  (:constants {_typed_names_to_pddl(self.constants)})")
+        out.append("  (:predicates")
+        out.extend(f"    {p.to_pddl()}" for p in self.predicates)
+        out.append("  )")
+        for a in self.actions:
+            out.append("")
+            out.append("  " + a.to_pddl().replace("\n", "\n  "))
+        out.append(")")
+        return "\n".join(out)
+
+
+@dataclass
+class Problem:
+    name: str
+    domain_name: str
+    objects: Dict[str, str] = field(default_factory=dict)  # oggetto -> tipo
+    init: List[Atom] = field(default_factory=list)
+    goal: Optional[Formula] = None
+
+    def to_pddl(self) -> str:
+        out = [f"(define (problem {self.name})", f"  (:domain {self.domain_name})"]
+        out.append("  (:objects")
+        by_type: Dict[str, List[str]] = {}
+        for obj, typ in self.objects.items():
+            by_type.setdefault(typ, []).append(obj)
+        out.extend(f"    {' '.join(objs)} - {typ}" for typ, objs in by_type.items())
+        out.append("  )")
+        out.append("  (:init")
+        out.extend(f"    {a.to_pddl()}" for a in self.init)
+        out.append("  )")
+        out.append(f"  (:goal {self.goal.to_pddl() if self.goal is not None else '(and)'})")
+        out.append(")")
+        return "\n".join(out)
+
+
+def _typed_names_to_pddl(mapping: Dict[str, str]) -> str:
+    by_type: Dict[str, List[str]] = {}
+    for name, typ in mapping.items():
+        by_type.setdefault(typ, []).append(name)
+    # I nomi senza tipo vanno in coda, altrimenti verrebbero assorbiti dal gruppo successivo
+    untyped = by_type.pop("object", [])
+    parts = [f"{' '.join(names)} - {typ}" for typ, names in by_type.items()]
+    return " ".join(parts + untyped)
+
+
+# ---------------------------------------------------------------------------
+# Costruzione dell'AST
+# ---------------------------------------------------------------------------
+
+def parse_typed_list(items: List[SExpr]) -> List[TypedParam]:
+    """Converte '?a ?b - t1 ?c - t2 ?d' in parametri tipati (default 'object')."""
+    result: List[TypedParam] = []
+    pending: List[str] = []
+    i = 0
+    while i < len(items):
+        tok = items[i]
+        if tok == "-":
+            typ = items[i + 1] if i + 1 < len(items) else "object"
+            if isinstance(typ, list):  # (either a b): si ripiega su object
+                typ = "object"
+            result.extend(TypedParam(name, typ) for name in pending)
+            pending = []
+            i += 2
+            continue
+        if isinstance(tok, str):
+            pending.append(tok)
+        i += 1
+    result.extend(TypedParam(name) for name in pending)
+    return result
+
+
+def build_formula(expr: SExpr) -> Formula:
+    if isinstance(expr, str):
+        return Atom(expr)
+    if not expr:
+        return And([])
+    head = expr[0]
+    if not isinstance(head, str):
+        return Compound("", expr)
+    op = head.lower()
+    if op == "and":
+        return And([build_formula(e) for e in expr[1:]])
+    if op == "not" and len(expr) == 2:
+        return Not(build_formula(expr[1]))
+    if op in CONNECTIVES or any(isinstance(e, list) for e in expr[1:]):
+        return Compound(head, list(expr[1:]))
+    return Atom(head, [str(e) for e in expr[1:]])
+
+
+def build_predicate(expr: list) -> PredicateDecl:
+    if not expr or not isinstance(expr[0], str):
+        raise PDDLParseError(f"Predicato malformato: {sexpr_to_str(expr)}")
+    return PredicateDecl(expr[0], parse_typed_list(expr[1:]))
+
+
+def build_action(expr: list) -> Action:
+    if len(expr) < 2 or expr[0] != ":action" or not isinstance(expr[1], str):
+        raise PDDLParseError(f"Azione malformata: {sexpr_to_str(expr)[:80]}")
+    action = Action(expr[1])
+    i = 2
+    while i < len(expr):
+        key = expr[i]
+        value = expr[i + 1] if i + 1 < len(expr) else None
+        if key == ":parameters" and isinstance(value, list):
+            action.parameters = parse_typed_list(value)
+        elif key == ":precondition" and value is not None:
+            action.precondition = build_formula(value)
+        elif key == ":effect" and value is not None:
+            action.effect = build_formula(value)
+        else:
+            i += 1
+            continue
+        i += 2
+    return action
+
+
+def _section_name(section: list) -> str:
+    return section[0] if section and isinstance(section[0], str) else ""
+
+
+def build_domain(expr: list) -> Domain:
+    if len(expr) < 2 or expr[0] != "define" or not isinstance(expr[1], list) or expr[1][:1] != ["domain"]:
+        raise PDDLParseError("Atteso (define (domain ...) ...)")
+    domain = Domain(expr[1][1] if len(expr[1]) > 1 else "")
+    for section in expr[2:]:
+        if not isinstance(section, list):
+            continue
+        name = _section_name(section)
+        if name == ":requirements":
+            domain.requirements = [s for s in section[1:] if isinstance(s, str)]
+        elif name == ":types":
+            domain.types = {p.name: p.type for p in parse_typed_list(section[1:])}
+        elif name == ":constants":
+            domain.constants = {p.name: p.type for p in parse_typed_list(section[1:])}
+        elif name == ":predicates":
+            domain.predicates = [build_predicate(p) for p in section[1:] if isinstance(p, list)]
+        elif name == ":action":
+            domain.actions.append(build_action(section))
+    return domain
+
+
+def build_problem(expr: list) -> Problem:
+    if len(expr) < 2 or expr[0] != "define" or not isinstance(expr[1], list) or expr[1][:1] != ["problem"]:
+        raise PDDLParseError("Atteso (define (problem ...) ...)")
+    problem = Problem(expr[1][1] if len(expr[1]) > 1 else "", "")
+    for section in expr[2:]:
+        if not isinstance(section, list):
+            continue
+        name = _section_name(section)
+        if name == ":domain" and len(section) > 1:
+            problem.domain_name = section[1]
+        elif name == ":objects":
+            problem.objects = {p.name: p.type for p in parse_typed_list(section[1:])}
+        elif name == ":init":
+            for fact in section[1:]:
+                f = build_formula(fact)
+                if isinstance(f, Atom):
+                    problem.init.append(f)
+        elif name == ":goal" and len(section) > 1:
+            problem.goal = build_formula(section[1])
+    return problem
+
+
+def parse_domain(text: str, tolerant: bool = False) -> Domain:
+    return build_domain(parse_sexpr(text, tolerant))
+
+
+def parse_problem(text: str, tolerant: bool = False) -> Problem:
+    return build_problem(parse_sexpr(text, tolerant))
+
+
+def parse_action(text: str, tolerant: bool = True) -> Action:
+    return build_action(parse_sexpr(text, tolerant))
+
+
+def parse_predicate(text: str, tolerant: bool = True) -> PredicateDecl:
+    return build_predicate(parse_sexpr(text, tolerant))
+
+
+def parse_formula(text: str, tolerant: bool = True) -> Formula:
+    return build_formula(parse_sexpr(text, tolerant))
+
+
+# ---------------------------------------------------------------------------
+# Controlli semantici
+# ---------------------------------------------------------------------------
+
+@dataclass
+class Issue:
+    """
+    Errore semantico localizzato: component è "predicates", "action", "init", "goal"
+    o "problem"; subject è il nome dell'azione/predicato/oggetto coinvolto.
+    """
+    component: str
+    subject: str
+    message: str
+
+    def __str__(self) -> str:
+        return self.message
+
+
+def _check_atom(atom: Atom, predicates: Dict[str, PredicateDecl], component: str, subject: str,
+                where: str, issues: List[Issue]):
+    decl = predicates.get(atom.predicate)
+    if decl is None:
+        issues.append(Issue(component, subject, f"{where}: predicato non dichiarato '{atom.predicate}'"))
+    elif decl.arity != len(atom.args):
+        issues.append(Issue(component, subject,
+                            f"{where}: '{atom.predicate}' usa {len(atom.args)} argomenti invece di {decl.arity}"))
+
+
+def check_domain(domain: Domain) -> List[Issue]:
+    """Predicati duplicati o non dichiarati, arità errate, variabili e tipi non dichiarati."""
+    issues: List[Issue] = []
+    known_types = set(domain.types) | set(domain.types.values()) | {"object"}
+    predicates: Dict[str, PredicateDecl] = {}
+    for p in domain.predicates:
+        if p.name in predicates:
+            issues.append(Issue("predicates", p.name, f"Predicato dichiarato più volte: '{p.name}'"))
+        predicates.setdefault(p.name, p)
+        for param in p.params:
+            if param.type not in known_types:
+                issues.append(Issue("predicates", p.name,
+                                    f"Predicato '{p.name}': tipo non dichiarato '{param.type}'"))
+
+    seen_actions = set()
+    for action in domain.actions:
+        where = f"Azione '{action.name}'"
+        if action.name in seen_actions:
+            issues.append(Issue("action", action.name, f"{where}: definita più volte"))
+        seen_actions.add(action.name)
+        declared = {p.name for p in action.parameters}
+        for param in action.parameters:
+            if param.type not in known_types:
+                issues.append(Issue("action", action.name, f"{where}: tipo non dichiarato '{param.type}'"))
+        for formula in (action.precondition, action.effect):
+            for atom, _ in iter_atoms(formula):
+                _check_atom(atom, predicates, "action", action.name, where, issues)
+                for arg in atom.args:
+                    if arg.startswith("?") and arg not in declared:
+                        issues.append(Issue("action", action.name, f"{where}: variabile non dichiarata '{arg}'"))
+                    elif not arg.startswith("?") and arg not in domain.constants:
+                        issues.append(Issue("action", action.name, f"{where}: costante non dichiarata '{arg}'"))
+    return issues
+
+
+def check_problem(problem: Problem, domain: Domain) -> List[Issue]:
+    """Predicati/oggetti non dichiarati e arità errate in :init e :goal."""
+    issues: List[Issue] = []
+    known_types = set(domain.types) | set(domain.types.values()) | {"object"}
+    predicates = domain.predicate_map()
+    objects = set(problem.objects) | set(domain.constants)
+
+    if problem.domain_name and domain.name and problem.domain_name != domain.name:
+        issues.append(Issue("problem", problem.name,
+                            f"Il problema si riferisce al dominio '{problem.domain_name}' invece di '{domain.name}'"))
+    for obj, typ in problem.objects.items():
+        if typ not in known_types:
+            issues.append(Issue("init", obj, f"Oggetto '{obj}': tipo non dichiarato '{typ}'"))
+
+    checks = [(atom, "init", "Init") for atom in problem.init]
+    checks += [(atom, "goal", "Goal") for atom, _ in iter_atoms(problem.goal)]
+    for atom, component, where in checks:
+        _check_atom(atom, predicates, component, atom.predicate, where, issues)
+        for arg in atom.args:
+            if arg not in objects:
+                issues.append(Issue(component, arg, f"{where}: oggetto non dichiarato '{arg}' in {atom.to_pddl()}"))
+    return issues
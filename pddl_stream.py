@@ -0,0 +1,77 @@
+from typing import Callable, List, Optional
+
+
+class SExprStreamSplitter:
+    """
+    Riceve il testo di una risposta LLM a pezzi (token SSE) e restituisce le
+    s-espressioni di primo livello man mano che si chiudono.
+    Il contenuto di un eventuale blocco <think>...</think> viene ignorato.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self._pos = 0
+        self._depth = 0
+        self._start = -1
+        self._in_think = False
+
+    def feed(self, chunk: str) -> List[str]:
+        self.text += chunk
+        closed = []
+        while self._pos < len(self.text):
+            if self._in_think or (self._depth == 0 and self.text.startswith("<think>", self._pos)):
+                end = self.text.find("</think>", self._pos)
+                if end < 0:
+                    # Il tag di chiusura può arrivare spezzato: riparto da qui al prossimo feed
+                    self._in_think = True
+                    return closed
+                self._in_think = False
+                self._pos = end + len("</think>")
+                continue
+
+            ch = self.text[self._pos]
+            if self._depth == 0 and ch == "<" and "<think>".startswith(self.text[self._pos:]):
+                # Possibile tag <think> spezzato tra due chunk
+                return closed
+            if ch == "(":
+                if self._depth == 0:
+                    self._start = self._pos
+                self._depth += 1
+            elif ch == ")" and self._depth > 0:
+                self._depth -= 1
+                if self._depth == 0:
+                    closed.append(self.text[self._start:self._pos + 1])
+                    self._start = -1
+            self._pos += 1
+        return closed
+
+    def pending(self) -> Optional[str]:
+        """Forma di primo livello ancora aperta, se presente."""
+        return self.text[self._start:] if self._start >= 0 else None
+
+
+def stop_after_actions(max_actions: int) -> Callable[[str], bool]:
+    """Condizione di stop: vera quando si sono chiusi max_actions blocchi (:action ...)."""
+    splitter = SExprStreamSplitter()
+    count = 0
+
+    def should_stop(text: str) -> bool:
+        nonlocal count
+        forms = splitter.feed(text[len(splitter.text):])
+        count += sum(1 for f in forms if f.lstrip("( \n\t").startswith(":action"))
+        return count >= max_actions
+
+    should_stop.cache_key = f"actions={max_actions}"  # identifica la condizione nella cache delle risposte
+    return should_stop
+
+
+def stop_after_goal() -> Callable[[str], bool]:
+    """Condizione di stop: vera quando il primo goal (and ...) ha chiuso le sue parentesi."""
+    splitter = SExprStreamSplitter()
+
+    def should_stop(text: str) -> bool:
+        forms = splitter.feed(text[len(splitter.text):])
+        return any(f[1:].lstrip().startswith("and") for f in forms)
+
+    should_stop.cache_key = "goal"
+    return should_stop
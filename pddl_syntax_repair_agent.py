@@ -1,50 +1,81 @@
-import re
-from typing import List
+from typing import List, Optional
+from pddl_parser import (
+    Action, And, Compound, Formula, Not, PDDLParseError, TypedParam,
+    iter_atoms, parse_action, parse_formula,
+)
+from tracing import traced
 
 class PDDLSyntaxRepairAgent:
     """
     Ripulisce e corregge sintatticamente azioni e goal PDDL generati da LLM.
+    Le correzioni lavorano sull'AST prodotto da pddl_parser.
     """
 
+    @traced("repair.repair_actions", "repair")
     def repair_actions(self, actions: List[str]) -> List[str]:
         cleaned = []
-        for action in actions:
-            if not action.startswith("(:action"):
+        for action_text in actions:
+            if not action_text.startswith("(:action"):
                 continue
-            if ":parameters" not in action or ":precondition" not in action or ":effect" not in action:
+            if ":parameters" not in action_text or ":precondition" not in action_text or ":effect" not in action_text:
                 continue
-            action = self._remove_malformed_predicates(action)
-            action = self._ensure_parameters_match_variables(action)
-            cleaned.append(action.strip())
+            try:
+                action = parse_action(action_text)
+            except PDDLParseError:
+                continue
+            action.precondition = self._remove_malformed_predicates(action.precondition)
+            action.effect = self._remove_malformed_predicates(action.effect)
+            self._ensure_parameters_match_variables(action)
+            cleaned.append(action.to_pddl())
         return cleaned
 
+    @traced("repair.repair_goal", "repair")
     def repair_goal(self, goal: str) -> str:
+        try:
+            formula = parse_formula(goal)
+        except PDDLParseError:
+            # Se è vuoto, fallback minimo
+            return "(and (true))"
         # Rimuove tipi dalle variabili (es: ?x - character -> ?x)
-        goal = re.sub(r'(\?[a-zA-Z0-9_]+)\s*-\s*[a-zA-Z]+', r'\1', goal)
-        # Se è vuoto, fallback minimo
-        if not re.search(r'\([^)]+\)', goal):
+        for atom, _ in iter_atoms(formula):
+            atom.args = strip_types(atom.args)
+        if not any(True for _ in iter_atoms(formula)):
             return "(and (true))"
-        return goal.strip()
+        return formula.to_pddl()
 
-    def _remove_malformed_predicates(self, text: str) -> str:
+    def _remove_malformed_predicates(self, formula: Optional[Formula]) -> Optional[Formula]:
         # Elimina predicati nidificati tipo (has (sword))
-        return re.sub(r'\([a-zA-Z0-9_\-]+\s+\([^()]+\)\)', '', text)
+        if isinstance(formula, Compound) and formula.op.lower() not in ("or", "imply", "forall", "exists", "when", "="):
+            return None
+        if isinstance(formula, Not):
+            inner = self._remove_malformed_predicates(formula.arg)
+            return Not(inner) if inner is not None else None
+        if isinstance(formula, And):
+            args = [self._remove_malformed_predicates(a) for a in formula.args]
+            return And([a for a in args if a is not None])
+        return formula
+
+    def _ensure_parameters_match_variables(self, action: Action) -> Action:
+        declared_vars = {p.name for p in action.parameters}
+        used_vars = []
+        for formula in (action.precondition, action.effect):
+            for atom, _ in iter_atoms(formula):
+                used_vars.extend(a for a in atom.args if a.startswith("?"))
+        missing = [v for v in dict.fromkeys(used_vars) if v not in declared_vars]
+        action.parameters.extend(TypedParam(v, "object") for v in missing)
+        return action
 
-    def _ensure_parameters_match_variables(self, action_text: str) -> str:
-        # Estrae parametri esistenti
-        param_block = re.search(r":parameters\s*\(([^)]*)\)", action_text)
-        declared_vars = set()
-        if param_block:
-            tokens = param_block.group(1).split()
-            for i in range(0, len(tokens)-1, 2):
-                if tokens[i].startswith("?"):
-                    declared_vars.add(tokens[i])
 
-        used_vars = set(re.findall(r"\?\w+", action_text))
-        missing = used_vars - declared_vars
-        if missing:
-            extra = " ".join(f"{v} - object" for v in missing)
-            action_text = re.sub(r":parameters\s*\(([^)]*)\)",
-                                 lambda m: f":parameters ({m.group(1).strip()} {extra})",
-                                 action_text)
-        return action_text
+def strip_types(args: List[str]) -> List[str]:
+    """Rimuove le annotazioni '- tipo' dagli argomenti di un atomo."""
+    result = []
+    skip = False
+    for arg in args:
+        if skip:
+            skip = False
+            continue
+        if arg == "-":
+            skip = True
+            continue
+        result.append(arg)
+    return result
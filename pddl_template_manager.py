@@ -3,6 +3,11 @@ from pddl_inferencer import PDDLInferencer
 from lore import LoreDocument
 from pddl_syntax_repair_agent import PDDLSyntaxRepairAgent
 from llm_pddl_refiner import LLM_PDDLRefiner
+from pddl_parser import PDDLParseError, parse_predicate
+from typing import Iterable, Iterator, List, Optional
+from world_map import iter_connections, iter_placements
+import hashlib
+import os
 import re
 
 class PDDLTemplateManager:
@@ -13,9 +18,57 @@ class PDDLTemplateManager:
         inferencer = PDDLInferencer(lore, llm)
         llm_refiner = LLM_PDDLRefiner(llm)
 
-        raw_predicates = inferencer.infer_predicates()
-        predicates = llm_refiner.refine_predicates(raw_predicates)
+        predicates = self._infer_predicates(inferencer, llm_refiner)
+        actions = self._infer_actions(inferencer)
+        return self._build_domain(predicates, actions)
 
+    def generate_problem(self, lore: LoreDocument, llm: LLMInterface) -> str:
+        inferencer = PDDLInferencer(lore, llm)
+        llm_refiner = LLM_PDDLRefiner(llm)
+
+        goal = self._infer_goal(inferencer, llm_refiner)
+        return self._build_problem(lore, goal)
+
+    def _infer_predicates(self, inferencer: PDDLInferencer, llm_refiner: LLM_PDDLRefiner,
+                          feedback: Optional[str] = None) -> List[str]:
+        raw_predicates = inferencer.infer_predicates(feedback)
+        return llm_refiner.refine_predicates(raw_predicates)
+
+    def _infer_actions(self, inferencer: PDDLInferencer, feedback: Optional[str] = None) -> List[str]:
+        actions = inferencer.infer_actions(feedback)
+        return self.repairer.repair_actions(actions)
+
+    def _infer_actions_candidates(self, inferencer: PDDLInferencer, n: int,
+                                  feedback: Optional[str] = None) -> List[List[str]]:
+        return [self.repairer.repair_actions(a) for a in inferencer.infer_actions_candidates(n, feedback)]
+
+    def _regenerate_action(self, inferencer: PDDLInferencer, action_text: str, errors: List[str],
+                           declared_predicates: List[str]) -> Optional[str]:
+        action = inferencer.infer_action(action_text, errors, declared_predicates)
+        if action is None:
+            return None
+        repaired = self.repairer.repair_actions([action])
+        return repaired[0] if repaired else None
+
+    def _infer_goal(self, inferencer: PDDLInferencer, llm_refiner: LLM_PDDLRefiner,
+                    feedback: Optional[str] = None) -> str:
+        return self._finish_goal(inferencer.infer_goal(feedback), llm_refiner)
+
+    def _infer_goal_candidates(self, inferencer: PDDLInferencer, llm_refiner: LLM_PDDLRefiner, n: int,
+                               feedback: Optional[str] = None) -> List[str]:
+        return [self._finish_goal(g, llm_refiner) for g in inferencer.infer_goal_candidates(n, feedback)]
+
+    def _finish_goal(self, goal: str, llm_refiner: LLM_PDDLRefiner) -> str:
+        goal = self.repairer.repair_goal(goal)
+
+        # Se contiene parole italiane sospette, usa il raffinatore LLM
+        if any(k in goal.lower() for k in ["presente", "trovare", "posizionato"]):
+            goal = llm_refiner.refine_goal(goal, [
+                "at", "alive", "connected", "has", "in_camp", "in_forest", "in_village", "saved_village"
+            ])
+        return goal
+
+    def _build_domain(self, predicates: List[str], repaired_actions: List[str]) -> str:
         def valid_predicate(p: str) -> bool:
             return '?' in p and p.startswith('(') and p.endswith(')')
 
@@ -27,11 +80,15 @@ class PDDLTemplateManager:
             "(connected ?from - location ?to - location)"
         }
 
-        all_preds = list(set(sanitized_preds).union(essential_preds))
-        pred_block = "\n    ".join(sorted(all_preds))
+        # Un solo predicato per nome: i predicati essenziali hanno la precedenza
+        by_name = {}
+        for p in sorted(essential_preds) + sorted(set(sanitized_preds)):
+            try:
+                by_name.setdefault(parse_predicate(p).name, p)
+            except PDDLParseError:
+                continue
+        pred_block = "\n    ".join(sorted(by_name.values()))
 
-        actions = inferencer.infer_actions()
-        repaired_actions = self.repairer.repair_actions(actions)
         action_block = "\n\n  ".join(repaired_actions)
 
         domain_template = f"""
@@ -48,57 +105,59 @@ class PDDLTemplateManager:
 """
         return domain_template.strip()
 
-    def generate_problem(self, lore: LoreDocument, llm: LLMInterface) -> str:
-        inferencer = PDDLInferencer(lore, llm)
-        llm_refiner = LLM_PDDLRefiner(llm)
-
-        goal = inferencer.infer_goal()
-        goal = self.repairer.repair_goal(goal)
-
-        # Se contiene parole italiane sospette, usa il raffinatore LLM
-        if any(k in goal.lower() for k in ["presente", "trovare", "posizionato"]):
-            goal = llm_refiner.refine_goal(goal, [
-                "at", "alive", "connected", "has", "in_camp", "in_forest", "in_village", "saved_village"
-            ])
-
-        characters = " ".join(c.strip() for c in lore.characters)
-        items = " ".join(i.strip() for i in lore.items)
-        locations = " ".join(l.strip() for l in lore.locations)
-
-        init_lines = []
-        start_loc = lore.locations[0].strip()
-        end_loc = lore.locations[-1].strip()
-
-        for c in lore.characters:
-            init_lines.append(f"(at {c.strip()} {start_loc})")
-        for i in lore.items:
-            init_lines.append(f"(at {i.strip()} {end_loc})")
-
-        for i in range(len(lore.locations) - 1):
-            a = lore.locations[i].strip()
-            b = lore.locations[i + 1].strip()
-            init_lines.append(f"(connected {a} {b})")
-            init_lines.append(f"(connected {b} {a})")
-
+    def _build_problem(self, lore: LoreDocument, goal: str, init_lines: Optional[List[str]] = None) -> str:
+        return "".join(self._iter_problem(lore, goal, init_lines))
+
+    def write_problem(self, lore: LoreDocument, goal: str, path: str, init_lines: Optional[Iterable[str]] = None,
+                      chunk_lines: int = 4096) -> str:
+        """
+        Scrive il problema direttamente su file a blocchi di chunk_lines righe, senza costruirlo
+        in memoria: con mappe di decine di migliaia di luoghi e oggetti memoria limitata e tempo
+        lineare. Il contenuto è identico a _build_problem; restituisce il suo SHA-256.
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        digest = hashlib.sha256()
+        with open(path, "w", encoding="utf-8") as f:
+            for chunk in self._iter_problem(lore, goal, init_lines, chunk_lines):
+                f.write(chunk)
+                digest.update(chunk.encode("utf-8"))
+        return digest.hexdigest()
+
+    def _iter_problem(self, lore: LoreDocument, goal: str, init_lines: Optional[Iterable[str]] = None,
+                      chunk_lines: int = 4096) -> Iterator[str]:
+        if init_lines is None:
+            init_lines = self._iter_init(lore)
+        yield "(define (problem generated_problem)\n  (:domain generated_domain)\n  (:objects\n    "
+        yield from _joined((c.strip() for c in lore.characters), " ", chunk_lines)
+        yield " - character\n    "
+        yield from _joined((i.strip() for i in lore.items), " ", chunk_lines)
+        yield " - item\n    "
+        yield from _joined((l.strip() for l in lore.locations), " ", chunk_lines)
+        yield " - location\n  )\n  (:init\n    "
+        yield from _joined(init_lines, "\n    ", chunk_lines)
+        yield f"\n  )\n  (:goal\n    {goal}\n  )\n)"
+
+    def _build_init(self, lore: LoreDocument) -> List[str]:
+        return list(self._iter_init(lore))
+
+    def _iter_init(self, lore: LoreDocument) -> Iterator[str]:
+        """Fatti iniziali: posizioni (esplicite o di default), mappa della lore e personaggio vivo."""
+        for entity, location in iter_placements(lore):
+            yield f"(at {entity} {location})"
+        for a, b in iter_connections(lore):
+            yield f"(connected {a} {b})"
         if lore.characters:
-            init_lines.append(f"(alive {lore.characters[0].strip()})")
-
-        init_block = "\n    ".join(init_lines)
-
-        problem_template = f"""
-(define (problem generated_problem)
-  (:domain generated_domain)
-  (:objects
-    {characters} - character
-    {items} - item
-    {locations} - location
-  )
-  (:init
-    {init_block}
-  )
-  (:goal
-    {goal}
-  )
-)
-"""
-        return problem_template.strip()
+            yield f"(alive {lore.characters[0].strip()})"
+
+
+def _joined(items: Iterable[str], sep: str, chunk_lines: int) -> Iterator[str]:
+    """Come sep.join(items), ma restituito a blocchi di chunk_lines elementi."""
+    batch: List[str] = []
+    first = True
+    for item in items:
+        batch.append(item)
+        if len(batch) >= chunk_lines:
+            yield ("" if first else sep) + sep.join(batch)
+            batch, first = [], False
+    if batch:
+        yield ("" if first else sep) + sep.join(batch)
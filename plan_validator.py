@@ -0,0 +1,138 @@
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from grounding import GroundTask, ground, iter_bits
+from lore import LoreDocument
+from pddl_parser import parse_domain, parse_problem
+from tracing import span
+
+
+def normalize_step(step: str) -> str:
+    """'(MOVE hero  a b) ; cost' -> '(move hero a b)', come le etichette delle azioni ground."""
+    step = step.split(";")[0].strip().lower()
+    if not step.startswith("("):
+        step = f"({step})"
+    return "(" + " ".join(step.strip("()").split()) + ")"
+
+
+@dataclass
+class PlanValidation:
+    """Esito della simulazione di un piano sul task grounded."""
+    executable: bool = True           # ogni azione era applicabile nel proprio stato
+    goal_reached: bool = False
+    failed_step: Optional[int] = None  # indice (da 0) della prima azione non applicabile
+    failed_action: Optional[str] = None
+    errors: List[str] = field(default_factory=list)
+    depth: int = 0
+    branching: List[int] = field(default_factory=list)  # azioni applicabili negli stati attraversati
+    lore_violations: List[str] = field(default_factory=list)
+
+    @property
+    def valid(self) -> bool:
+        return self.executable and self.goal_reached
+
+    @property
+    def ok(self) -> bool:
+        """Piano valido e rispettoso dei vincoli di profondità e branching della lore."""
+        return self.valid and not self.lore_violations
+
+    def summary(self) -> str:
+        lines = list(self.errors)
+        if self.valid:
+            lines.append(f"Piano valido: {self.depth} azioni")
+        if self.branching:
+            lines.append(f"Branching: min {min(self.branching)}, max {max(self.branching)}")
+        lines.extend(self.lore_violations)
+        return "\n".join(lines)
+
+
+class PlanValidator:
+    """
+    Validatore in stile VAL sul task grounded: applica le azioni sugli stati bitset,
+    verifica precondizioni e goal e confronta profondità e branching con i limiti della lore.
+    Il grounding si fa una volta sola, così si possono validare molti piani dello stesso problema.
+    """
+
+    def __init__(self, task: GroundTask, lore: Optional[LoreDocument] = None, check_branching: bool = True):
+        self.task = task
+        self.lore = lore
+        self.check_branching = check_branching
+        self.index = {label.lower(): i for label, i in task.action_by_label().items()}
+        self._branching_cache: Dict[int, int] = {}
+
+    def branching(self, state: int) -> int:
+        """Numero di azioni ground applicabili nello stato (memorizzato: i piani condividono prefissi)."""
+        count = self._branching_cache.get(state)
+        if count is None:
+            count = sum(1 for _ in self.task.applicable_actions(state))
+            self._branching_cache[state] = count
+        return count
+
+    def validate(self, plan: Sequence[str]) -> PlanValidation:
+        task = self.task
+        result = PlanValidation(depth=len(plan))
+        state = task.init
+        for step, raw in enumerate(plan):
+            label = normalize_step(raw)
+            if self.check_branching:
+                result.branching.append(self.branching(state))
+            i = self.index.get(label)
+            if i is None:
+                result.executable = False
+                result.failed_step, result.failed_action = step, label
+                result.errors.append(f"Passo {step + 1}: {label} non esiste nel dominio "
+                                     "(azione sconosciuta, argomenti di tipo errato o precondizioni statiche false)")
+                break
+            action = task.actions[i]
+            if not task.is_applicable(state, action):
+                result.executable = False
+                result.failed_step, result.failed_action = step, label
+                missing = [task.fact_name(f) for f in iter_bits(action.pre_pos & ~state)]
+                present = [task.fact_name(f) for f in iter_bits(action.pre_neg & state)]
+                details = ", ".join([f"manca {m}" for m in missing] + [f"vale {p}" for p in present])
+                result.errors.append(f"Passo {step + 1}: {label} non applicabile ({details})")
+                break
+            state = task.apply(state, action)
+
+        if result.executable:
+            result.goal_reached = task.is_goal(state)
+            if not result.goal_reached:
+                missing = [task.fact_name(f) for f in iter_bits(task.goal_pos & ~state)]
+                present = [task.fact_name(f) for f in iter_bits(task.goal_neg & state)]
+                result.errors.append("Goal non raggiunto: " + ", ".join(
+                    [f"manca {m}" for m in missing] + [f"vale ancora {p}" for p in present]))
+
+        if self.lore is not None:
+            result.lore_violations = self._check_lore(result)
+        return result
+
+    def _check_lore(self, result: PlanValidation) -> List[str]:
+        violations = []
+        d_min, d_max = self.lore.depth_constraints
+        if not d_min <= result.depth <= d_max:
+            violations.append(f"Profondità {result.depth} fuori dai limiti della lore [{d_min}, {d_max}]")
+        b_min, b_max = self.lore.branching_factor
+        outside = [(i + 1, b) for i, b in enumerate(result.branching) if not b_min <= b <= b_max]
+        if outside:
+            examples = ", ".join(f"passo {i}: {b}" for i, b in outside[:5])
+            violations.append(f"Branching fuori dai limiti [{b_min}, {b_max}] in {len(outside)} stati ({examples})")
+        return violations
+
+    def validate_many(self, plans: Iterable[Sequence[str]]) -> List[PlanValidation]:
+        return [self.validate(plan) for plan in plans]
+
+
+def validate_plans(domain_text: str, problem_text: str, plans: Iterable[Sequence[str]],
+                   lore: Optional[LoreDocument] = None, check_branching: bool = True,
+                   max_ground_actions: Optional[int] = 50000) -> List[PlanValidation]:
+    """Valida in blocco più piani sullo stesso dominio/problema (un solo grounding)."""
+    with span("validator.ground", "validation"):
+        task = ground(parse_domain(domain_text), parse_problem(problem_text), max_actions=max_ground_actions)
+    validator = PlanValidator(task, lore, check_branching)
+    with span("validator.validate", "validation"):
+        return validator.validate_many(plans)
+
+
+def validate_plan(domain_text: str, problem_text: str, plan: Sequence[str],
+                  lore: Optional[LoreDocument] = None, **kwargs) -> PlanValidation:
+    return validate_plans(domain_text, problem_text, [plan], lore, **kwargs)[0]
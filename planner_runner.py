@@ -0,0 +1,285 @@
+import os
+import re
+import shlex
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from tracing import annotate, record, span
+
+DEFAULT_SEARCH = ["--search", "astar(lmcut())"]
+
+
+@dataclass
+class PlannerConfig:
+    name: str
+    search_args: List[str]
+    driver_args: List[str] = field(default_factory=list)  # opzioni del driver, prima dei file PDDL
+
+
+# Configurazioni satisficing, dalla più rapida alla più robusta
+DEFAULT_PORTFOLIO = [
+    PlannerConfig("lazy_gbfs_ff", ["--evaluator", "hff=ff()", "--search", "lazy_greedy([hff], preferred=[hff])"]),
+    PlannerConfig("lama_first", [], ["--alias", "lama-first"]),
+    PlannerConfig("gbfs_cg", ["--evaluator", "hcg=cg()", "--search", "eager_greedy([hcg], preferred=[hcg])"]),
+    PlannerConfig("blind_bfs", ["--search", "astar(blind())"]),
+]
+
+# Configurazione anytime usata per migliorare il piano nel tempo rimasto
+IMPROVE_CONFIG = PlannerConfig("lama_anytime", [], ["--alias", "seq-sat-lama-2011"])
+
+
+@dataclass
+class PlannerResult:
+    plan: Optional[List[str]]
+    returncode: Optional[int]
+    stdout: str = ""
+    stderr: str = ""
+    elapsed: float = 0.0
+    timed_out: bool = False
+    stats: Dict[str, float] = field(default_factory=dict)
+    config: str = ""
+
+    @property
+    def solved(self) -> bool:
+        return bool(self.plan)
+
+
+def default_planner_command() -> List[str]:
+    """
+    Comando del planner: FAST_DOWNWARD_CMD (es. "python /opt/downward/fast-downward.py"),
+    altrimenti 'fast-downward' nel PATH, altrimenti fast-downward.py nella cartella corrente.
+    """
+    configured = os.getenv("FAST_DOWNWARD_CMD")
+    if configured:
+        return shlex.split(configured)
+    found = shutil.which("fast-downward") or shutil.which("fast-downward.py")
+    if found:
+        return [found]
+    return [sys.executable, "fast-downward.py"]
+
+
+def parse_plan_lines(text: str) -> List[str]:
+    return [line.strip() for line in text.splitlines() if line.strip() and not line.startswith(";")]
+
+
+def parse_planner_stats(stdout: str) -> Dict[str, float]:
+    """Estrae dal log di Fast Downward tempi di traduzione/ricerca e stati espansi."""
+    stats = {}
+    patterns = {
+        "translate_time": r"Done! \[([\d.]+)s CPU",
+        "search_time": r"Search time: ([\d.]+)s",
+        "total_time": r"Total time: ([\d.]+)s",
+        "expanded": r"Expanded (\d+) state",
+        "plan_cost": r"Plan cost: (\d+)",
+    }
+    for key, pattern in patterns.items():
+        match = re.search(pattern, stdout)
+        if match:
+            stats[key] = float(match.group(1))
+    return stats
+
+
+class _PlannerProcess:
+    """Un'esecuzione del planner nella propria cartella temporanea, con output su file."""
+
+    def __init__(self, command: List[str], domain_text: str, problem_text: str, config: PlannerConfig):
+        self.config = config
+        self._workspace = tempfile.TemporaryDirectory(prefix="planner_")
+        self.ws = Path(self._workspace.name)
+        (self.ws / "domain.pddl").write_text(domain_text, encoding="utf-8")
+        (self.ws / "problem.pddl").write_text(problem_text, encoding="utf-8")
+        cmd = command + config.driver_args + [
+            "--plan-file", str(self.ws / "sas_plan"),
+            str(self.ws / "domain.pddl"), str(self.ws / "problem.pddl"),
+        ] + config.search_args
+
+        popen_kwargs = {}
+        if os.name == "posix":
+            # Gruppo di processi dedicato: al timeout si termina anche la ricerca figlia
+            popen_kwargs["start_new_session"] = True
+        # Output su file e non su pipe: nessun blocco se il log è grande e nessuno lo legge
+        self._stdout = open(self.ws / "stdout.log", "w", encoding="utf-8")
+        self._stderr = open(self.ws / "stderr.log", "w", encoding="utf-8")
+        self.start = time.monotonic()
+        try:
+            self.proc = subprocess.Popen(
+                cmd, cwd=str(self.ws), stdout=self._stdout, stderr=self._stderr, text=True, **popen_kwargs
+            )
+        except Exception:
+            self._cleanup()
+            raise
+
+    def finished(self) -> bool:
+        return self.proc.poll() is not None
+
+    def wait(self, timeout: float) -> bool:
+        """Attende la fine del processo; in caso di timeout lo termina e ritorna True."""
+        try:
+            self.proc.wait(timeout=max(timeout, 0))
+            return False
+        except subprocess.TimeoutExpired:
+            self.kill()
+            return True
+
+    def kill(self):
+        kill_process_tree(self.proc)
+        self.proc.wait()
+
+    def result(self, timed_out: bool = False) -> PlannerResult:
+        elapsed = time.monotonic() - self.start
+        try:
+            self._stdout.close()
+            self._stderr.close()
+            stdout = (self.ws / "stdout.log").read_text(encoding="utf-8", errors="replace")
+            stderr = (self.ws / "stderr.log").read_text(encoding="utf-8", errors="replace")
+            plan = self._read_plan()
+            return PlannerResult(plan, self.proc.returncode, stdout, stderr, elapsed, timed_out,
+                                 parse_planner_stats(stdout), self.config.name)
+        finally:
+            self._cleanup()
+
+    def _read_plan(self) -> Optional[List[str]]:
+        # Le configurazioni anytime scrivono sas_plan.1, sas_plan.2, ...: l'ultimo è il migliore
+        candidates = sorted(
+            self.ws.glob("sas_plan*"),
+            key=lambda p: int(p.suffix[1:]) if p.suffix[1:].isdigit() else 0,
+        )
+        if not candidates:
+            return None
+        actions = parse_plan_lines(candidates[-1].read_text(encoding="utf-8"))
+        return actions or None
+
+    def _cleanup(self):
+        for f in (self._stdout, self._stderr):
+            if not f.closed:
+                f.close()
+        self._workspace.cleanup()
+
+
+class PlannerRunner:
+    """
+    Esegue Fast Downward in una cartella temporanea dedicata per ogni invocazione,
+    così più pianificazioni concorrenti non si sovrascrivono i file.
+    """
+
+    def __init__(self, command: Optional[Sequence[str]] = None, search_args: Optional[Sequence[str]] = None,
+                 timeout: float = 30, max_workers: Optional[int] = None):
+        self.command = list(command) if command else default_planner_command()
+        self.search_args = list(search_args) if search_args else list(DEFAULT_SEARCH)
+        self.timeout = timeout
+        self.max_workers = max_workers or os.cpu_count() or 2
+
+    def run(self, domain_text: str, problem_text: str, search_args: Optional[Sequence[str]] = None,
+            timeout: Optional[float] = None, config: Optional[PlannerConfig] = None) -> PlannerResult:
+        timeout = self.timeout if timeout is None else timeout
+        config = config or PlannerConfig("default", list(search_args or self.search_args))
+        with span("planner.fast_downward", "planner", config=config.name):
+            process = _PlannerProcess(self.command, domain_text, problem_text, config)
+            timed_out = process.wait(timeout)
+            result = process.result(timed_out)
+            _trace_result(result)
+            return result
+
+    def run_files(self, domain_file: str, problem_file: str, **kwargs) -> PlannerResult:
+        return self.run(
+            Path(domain_file).read_text(encoding="utf-8"),
+            Path(problem_file).read_text(encoding="utf-8"),
+            **kwargs,
+        )
+
+    def run_many(self, tasks: Sequence[Tuple[str, str]], **kwargs) -> List[PlannerResult]:
+        """Pianifica molte coppie (dominio, problema) in parallelo con un pool limitato."""
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = [pool.submit(self.run, d, p, **kwargs) for d, p in tasks]
+            return [f.result() for f in futures]
+
+    def run_portfolio(self, domain_text: str, problem_text: str,
+                      configs: Optional[Sequence[PlannerConfig]] = None, timeout: Optional[float] = None,
+                      improve: bool = False, on_improved: Optional[Callable[[PlannerResult], None]] = None,
+                      poll_interval: float = 0.05) -> PlannerResult:
+        """
+        Lancia in parallelo più configurazioni di ricerca (al massimo max_workers alla volta)
+        e restituisce il primo piano trovato, terminando le altre.
+        Con improve=True continua a cercare fino al timeout e tiene il piano più corto;
+        on_improved viene chiamato a ogni miglioramento.
+        """
+        with span("planner.portfolio", "planner", improve=improve):
+            result = self._run_portfolio(domain_text, problem_text, configs, timeout, improve,
+                                         on_improved, poll_interval)
+            _trace_result(result)
+            return result
+
+    def _run_portfolio(self, domain_text: str, problem_text: str, configs: Optional[Sequence[PlannerConfig]],
+                       timeout: Optional[float], improve: bool,
+                       on_improved: Optional[Callable[[PlannerResult], None]],
+                       poll_interval: float) -> PlannerResult:
+        timeout = self.timeout if timeout is None else timeout
+        pending = deque(configs or DEFAULT_PORTFOLIO)
+        if improve and IMPROVE_CONFIG not in pending:
+            pending.append(IMPROVE_CONFIG)
+        deadline = time.monotonic() + timeout
+        running: List[_PlannerProcess] = []
+        best: Optional[PlannerResult] = None
+        last: Optional[PlannerResult] = None
+
+        def consider(result: PlannerResult):
+            nonlocal best, last
+            last = result
+            if result.solved and (best is None or len(result.plan) < len(best.plan)):
+                best = result
+                if on_improved is not None:
+                    on_improved(result)
+
+        try:
+            while pending or running:
+                while pending and len(running) < self.max_workers:
+                    running.append(_PlannerProcess(self.command, domain_text, problem_text, pending.popleft()))
+                for process in [p for p in running if p.finished()]:
+                    running.remove(process)
+                    consider(process.result())
+                if (best is not None and not improve) or time.monotonic() >= deadline:
+                    break
+                time.sleep(poll_interval)
+        finally:
+            for process in running:
+                process.kill()
+                result = process.result(timed_out=True)
+                # Un planner anytime interrotto può aver già scritto piani validi
+                if improve:
+                    consider(result)
+
+        if best is not None:
+            return best
+        return last or PlannerResult(None, None, elapsed=timeout, timed_out=True, config="portfolio")
+
+
+def _trace_result(result: PlannerResult):
+    """Riporta sullo span corrente l'esito e i tempi di traduzione/ricerca letti dal log."""
+    annotate(winner=result.config, solved=result.solved, timed_out=result.timed_out,
+             plan_length=len(result.plan) if result.plan else None)
+    if "translate_time" in result.stats:
+        record("planner.fd_translate", "planner", result.stats["translate_time"], config=result.config)
+    if "search_time" in result.stats:
+        record("planner.fd_search", "planner", result.stats["search_time"], config=result.config,
+               expanded=result.stats.get("expanded"))
+
+
+def kill_process_tree(proc: subprocess.Popen):
+    if proc.poll() is not None:
+        return
+    try:
+        if os.name == "posix":
+            os.killpg(proc.pid, signal.SIGKILL)
+        else:
+            proc.kill()
+    except (ProcessLookupError, PermissionError):
+        proc.kill()
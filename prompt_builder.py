@@ -0,0 +1,153 @@
+import os
+import re
+from dataclasses import dataclass
+from typing import List, Optional, Sequence
+
+from lore import LoreDocument
+from pddl_parser import Issue, PDDLParseError, parse_domain, parse_problem
+
+DEFAULT_PROMPT_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "3000"))
+
+# Approssima la tokenizzazione BPE: parole, numeri e singoli simboli
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+
+
+def count_tokens(text: str) -> int:
+    """Stima del numero di token (le parole lunghe contano come più token)."""
+    return sum(1 + len(t) // 6 for t in _TOKEN_RE.findall(text))
+
+
+def truncate_to_tokens(text: str, budget: int) -> str:
+    """Tronca il testo riga per riga finché rientra nel budget."""
+    if count_tokens(text) <= budget:
+        return text
+    kept, used = [], 0
+    for line in text.splitlines():
+        cost = count_tokens(line) + 1
+        if used + cost > budget:
+            break
+        kept.append(line)
+        used += cost
+    kept.append("[...]")
+    return "\n".join(kept)
+
+
+@dataclass
+class PromptSection:
+    text: str
+    title: Optional[str] = None
+    priority: int = 0        # le sezioni con priorità più bassa vengono tagliate per prime
+    required: bool = False   # le sezioni obbligatorie non vengono mai tagliate
+
+    def render(self, text: Optional[str] = None) -> str:
+        body = self.text if text is None else text
+        return f"{self.title}:\n{body}" if self.title else body
+
+
+class PromptBuilder:
+    """
+    Compone i prompt come prefisso stabile (contesto della lore, identico per tutte
+    le chiamate sulla stessa lore, così la cache dei prompt del provider può riusarlo)
+    seguito dalle sezioni specifiche della chiamata, rispettando un budget di token.
+    """
+
+    def __init__(self, prefix: str = "", max_tokens: Optional[int] = None):
+        self.prefix = prefix.strip()
+        self.max_tokens = max_tokens or DEFAULT_PROMPT_BUDGET
+        self.sections: List[PromptSection] = []
+        self.tokens = 0
+
+    def add(self, text: str, title: Optional[str] = None, priority: int = 0,
+            required: bool = False) -> "PromptBuilder":
+        if text and text.strip():
+            self.sections.append(PromptSection(text.strip(), title, priority, required))
+        return self
+
+    def build(self) -> str:
+        texts = [s.render() for s in self.sections]
+        budget = self.max_tokens - count_tokens(self.prefix)
+        used = sum(count_tokens(t) for t in texts)
+
+        # Riduce le sezioni facoltative, dalla meno importante, finché il prompt rientra nel budget
+        for i in sorted(range(len(self.sections)), key=lambda i: self.sections[i].priority):
+            if used <= budget:
+                break
+            section = self.sections[i]
+            if section.required:
+                continue
+            current = count_tokens(texts[i])
+            allowed = max(0, current - (used - budget))
+            texts[i] = section.render(truncate_to_tokens(section.text, allowed)) if allowed > 20 else ""
+            used += count_tokens(texts[i]) - current
+
+        if used > budget:
+            print(f"⚠️ Prompt oltre il budget ({used} > {budget} token) anche senza le sezioni facoltative")
+        prompt = "\n\n".join(p for p in [self.prefix] + texts if p)
+        self.tokens = count_tokens(prompt)
+        return prompt
+
+
+def lore_context(lore: LoreDocument) -> str:
+    """Contesto della lore, reso sempre nello stesso modo (prefisso stabile dei prompt)."""
+    return "\n".join([
+        "Lore:",
+        f"Descrizione: {lore.quest_description}",
+        f"Contesto: {lore.world_context}",
+        f"Personaggi: {', '.join(lore.characters or [])}",
+        f"Luoghi: {', '.join(lore.locations or [])}",
+        f"Oggetti: {', '.join(lore.items or [])}",
+        f"Vincoli: {', '.join(lore.constraints or [])}",
+    ])
+
+
+def compact_pddl(text: str) -> str:
+    """Rimuove commenti, righe vuote e spazi superflui senza cambiare il significato."""
+    lines = []
+    for line in text.splitlines():
+        line = re.sub(r"\s+", " ", line.split(";")[0]).strip()
+        if line:
+            lines.append(line)
+    return "\n".join(lines)
+
+
+def numbered_lines(text: str, lines: Sequence[str], context: int = 1) -> str:
+    """Righe sospette con il loro numero e un po' di contesto (per PDDL non analizzabile)."""
+    all_lines = text.splitlines()
+    suspicious = set(lines)
+    keep = set()
+    for i, line in enumerate(all_lines):
+        if line in suspicious:
+            keep.update(range(max(0, i - context), min(len(all_lines), i + context + 1)))
+    return "\n".join(f"{i + 1}: {all_lines[i]}" for i in sorted(keep))
+
+
+def localize_pddl(domain_text: str, problem_text: str, issues: Sequence[Issue]) -> Optional[str]:
+    """
+    Estrae solo le parti del PDDL coinvolte negli errori: le azioni guaste, i predicati
+    dichiarati, gli atomi dell'init e il goal. None se il PDDL non è analizzabile.
+    """
+    try:
+        domain = parse_domain(domain_text)
+        problem = parse_problem(problem_text)
+    except PDDLParseError:
+        return None
+
+    components = {i.component for i in issues}
+    if components & {"domain", "problem"}:
+        return f"DOMINIO:\n{compact_pddl(domain_text)}\n\nPROBLEMA:\n{compact_pddl(problem_text)}"
+
+    parts = ["PREDICATI DICHIARATI:\n" + "\n".join(p.to_pddl() for p in domain.predicates)]
+    broken = {i.subject for i in issues if i.component == "action"}
+    actions = [a.to_pddl() for a in domain.actions if a.name in broken]
+    if actions:
+        parts.append("AZIONI DA CORREGGERE:\n" + "\n".join(actions))
+    init_subjects = {i.subject for i in issues if i.component == "init"}
+    if init_subjects:
+        atoms = [a.to_pddl() for a in problem.init
+                 if a.predicate in init_subjects or set(a.args) & init_subjects]
+        parts.append("INIT (atomi coinvolti):\n" + "\n".join(atoms))
+    if "goal" in components:
+        objects = " ".join(f"{o} - {t}" for o, t in problem.objects.items())
+        parts.append(f"OGGETTI: {objects}")
+        parts.append("GOAL:\n" + (problem.goal.to_pddl() if problem.goal is not None else "(and)"))
+    return "\n\n".join(parts)
@@ -0,0 +1,62 @@
+from string import Formatter
+from typing import Dict, List, NamedTuple, Sequence, Tuple
+
+
+class Message(NamedTuple):
+    role: str      # "system" o "human"
+    content: str
+
+
+class PromptTemplate:
+    """
+    Template in stile str.format ({nome}, con {{ e }} per le graffe letterali), compilato
+    una volta sola in una lista di (testo fisso, campo): la formattazione è una join.
+    """
+
+    def __init__(self, template: str):
+        self.template = template
+        self.parts: List[Tuple[str, str]] = []
+        for literal, name, spec, conversion in Formatter().parse(template):
+            if spec or conversion:
+                raise ValueError(f"Template non supportato (solo {{nome}}): {{{name}!{conversion}:{spec}}}")
+            self.parts.append((literal, name or ""))
+        self.variables = {name for _, name in self.parts if name}
+
+    def format(self, **values) -> str:
+        missing = self.variables - values.keys()
+        if missing:
+            raise KeyError(f"Valori mancanti per il template: {', '.join(sorted(missing))}")
+        return "".join(literal + (str(values[name]) if name else "") for literal, name in self.parts)
+
+
+class ChatTemplate:
+    """Sequenza di messaggi (ruolo, template), come ChatPromptTemplate.from_messages."""
+
+    def __init__(self, messages: Sequence[Tuple[str, str]]):
+        self.messages = [(role, PromptTemplate(text)) for role, text in messages]
+        self.variables = set().union(*(t.variables for _, t in self.messages))
+
+    def format_messages(self, **values) -> List[Message]:
+        return [Message(role, template.format(**values)) for role, template in self.messages]
+
+
+_REGISTRY: Dict[str, ChatTemplate] = {}
+
+
+def register_prompt(name: str, messages: Sequence[Tuple[str, str]]) -> ChatTemplate:
+    """Registra (e compila) un prompt; i moduli lo fanno all'import, una volta per processo."""
+    if name in _REGISTRY:
+        raise ValueError(f"Prompt '{name}' già registrato")
+    template = _REGISTRY[name] = ChatTemplate(messages)
+    return template
+
+
+def get_prompt(name: str) -> ChatTemplate:
+    try:
+        return _REGISTRY[name]
+    except KeyError:
+        raise KeyError(f"Prompt '{name}' non registrato") from None
+
+
+def registered_prompts() -> List[str]:
+    return sorted(_REGISTRY)
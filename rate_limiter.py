@@ -0,0 +1,235 @@
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from typing import Dict, Iterator, Mapping, Optional, Tuple
+
+from tracing import annotate, record
+
+
+class TokenBucket:
+    """
+    Bucket a ricarica continua (rate per minuto). reserve() preleva subito e può andare in
+    debito: restituisce quanto attendere, così le richieste concorrenti si mettono in fila
+    nell'ordine in cui prenotano invece di contendersi la ricarica.
+    """
+
+    def __init__(self, per_minute: float, capacity: Optional[float] = None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity if capacity is not None else per_minute
+        self.level = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount: float = 1.0) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.level -= amount
+            return 0.0 if self.level >= 0 else -self.level / self.rate
+
+    def refund(self, amount: float):
+        """Restituisce la parte di una prenotazione non usata (es. token stimati in eccesso)."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.level = min(self.capacity, self.level + amount)
+
+
+class AdaptiveConcurrency:
+    """
+    Limite di richieste in volo regolato in stile AIMD: +1 per ogni "finestra" di richieste
+    riuscite, dimezzato a ogni segnale di sovraccarico (429), al più una volta per finestra.
+    """
+
+    def __init__(self, initial: int = 4, minimum: int = 1, maximum: int = 16):
+        self.minimum = minimum
+        self.maximum = max(minimum, maximum)
+        self.limit = float(min(max(initial, minimum), self.maximum))
+        self.in_flight = 0
+        self.waiting = 0
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            self.waiting += 1
+            try:
+                while self.in_flight >= int(self.limit):
+                    self._cond.wait()
+            finally:
+                self.waiting -= 1
+            self.in_flight += 1
+
+    def release(self, throttled: bool = False, cooldown: float = 1.0):
+        with self._cond:
+            self.in_flight -= 1
+            now = time.monotonic()
+            if throttled:
+                if now - self._last_decrease >= cooldown:
+                    self.limit = max(self.minimum, self.limit / 2)
+                    self._last_decrease = now
+            else:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self._cond.notify_all()
+
+
+def retry_after_seconds(headers: Mapping[str, str]) -> Optional[float]:
+    """Valore dell'header Retry-After in secondi (accetta sia secondi sia data HTTP)."""
+    value = headers.get("Retry-After") or headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt: int, retry_after: Optional[float] = None, base: float = 1.0,
+                  cap: float = 60.0) -> float:
+    """
+    Attesa prima del tentativo successivo: Retry-After se il server lo indica, altrimenti
+    backoff esponenziale; in entrambi i casi con jitter, per non far ripartire insieme i thread.
+    """
+    if retry_after is not None:
+        return retry_after + random.uniform(0, min(1.0, 0.1 * retry_after + 0.1))
+    delay = min(cap, base * 2 ** attempt)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+class RateLimiter:
+    """
+    Limitatore lato client condiviso da tutti i thread del processo: richieste e token al
+    minuto (bucket), concorrenza adattiva (AIMD) e pausa globale quando il provider risponde 429.
+    rpm/tpm a 0 disattivano il relativo limite.
+    """
+
+    def __init__(self, rpm: float = 0, tpm: float = 0, initial_concurrency: int = 4,
+                 max_concurrency: int = 16):
+        self.requests = TokenBucket(rpm) if rpm > 0 else None
+        self.tokens = TokenBucket(tpm) if tpm > 0 else None
+        self.concurrency = AdaptiveConcurrency(initial_concurrency, 1, max_concurrency)
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "throttled": 0, "waited": 0, "wait_total_s": 0.0,
+                       "wait_max_s": 0.0, "max_queue_depth": 0}
+
+    @contextmanager
+    def slot(self, tokens: int = 0) -> Iterator["_Slot"]:
+        """
+        Attende il proprio turno (concorrenza, pausa globale, bucket) e tiene occupato lo slot
+        per tutta la durata della richiesta; con slot.throttle(...) si segnala un 429.
+        """
+        start = time.monotonic()
+        with self._lock:
+            depth = self.concurrency.waiting + 1
+            self._stats["max_queue_depth"] = max(self._stats["max_queue_depth"], depth)
+        self.concurrency.acquire()
+        current = _Slot(self, tokens)
+        try:
+            wait = max(self.paused_until - time.monotonic(), 0.0)
+            if self.requests is not None:
+                wait = max(wait, self.requests.reserve(1))
+            if self.tokens is not None and tokens:
+                wait = max(wait, self.tokens.reserve(tokens))
+            if wait > 0:
+                time.sleep(wait)
+            self._record_wait(time.monotonic() - start)
+            yield current
+        finally:
+            self.concurrency.release(current.throttled, current.cooldown)
+
+    def _record_wait(self, waited: float):
+        with self._lock:
+            stats = self._stats
+            stats["requests"] += 1
+            if waited >= 0.001:
+                stats["waited"] += 1
+                stats["wait_total_s"] += waited
+                stats["wait_max_s"] = max(stats["wait_max_s"], waited)
+        annotate(queue_wait_s=round(waited, 3))
+        if waited >= 0.001:
+            record("llm.rate_limit_wait", "llm", waited)
+
+    def pause(self, seconds: float):
+        """Sospende tutte le nuove richieste del processo (429 con Retry-After)."""
+        with self._lock:
+            self._stats["throttled"] += 1
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["queue_depth"] = self.concurrency.waiting
+        stats["in_flight"] = self.concurrency.in_flight
+        stats["concurrency_limit"] = round(self.concurrency.limit, 2)
+        stats["wait_mean_s"] = stats["wait_total_s"] / stats["waited"] if stats["waited"] else 0.0
+        return stats
+
+    def format_stats(self) -> str:
+        s = self.stats()
+        return (f"🚦 Rate limiter: {s['requests']} richieste, {s['throttled']} rallentamenti (429/503), "
+                f"{s['waited']} in attesa (media {s['wait_mean_s']:.2f}s, max {s['wait_max_s']:.2f}s), "
+                f"coda max {s['max_queue_depth']}, concorrenza {s['concurrency_limit']}")
+
+
+class _Slot:
+    def __init__(self, limiter: RateLimiter, tokens: int):
+        self.limiter = limiter
+        self.tokens = tokens
+        self.throttled = False
+        self.cooldown = 1.0
+        self.refunded = False
+
+    def throttle(self, delay: float):
+        self.throttled = True
+        self.cooldown = max(1.0, delay)
+        self.limiter.pause(delay)
+
+    def refund(self):
+        """Restituisce ai bucket richiesta e token prenotati: il provider ha respinto la richiesta (429/503)."""
+        if self.refunded:
+            return
+        self.refunded = True
+        if self.limiter.requests is not None:
+            self.limiter.requests.refund(1)
+        if self.limiter.tokens is not None and self.tokens:
+            self.limiter.tokens.refund(self.tokens)
+        self.tokens = 0
+
+    def settle(self, used_tokens: int):
+        """Corregge la stima dei token prenotati con quelli effettivamente consumati."""
+        if self.limiter.tokens is not None and self.tokens > used_tokens:
+            self.limiter.tokens.refund(self.tokens - used_tokens)
+            self.tokens = used_tokens
+
+
+_limiters: Dict[Tuple[str, str], RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(api_url: str, model: str) -> RateLimiter:
+    """
+    Limitatore condiviso per endpoint e modello, configurato da LLM_RPM, LLM_TPM,
+    LLM_CONCURRENCY (iniziale) e LLM_MAX_CONCURRENCY.
+    """
+    key = (api_url, model)
+    with _limiters_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            limiter = _limiters[key] = RateLimiter(
+                rpm=float(os.getenv("LLM_RPM", "0")),
+                tpm=float(os.getenv("LLM_TPM", "0")),
+                initial_concurrency=int(os.getenv("LLM_CONCURRENCY", "4")),
+                max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "16")),
+            )
+        return limiter
@@ -0,0 +1,176 @@
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set
+
+from grounding import GroundingError, ground, iter_bits
+from pddl_parser import (
+    Atom, Domain, Issue, PDDLParseError, Problem, iter_atoms, parse_domain, parse_problem,
+)
+from strips_planner import INF, RelaxedHeuristic
+
+
+@dataclass
+class ReachabilityReport:
+    """Esito dell'analisi statica eseguita prima del planner."""
+    unreachable_goals: List[str] = field(default_factory=list)
+    unreachable_locations: List[str] = field(default_factory=list)
+    undeclared_predicates: List[str] = field(default_factory=list)
+    unused_predicates: List[str] = field(default_factory=list)
+    type_errors: List[str] = field(default_factory=list)
+    issues: List[Issue] = field(default_factory=list)  # cause localizzate dei goal irraggiungibili
+    analyzed: bool = True
+    elapsed: float = 0.0
+
+    @property
+    def hopeless(self) -> bool:
+        """Vero se il goal è irraggiungibile anche ignorando le cancellazioni: inutile lanciare il planner."""
+        return bool(self.unreachable_goals)
+
+    def summary(self) -> str:
+        lines = []
+        if self.unreachable_goals:
+            lines.append("Goal irraggiungibili: " + ", ".join(self.unreachable_goals))
+        lines.extend(str(i) for i in self.issues)
+        if self.unreachable_locations:
+            lines.append("Luoghi non raggiungibili via connected: " + ", ".join(self.unreachable_locations))
+        if self.undeclared_predicates:
+            lines.append("Predicati non dichiarati: " + ", ".join(self.undeclared_predicates))
+        if self.unused_predicates:
+            lines.append("Predicati mai usati: " + ", ".join(self.unused_predicates))
+        lines.extend(self.type_errors)
+        return "\n".join(lines)
+
+
+def is_subtype(domain: Domain, typ: str, expected: str) -> bool:
+    seen = set()
+    while typ and typ not in seen:
+        if typ == expected:
+            return True
+        seen.add(typ)
+        typ = domain.types.get(typ, "object" if typ != "object" else "")
+    return expected == "object"
+
+
+def _check_types(domain: Domain, problem: Problem) -> List[str]:
+    """Confronta i tipi degli argomenti con quelli dichiarati dai predicati."""
+    errors = []
+    predicates = domain.predicate_map()
+    objects = dict(domain.constants)
+    objects.update(problem.objects)
+
+    def check(atom: Atom, arg_types: Dict[str, str], where: str):
+        decl = predicates.get(atom.predicate)
+        if decl is None or decl.arity != len(atom.args):
+            return
+        for arg, param in zip(atom.args, decl.params):
+            typ = arg_types.get(arg)
+            if typ is not None and not is_subtype(domain, typ, param.type):
+                errors.append(f"{where}: {atom.to_pddl()} usa '{arg}' di tipo {typ}, atteso {param.type}")
+
+    for action in domain.actions:
+        arg_types = dict(objects)
+        arg_types.update({p.name: p.type for p in action.parameters})
+        for formula in (action.precondition, action.effect):
+            for atom, _ in iter_atoms(formula):
+                check(atom, arg_types, f"Azione '{action.name}'")
+    for atom in problem.init:
+        check(atom, objects, "Init")
+    for atom, _ in iter_atoms(problem.goal):
+        check(atom, objects, "Goal")
+    return errors
+
+
+def _unreachable_locations(problem: Problem, domain: Domain) -> List[str]:
+    """Luoghi non raggiungibili dalle posizioni iniziali dei personaggi seguendo connected."""
+    locations = [o for o, t in problem.objects.items() if is_subtype(domain, t, "location")]
+    if not locations:
+        return []
+    graph: Dict[str, List[str]] = {}
+    starts = set()
+    for atom in problem.init:
+        if atom.predicate == "connected" and len(atom.args) == 2:
+            graph.setdefault(atom.args[0], []).append(atom.args[1])
+        elif atom.predicate == "at" and len(atom.args) == 2:
+            obj_type = problem.objects.get(atom.args[0], "")
+            if is_subtype(domain, obj_type, "character"):
+                starts.add(atom.args[1])
+    if not starts:
+        return []
+    seen = set(starts)
+    queue = deque(starts)
+    while queue:
+        for nxt in graph.get(queue.popleft(), []):
+            if nxt not in seen:
+                seen.add(nxt)
+                queue.append(nxt)
+    return [l for l in locations if l not in seen]
+
+
+def analyze_reachability(domain: Domain, problem: Problem, max_ground_actions: int = 50000) -> ReachabilityReport:
+    start = time.perf_counter()
+    report = ReachabilityReport()
+
+    declared = {p.name for p in domain.predicates}
+    used: Set[str] = set()
+    achievers: Dict[str, List[str]] = {}
+    for action in domain.actions:
+        for atom, _ in iter_atoms(action.precondition):
+            used.add(atom.predicate)
+        for atom, negated in iter_atoms(action.effect):
+            used.add(atom.predicate)
+            if not negated:
+                achievers.setdefault(atom.predicate, []).append(action.name)
+    used.update(a.predicate for a in problem.init)
+    used.update(a.predicate for a, _ in iter_atoms(problem.goal))
+    report.undeclared_predicates = sorted(used - declared)
+    report.unused_predicates = sorted(declared - used)
+    report.type_errors = _check_types(domain, problem)
+    report.unreachable_locations = _unreachable_locations(problem, domain)
+
+    try:
+        task = ground(domain, problem, max_actions=max_ground_actions)
+    except GroundingError:
+        report.analyzed = False
+        report.elapsed = time.perf_counter() - start
+        return report
+
+    # Raggiungibilità rilassata: punto fisso ignorando cancellazioni e precondizioni negative
+    cost, _ = RelaxedHeuristic(task).explore(task.init)
+    deletable = 0
+    for a in task.actions:
+        if all(cost[f] < INF for f in iter_bits(a.pre_pos)):
+            deletable |= a.delete
+
+    for f in iter_bits(task.goal_pos):
+        if cost[f] == INF:
+            _explain(report, task.facts[f], achievers)
+    for f in iter_bits(task.goal_neg & task.init & ~deletable):
+        name = "(not " + task.fact_name(f) + ")"
+        report.unreachable_goals.append(name)
+        report.issues.append(Issue("goal", name, f"Goal: {name} è falso all'inizio e nessuna azione lo rende vero"))
+
+    report.elapsed = time.perf_counter() - start
+    return report
+
+
+def _explain(report: ReachabilityReport, fact: tuple, achievers: Dict[str, List[str]]):
+    name = "(" + " ".join(fact) + ")"
+    report.unreachable_goals.append(name)
+    producers = achievers.get(fact[0], [])
+    if not producers:
+        report.issues.append(Issue("goal", fact[0], f"Goal: nessuna azione produce il predicato '{fact[0]}' richiesto da {name}"))
+        return
+    for action in producers:
+        report.issues.append(Issue(
+            "action", action,
+            f"Azione '{action}': produce '{fact[0]}' ma le sue precondizioni non sono mai soddisfacibili per {name}",
+        ))
+
+
+def analyze_pddl(domain_text: str, problem_text: str) -> Optional[ReachabilityReport]:
+    """Analisi statica sul testo PDDL; None se il testo non è analizzabile."""
+    try:
+        return analyze_reachability(parse_domain(domain_text), parse_problem(problem_text))
+    except PDDLParseError:
+        return None
@@ -1,35 +1,69 @@
-from typing import Dict, List
+from typing import Dict, List, Optional, Sequence
 from lore import LoreDocument
 from llm_interface import LLMInterface
-from langchain.prompts import ChatPromptTemplate
+from pddl_parser import Issue
+from prompt_templates import register_prompt
+from prompt_builder import PromptBuilder, compact_pddl, localize_pddl, lore_context, numbered_lines
+from tracing import traced
 import re
 
+_ERRORS_PROMPT = register_prompt("reflection.errors", [
+    ("system", "Aiuta a correggere errori nei file PDDL fornendo suggerimenti precisi."),
+    ("human", "ERRORI:\n{errors}\n\nSuggerisci come correggere.")
+])
+
+_IMPROVEMENTS_PROMPT = register_prompt("reflection.improvements", [
+    ("system", "Suggerisci solo miglioramenti sintattici e strutturali dei file PDDL."),
+    ("human", "Suggerisci solo modifiche sintattiche o errori di struttura. Non suggerire espansioni narrative.")
+])
+
+
 class ReflectionAgent:
-    def __init__(self, llm: LLMInterface):
+    def __init__(self, llm: LLMInterface, prompt_budget: Optional[int] = None):
         self.llm = llm
+        self.prompt_budget = prompt_budget
 
-    def analyze_pddl_errors(self, domain: str, problem: str, errors: List[str]) -> Dict[str, str]:
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", "Aiuta a correggere errori nei file PDDL fornendo suggerimenti precisi."),
-            ("human", "DOMINIO:\n{domain}\n\nPROBLEMA:\n{problem}\n\nERRORI:\n{errors}\n\nSuggerisci come correggere.")
-        ])
-        formatted = prompt.format_messages(domain=domain, problem=problem, errors="\n".join(errors))
-        prompt_text = "\n".join(m.content for m in formatted)
+    @traced("reflection.analyze_pddl_errors", "reflection")
+    def analyze_pddl_errors(self, domain: str, problem: str, errors: List[str],
+                            issues: Optional[Sequence[Issue]] = None) -> Dict[str, str]:
+        # Solo le parti del PDDL coinvolte negli errori, non i file interi
+        pddl = localize_pddl(domain, problem, issues) if issues else None
+        if pddl is None:
+            pddl = self._suspicious_slices(domain, problem)
+        system, human = _ERRORS_PROMPT.format_messages(errors="\n".join(errors))
+        prompt_text = (
+            PromptBuilder(max_tokens=self.prompt_budget)
+            .add(system.content, required=True)
+            .add(pddl)
+            .add(human.content, required=True)
+            .build()
+        )
         result = self.llm.run_prompt(prompt_text)
         return {"suggestions": result.strip()}
 
+    @traced("reflection.suggest_improvements", "reflection")
     def suggest_improvements(self, lore: LoreDocument, domain: str, problem: str) -> Dict[str, str]:
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", "Suggerisci solo miglioramenti sintattici e strutturali dei file PDDL."),
-            ("human", "Ecco i file PDDL: Lore: {lore}\n\nDomain:\n{domain}\n\nProblem:\n{problem}\n\nSuggerisci solo modifiche sintattiche o errori di struttura. Non suggerire espansioni narrative.")
-
-        ])
-        lore_text = f"Descrizione: {lore.quest_description}\nContesto: {lore.world_context}"
-        formatted = prompt.format_messages(lore=lore_text, domain=domain, problem=problem)
-        prompt_text = "\n".join(m.content for m in formatted)
+        system, human = _IMPROVEMENTS_PROMPT.format_messages()
+        # Il problema (init) cresce con il mondo: se serve spazio si taglia prima quello
+        prompt_text = (
+            PromptBuilder(lore_context(lore), self.prompt_budget)
+            .add(system.content, required=True)
+            .add(compact_pddl(domain), "Domain", priority=1)
+            .add(compact_pddl(problem), "Problem", priority=0)
+            .add(human.content, required=True)
+            .build()
+        )
         result = self.llm.run_prompt(prompt_text)
         return {"suggestions": result.strip()}
 
+    def _suspicious_slices(self, domain: str, problem: str) -> str:
+        """Per PDDL non analizzabile: righe sospette numerate, o il testo compattato se non se ne trovano."""
+        parts = []
+        for title, text in (("DOMINIO", domain), ("PROBLEMA", problem)):
+            slices = numbered_lines(text, [l for l in self.extract_error_lines(text) if l.strip()])
+            parts.append(f"{title} (righe sospette):\n{slices}" if slices else f"{title}:\n{compact_pddl(text)}")
+        return "\n\n".join(parts)
+
     def extract_error_lines(self, pddl_text: str) -> List[str]:
         # Analizza righe sospette (e.g., con variabili tipate male o predicati malformati)
         lines = pddl_text.splitlines()
@@ -0,0 +1,120 @@
+import difflib
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+from llm_interface import LLMInterface
+
+
+class ReplayMissError(KeyError):
+    """Il prompt non è presente nelle fixture e non c'è un client reale da cui registrarlo."""
+    pass
+
+
+def prompt_hash(prompt: str) -> str:
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+
+class ReplayLLMClient(LLMInterface):
+    """
+    Client LLM che registra le risposte su un file di fixture (chiave: hash del prompt)
+    e le riproduce in modo deterministico, senza rete.
+
+    mode="replay": risponde solo dalle fixture; se il prompt manca e nearest=True usa la
+                   risposta registrata per il prompt più simile, altrimenti ReplayMissError.
+    mode="record": inoltra al client reale, salva la risposta e la restituisce.
+    mode="auto":   replay se il prompt è noto, altrimenti registra.
+
+    latency e latency_per_token simulano i tempi del provider (in secondi).
+    """
+
+    def __init__(self, fixture_path: str, llm: Optional[LLMInterface] = None, mode: str = "replay",
+                 latency: float = 0.0, latency_per_token: float = 0.0, nearest: bool = True):
+        if mode not in ("replay", "record", "auto"):
+            raise ValueError(f"Modalità non valida: {mode}")
+        if mode != "replay" and llm is None:
+            raise ValueError("Per registrare serve un client LLM reale")
+        self.fixture_path = fixture_path
+        self.llm = llm
+        self.mode = mode
+        self.latency = latency
+        self.latency_per_token = latency_per_token
+        self.nearest = nearest
+        self.model = f"replay:{Path(fixture_path).stem}"
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self.entries: Dict[str, dict] = {}
+        if os.path.exists(fixture_path):
+            with open(fixture_path, encoding="utf-8") as f:
+                self.entries = json.load(f).get("responses", {})
+
+    def _lookup(self, prompt: str) -> Optional[str]:
+        if self.mode == "record":
+            return None
+        entry = self.entries.get(prompt_hash(prompt))
+        if entry is not None:
+            self.hits += 1
+            return entry["response"]
+        if self.mode != "replay":
+            return None
+        self.misses += 1
+        if not (self.nearest and self.entries):
+            raise ReplayMissError(f"Prompt non registrato in {self.fixture_path} ({prompt_hash(prompt)[:12]})")
+        # Prompt cambiato rispetto alla registrazione: si usa quello più simile
+        best = max(self.entries.values(),
+                   key=lambda e: difflib.SequenceMatcher(None, e["prompt"], prompt, autojunk=False).quick_ratio())
+        return best["response"]
+
+    def _record(self, prompt: str, response: str):
+        with self._lock:
+            self.entries[prompt_hash(prompt)] = {"prompt": prompt, "response": response}
+            self.save()
+
+    def save(self):
+        Path(self.fixture_path).parent.mkdir(parents=True, exist_ok=True)
+        tmp = f"{self.fixture_path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"responses": self.entries}, f, ensure_ascii=False, indent=2, sort_keys=True)
+        os.replace(tmp, self.fixture_path)
+
+    def _simulate_latency(self, response: str):
+        delay = self.latency + self.latency_per_token * len(re.findall(r"\S+", response))
+        if delay > 0:
+            time.sleep(delay)
+
+    def run_prompt(self, prompt: str) -> str:
+        response = self._lookup(prompt)
+        if response is None:
+            response = self.llm.run_prompt(prompt)
+            self._record(prompt, response)
+            return response
+        self._simulate_latency(response)
+        return response
+
+    def run_prompt_streaming(self, prompt: str, stop_when: Optional[Callable[[str], bool]] = None) -> str:
+        """Riproduce la risposta a pezzi, interrompendola come farebbe lo streaming reale."""
+        response = self._lookup(prompt)
+        if response is None:
+            if hasattr(self.llm, "run_prompt_streaming"):
+                response = self.llm.run_prompt_streaming(prompt, stop_when)
+            else:
+                response = self.llm.run_prompt(prompt)
+            self._record(prompt, response)
+            return response
+
+        text = ""
+        for chunk in re.findall(r"\s*\S+", response):
+            text += chunk
+            if stop_when is not None and stop_when(text):
+                break
+        self._simulate_latency(text)
+        return text.strip()
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self.entries)}
@@ -0,0 +1,358 @@
+# service.py
+"""
+Modalità servizio: un server HTTP locale (solo libreria standard) che accetta lore, le mette
+in coda e le elabora con un pool di worker "caldi". Ogni worker è un processo che resta vivo
+tra una richiesta e l'altra con import, client LLM, cache e archivio degli artefatti già
+pronti; un job che supera il suo timeout viene interrotto terminando il worker, che viene
+subito sostituito.
+
+    python service.py --port 8765 --workers 4 --max-queue 200 --timeout 600
+
+    POST /jobs                       lore in JSON (o {"lore": {...}, "timeout": s, "max_iter": n}) -> 202 {id}
+    GET  /jobs                       elenco dei job
+    GET  /jobs/<id>                  stato ed esito (record come in batch.py)
+    GET  /jobs/<id>/<artefatto>      domain.pddl, problem.pddl, plan.txt, trace.json, trace.chrome.json
+    GET  /health                     worker, coda e conteggi
+
+Con la coda piena le nuove richieste ricevono 503 con Retry-After (backpressure).
+"""
+from utils import load_env
+load_env()  # prima degli altri import: alcuni moduli leggono l'ambiente all'import
+
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional
+
+from llm_interface import LLMInterface
+from lore import LoreDocument
+
+ARTIFACTS = ("domain.pddl", "problem.pddl", "plan.txt", "trace.json", "trace.chrome.json")
+FINISHED = ("success", "failed", "error", "timeout")
+
+
+class ServiceBusy(Exception):
+    """Coda piena: la richiesta va ripetuta più tardi (retry_after secondi)."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Coda piena, riprovare tra {retry_after}s")
+        self.retry_after = retry_after
+
+
+@dataclass
+class Job:
+    id: str
+    lore: Dict[str, Any]
+    timeout: float
+    max_iter: int
+    status: str = "queued"          # queued, running, success, failed, error, timeout
+    submitted: float = field(default_factory=time.time)
+    started: Optional[float] = None
+    finished: Optional[float] = None
+    record: Optional[dict] = None
+
+    def summary(self) -> dict:
+        out = {"id": self.id, "status": self.status, "submitted": self.submitted,
+               "started": self.started, "finished": self.finished}
+        if self.record is not None:
+            out["result"] = {k: v for k, v in self.record.items() if k != "traceback"}
+        return out
+
+
+def _worker_main(inbox, outbox, output_root: str, candidates: Optional[int],
+                 llm_factory: Optional[Callable[[], LLMInterface]]):
+    """Ciclo di un worker: il client LLM (con cache e rate limiter) viene creato una volta sola."""
+    from batch import run_lore
+    from interactive_story_generator import InteractiveStoryGenerator
+    from tracing import get_tracer
+
+    llm = llm_factory() if llm_factory is not None else InteractiveStoryGenerator().llm
+    tracer = get_tracer()
+    outbox.put(("ready", os.getpid()))  # da qui in poi il worker è caldo: parte il timeout dei job
+    while True:
+        task = inbox.get()
+        if task is None:
+            return
+        job_id, lore, max_iter = task
+        tracer.reset()
+        record = run_lore(lambda: LoreDocument(**lore), {"lore": "service", "lore_id": job_id},
+                          output_root, max_iter, llm, candidates)
+        tracer.export(record["output_dir"])
+        outbox.put(("done", record))
+
+
+class _Worker:
+    """Processo worker con le sue code; riavviabile se un job va in timeout o il processo muore."""
+
+    def __init__(self, ctx, args: tuple, startup_timeout: float = 120.0):
+        self.ctx = ctx
+        self.args = args
+        self.startup_timeout = startup_timeout
+        self.process = None
+        self.ready = False
+        self.restarts = -1
+        self.start()
+
+    def start(self):
+        self.ready = False
+        self.inbox, self.outbox = self.ctx.Queue(), self.ctx.Queue()
+        self.process = self.ctx.Process(target=_worker_main, args=(self.inbox, self.outbox) + self.args, daemon=True)
+        self.process.start()
+        self.restarts += 1
+
+    def restart(self):
+        self.stop(force=True)
+        self.start()
+
+    def stop(self, force: bool = False):
+        if self.process is None or not self.process.is_alive():
+            return
+        if force:
+            self.process.kill()
+        else:
+            self.inbox.put(None)
+        self.process.join(timeout=5)
+
+    def _receive(self, deadline: float) -> Optional[tuple]:
+        """Prossimo messaggio del worker entro deadline; None se scade o il processo muore."""
+        while time.monotonic() < deadline:
+            try:
+                return self.outbox.get(timeout=min(0.5, max(deadline - time.monotonic(), 0.01)))
+            except queue.Empty:
+                if not self.process.is_alive():
+                    return None
+        return None
+
+    def wait_ready(self) -> bool:
+        """Attende la fine degli import e della creazione del client di un worker appena avviato."""
+        deadline = time.monotonic() + self.startup_timeout
+        while not self.ready:
+            message = self._receive(deadline)
+            if message is None:
+                return False
+            self.ready = message[0] == "ready"
+        return True
+
+    def run(self, job: Job) -> Optional[dict]:
+        """
+        Esegue il job; None se scade il timeout o il processo muore (il worker viene sostituito).
+        Il timeout parte solo quando il worker è pronto: l'avvio a freddo non è a carico del job.
+        """
+        if self.wait_ready():
+            self.inbox.put((job.id, job.lore, job.max_iter))
+            message = self._receive(time.monotonic() + job.timeout)
+            if message is not None:
+                return message[1]
+        self.restart()
+        return None
+
+
+class JobService:
+    """
+    Coda dei job con capacità limitata e pool di worker caldi. Ogni worker ha un thread di
+    dispatch nel processo del server che gli passa un job alla volta e ne controlla il timeout.
+    """
+
+    def __init__(self, workers: int = 2, max_queue: int = 100, job_timeout: float = 600,
+                 output_root: str = "output/service", max_iter: int = 3, candidates: Optional[int] = None,
+                 llm_factory: Optional[Callable[[], LLMInterface]] = None, max_jobs: int = 10000):
+        self.output_root = output_root
+        self.job_timeout = job_timeout
+        self.max_iter = max_iter
+        self.max_jobs = max_jobs
+        self.queue: "queue.Queue[Optional[Job]]" = queue.Queue(maxsize=max_queue)
+        self.jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._durations: List[float] = []
+        # spawn: i worker non ereditano i thread del server HTTP
+        ctx = multiprocessing.get_context("spawn")
+        self.workers = [_Worker(ctx, (output_root, candidates, llm_factory)) for _ in range(workers)]
+        self._threads = [threading.Thread(target=self._dispatch, args=(w,), name=f"dispatch-{i}", daemon=True)
+                         for i, w in enumerate(self.workers)]
+        for t in self._threads:
+            t.start()
+
+    def submit(self, lore: Dict[str, Any], timeout: Optional[float] = None, max_iter: Optional[int] = None) -> Job:
+        """
+        Accoda una lore (validata subito, come timeout e max_iter: ValueError se non validi);
+        ServiceBusy con la coda piena.
+        """
+        check_job_options(timeout, max_iter)
+        LoreDocument(**lore)
+        job = Job(uuid.uuid4().hex[:12], lore, min(timeout or self.job_timeout, self.job_timeout),
+                  max_iter or self.max_iter)
+        with self._lock:
+            try:
+                self.queue.put_nowait(job)
+            except queue.Full:
+                raise ServiceBusy(self.retry_after())
+            self.jobs[job.id] = job
+            self._forget_old_jobs()
+        return job
+
+    def _forget_old_jobs(self):
+        excess = len(self.jobs) - self.max_jobs
+        for job_id in [j.id for j in self.jobs.values() if j.status in FINISHED][:max(excess, 0)]:
+            del self.jobs[job_id]
+
+    def retry_after(self) -> int:
+        """Stima dell'attesa per liberare un posto in coda, dalla durata media dei job recenti."""
+        recent = self._durations[-50:]
+        mean = sum(recent) / len(recent) if recent else 10.0
+        return max(1, math.ceil(mean * self.queue.qsize() / max(len(self.workers), 1)))
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self.jobs.get(job_id)
+
+    def _dispatch(self, worker: _Worker):
+        while True:
+            job = self.queue.get()
+            if job is None:
+                return
+            job.status, job.started = "running", time.time()
+            record = worker.run(job)
+            job.finished = time.time()
+            if record is None:
+                job.status = "timeout"
+                job.record = {"lore_id": job.id, "status": "timeout",
+                              "error": f"Job interrotto dopo {job.timeout:.0f}s (worker riavviato)"}
+            else:
+                job.status, job.record = record["status"], record
+            with self._lock:
+                self._durations.append(job.finished - job.started)
+                del self._durations[:-200]
+
+    def stats(self) -> dict:
+        counts: Dict[str, int] = {}
+        for job in list(self.jobs.values()):
+            counts[job.status] = counts.get(job.status, 0) + 1
+        return {
+            "workers": len(self.workers),
+            "workers_alive": sum(w.process.is_alive() for w in self.workers),
+            "worker_restarts": sum(w.restarts for w in self.workers),
+            "queued": self.queue.qsize(),
+            "queue_capacity": self.queue.maxsize,
+            "jobs": counts,
+        }
+
+    def shutdown(self):
+        for _ in self._threads:
+            self.queue.put(None)
+        for w in self.workers:
+            w.stop()
+
+
+def check_job_options(timeout: Any, max_iter: Any):
+    """timeout (secondi) e max_iter, se indicati, devono essere numeri positivi (max_iter intero)."""
+    if timeout is not None and (isinstance(timeout, bool) or not isinstance(timeout, (int, float))
+                                or not math.isfinite(timeout) or timeout <= 0):
+        raise ValueError(f"timeout deve essere un numero di secondi positivo, non {timeout!r}")
+    if max_iter is not None and (isinstance(max_iter, bool) or not isinstance(max_iter, int) or max_iter <= 0):
+        raise ValueError(f"max_iter deve essere un intero positivo, non {max_iter!r}")
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    server: "ServiceHTTPServer"
+
+    def _send(self, status: int, payload: Any, headers: Optional[Dict[str, str]] = None,
+              content_type: str = "application/json"):
+        body = payload.encode("utf-8") if isinstance(payload, str) else \
+            json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", f"{content_type}; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        if self.path.rstrip("/") != "/jobs":
+            return self._send(HTTPStatus.NOT_FOUND, {"error": "Percorso sconosciuto"})
+        try:
+            data = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            lore = data.get("lore", data)
+            check_job_options(data.get("timeout"), data.get("max_iter"))
+        except (ValueError, TypeError, AttributeError) as e:
+            return self._send(HTTPStatus.BAD_REQUEST, {"error": f"Richiesta non valida: {e}"})
+        try:
+            job = self.server.service.submit(lore, data.get("timeout"), data.get("max_iter"))
+        except ServiceBusy as e:
+            return self._send(HTTPStatus.SERVICE_UNAVAILABLE, {"error": str(e)},
+                              {"Retry-After": str(e.retry_after)})
+        except (ValueError, TypeError, AttributeError) as e:
+            return self._send(HTTPStatus.BAD_REQUEST, {"error": f"Lore non valida: {e}"})
+        self._send(HTTPStatus.ACCEPTED, job.summary(), {"Location": f"/jobs/{job.id}"})
+
+    def do_GET(self):
+        service = self.server.service
+        parts = [p for p in self.path.split("?")[0].split("/") if p]
+        if parts == ["health"]:
+            return self._send(HTTPStatus.OK, service.stats())
+        if parts == ["jobs"]:
+            return self._send(HTTPStatus.OK, [j.summary() for j in list(service.jobs.values())])
+        job = service.get(parts[1]) if len(parts) in (2, 3) and parts[0] == "jobs" else None
+        if job is None:
+            return self._send(HTTPStatus.NOT_FOUND, {"error": "Job sconosciuto"})
+        if len(parts) == 2:
+            return self._send(HTTPStatus.OK, job.summary())
+        # Solo gli artefatti noti: nessun accesso ad altri file della cartella di output
+        path = os.path.join(service.output_root, job.id, parts[2])
+        if parts[2] not in ARTIFACTS or not os.path.exists(path):
+            return self._send(HTTPStatus.NOT_FOUND, {"error": f"Artefatto non disponibile: {parts[2]}"})
+        with open(path, encoding="utf-8") as f:
+            content = f.read()
+        self._send(HTTPStatus.OK, content, content_type="application/json" if path.endswith(".json") else "text/plain")
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class ServiceHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, service: JobService, verbose: bool = False):
+        super().__init__(address, ServiceHandler)
+        self.service = service
+        self.verbose = verbose
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servizio HTTP locale per la generazione di storie PDDL")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("-j", "--workers", type=int, default=2, help="Worker caldi (processi)")
+    parser.add_argument("--max-queue", type=int, default=100, help="Job in attesa oltre i quali si risponde 503")
+    parser.add_argument("--timeout", type=float, default=600, help="Timeout massimo per job, in secondi")
+    parser.add_argument("--output-root", default="output/service", help="Cartella degli artefatti per job")
+    parser.add_argument("--max-iter", type=int, default=3)
+    parser.add_argument("--candidates", type=int, help="Varianti di azioni e goal (default PDDL_CANDIDATES)")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Registra ogni richiesta HTTP")
+    args = parser.parse_args()
+
+    service = JobService(args.workers, args.max_queue, args.timeout, args.output_root, args.max_iter, args.candidates)
+    server = ServiceHTTPServer((args.host, args.port), service, args.verbose)
+    print(f"🛰️ Servizio in ascolto su http://{args.host}:{args.port} "
+          f"({args.workers} worker, coda max {args.max_queue}, timeout {args.timeout:.0f}s)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n🛑 Arresto del servizio...")
+    finally:
+        server.server_close()
+        service.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,288 @@
+import argparse
+import json
+import random
+from array import array
+from dataclasses import dataclass
+from typing import IO, Dict, List, Optional, Tuple
+
+from grounding import GroundTask, ground, iter_bits
+from lore import LoreDocument
+from pddl_parser import parse_domain, parse_problem
+from strips_planner import INF, RelaxedHeuristic
+from tracing import annotate, span
+
+
+@dataclass
+class StoryGraphStats:
+    nodes: int = 0
+    edges: int = 0
+    goal_nodes: int = 0
+    max_depth: int = 0
+    pruned_dead_end: int = 0     # successori da cui il goal è irraggiungibile anche nel rilassato
+    pruned_too_deep: int = 0     # successori che non possono arrivare al goal entro la profondità massima
+    sampled_out: int = 0         # rami scartati per restare entro il branching massimo
+    under_branching: int = 0     # stati con meno rami del branching minimo
+    truncated: int = 0           # stati nuovi scartati perché il grafo aveva già max_nodes nodi
+
+    def to_dict(self) -> Dict[str, int]:
+        return dict(self.__dict__)
+
+
+class StoryGraph:
+    """
+    Grafo degli stati della storia in forma compatta: gli stati sono bitset a larghezza fissa
+    (width byte, little-endian) impacchettati in un unico bytearray; profondità, genitori, h_max
+    ed archi stanno in array numerici. La deduplicazione usa una tabella hash a indirizzamento aperto
+    (array "q" di indici di nodo, -1 se vuota) che confronta direttamente i byte impacchettati.
+    """
+
+    def __init__(self, n_facts: int):
+        self.width = max(1, (n_facts + 7) // 8)
+        self.states = bytearray()
+        self.depth = array("i")
+        self.parent = array("i")
+        self.goal = array("b")
+        self.h = array("f")
+        self.edge_src = array("i")
+        self.edge_dst = array("i")
+        self.edge_action = array("i")
+        self.stats = StoryGraphStats()
+        self._slots = array("q", [-1]) * 1024
+
+    def __len__(self) -> int:
+        return len(self.depth)
+
+    def state(self, node: int) -> int:
+        start = node * self.width
+        return int.from_bytes(self.states[start:start + self.width], "little")
+
+    def _probe(self, packed: bytes) -> int:
+        """Posizione del nodo con quei byte nella tabella, o della prima casella vuota."""
+        mask = len(self._slots) - 1
+        slot = hash(packed) & mask
+        width, states = self.width, self.states
+        while True:
+            node = self._slots[slot]
+            if node < 0 or states[node * width:(node + 1) * width] == packed:
+                return slot
+            slot = (slot + 1) & mask
+
+    def find(self, state: int) -> Optional[int]:
+        """Indice del nodo con quello stato, None se non è ancora nel grafo."""
+        node = self._slots[self._probe(state.to_bytes(self.width, "little"))]
+        return node if node >= 0 else None
+
+    def add_node(self, state: int, depth: int, parent: int, is_goal: bool, h: float = 0.0) -> int:
+        node = len(self)
+        packed = state.to_bytes(self.width, "little")
+        if 2 * (node + 1) > len(self._slots):
+            self._grow()
+        self._slots[self._probe(packed)] = node
+        self.states += packed
+        self.depth.append(depth)
+        self.parent.append(parent)
+        self.goal.append(1 if is_goal else 0)
+        self.h.append(h)
+        return node
+
+    def _grow(self):
+        """Raddoppia la tabella (carico massimo 1/2) e reinserisce tutti i nodi."""
+        width, states = self.width, self.states
+        self._slots = array("q", [-1]) * (2 * len(self._slots))
+        mask = len(self._slots) - 1
+        for node in range(len(self)):
+            slot = hash(bytes(states[node * width:(node + 1) * width])) & mask
+            while self._slots[slot] >= 0:
+                slot = (slot + 1) & mask
+            self._slots[slot] = node
+
+    def add_edge(self, src: int, dst: int, action: int):
+        self.edge_src.append(src)
+        self.edge_dst.append(dst)
+        self.edge_action.append(action)
+
+
+# Successore in espansione: (stato, indice azione, nodo esistente o None, h_max)
+Child = Tuple[int, int, Optional[int], float]
+
+
+class StoryGraphExplorer:
+    """
+    Espande in ampiezza lo spazio degli stati grounded a partire da :init, fino alla profondità
+    massima della lore. Gli stati uguali vengono fusi, i rami che non possono più raggiungere
+    il goal (h_max rilassata infinita o oltre la profondità residua) vengono potati e, se uno
+    stato ha più successori del branching massimo, se ne campiona un sottoinsieme
+    (tenendo sempre quello più vicino al goal).
+    """
+
+    def __init__(self, task: GroundTask, lore: LoreDocument, max_nodes: int = 1_000_000,
+                 seed: int = 0, prune: bool = True):
+        self.task = task
+        self.lore = lore
+        self.max_nodes = max_nodes
+        self.prune = prune
+        self.random = random.Random(seed)
+        self.relaxed = RelaxedHeuristic(task)
+        if lore.branching_factor[1] < 1:
+            raise ValueError(f"Il branching massimo deve essere almeno 1 (trovato {lore.branching_factor[1]})")
+
+    def _h(self, state: int) -> float:
+        return 0 if self.task.is_goal(state) else self.relaxed.h_max(state)
+
+    def explore(self, out: Optional[IO[str]] = None, include_facts: bool = False) -> StoryGraph:
+        """
+        Costruisce il grafo; se out è indicato scrive in streaming un record JSON per riga
+        (nodi ed archi) man mano che vengono creati.
+        """
+        task, graph = self.task, StoryGraph(len(self.task.facts))
+        stats = graph.stats
+        b_min, b_max = self.lore.branching_factor
+        _, d_max = self.lore.depth_constraints
+        writer = _JsonlWriter(out, task, include_facts) if out is not None else None
+
+        root = graph.add_node(task.init, 0, -1, task.is_goal(task.init), self._h(task.init))
+        if writer:
+            writer.node(root, task.init, 0, -1, -1, 0, bool(graph.goal[root]))
+        frontier = [root]
+        with span("story_graph.explore", "story_graph", d_max=d_max, b_max=b_max):
+            for depth in range(d_max):
+                next_frontier = []
+                for node in frontier:
+                    if graph.goal[node]:
+                        continue  # la storia termina nello stato goal
+                    children = self._expand(graph, graph.state(node), depth + 1, d_max, stats)
+                    if len(children) < b_min:
+                        stats.under_branching += 1
+                    if len(children) > b_max:
+                        stats.sampled_out += len(children) - b_max
+                        children = self._sample(children, b_max)
+                    for succ, action, child, h in children:
+                        if child is None:
+                            if len(graph) >= self.max_nodes:
+                                stats.truncated += 1
+                                continue
+                            child = graph.add_node(succ, depth + 1, node, task.is_goal(succ), h)
+                            next_frontier.append(child)
+                            if writer:
+                                writer.node(child, succ, depth + 1, node, action, graph.state(node),
+                                            bool(graph.goal[child]))
+                        graph.add_edge(node, child, action)
+                        if writer:
+                            writer.edge(node, child, action)
+                frontier = next_frontier
+                if not frontier:
+                    break
+
+            stats.nodes = len(graph)
+            stats.edges = len(graph.edge_src)
+            stats.goal_nodes = sum(graph.goal)
+            stats.max_depth = max(graph.depth) if graph.depth else 0
+            annotate(**stats.to_dict())
+        if writer:
+            writer.summary(stats)
+        return graph
+
+    def _expand(self, graph: StoryGraph, state: int, depth: int, d_max: int,
+                stats: StoryGraphStats) -> List[Child]:
+        """
+        Successori distinti dello stato, già potati; ogni elemento è (stato, indice azione,
+        nodo se lo stato è già nel grafo, h_max). h_max si legge dal grafo per gli stati già
+        inseriti e si ricalcola per gli altri: gli stati potati o scartati non vengono memorizzati.
+        """
+        seen = set()
+        children = []
+        for i in self.task.applicable_actions(state):
+            succ = self.task.apply(state, self.task.actions[i])
+            if succ == state or succ in seen:
+                continue
+            seen.add(succ)
+            node = graph.find(succ)
+            h = graph.h[node] if node is not None else self._h(succ)
+            if self.prune:
+                if h == INF:
+                    stats.pruned_dead_end += 1
+                    continue
+                if depth + h > d_max:
+                    stats.pruned_too_deep += 1
+                    continue
+            children.append((succ, i, node, h))
+        return children
+
+    def _sample(self, children: List[Child], k: int) -> List[Child]:
+        best = min(children, key=lambda c: c[3])
+        others = [c for c in children if c is not best]
+        return [best] + self.random.sample(others, k - 1)
+
+
+class _JsonlWriter:
+    """
+    Record JSONL: {"type": "node", ...} con i fatti aggiunti/rimossi rispetto al genitore
+    (la radice riporta tutti i fatti veri), {"type": "edge", ...} e un "summary" finale.
+    """
+
+    def __init__(self, out: IO[str], task: GroundTask, include_facts: bool):
+        self.out = out
+        self.task = task
+        self.include_facts = include_facts
+
+    def _facts(self, mask: int) -> List[str]:
+        return [self.task.fact_name(f) for f in iter_bits(mask)]
+
+    def node(self, node: int, state: int, depth: int, parent: int, action: int, parent_state: int, is_goal: bool):
+        record = {"type": "node", "id": node, "depth": depth, "goal": is_goal}
+        if parent < 0 or self.include_facts:
+            record["facts"] = self._facts(state)
+        if parent >= 0:
+            record["parent"] = parent
+            record["via"] = self.task.actions[action].label()
+            record["add"] = self._facts(state & ~parent_state)
+            record["del"] = self._facts(parent_state & ~state)
+        self.out.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def edge(self, src: int, dst: int, action: int):
+        self.out.write(json.dumps({"type": "edge", "src": src, "dst": dst,
+                                   "action": self.task.actions[action].label()}) + "\n")
+
+    def summary(self, stats: StoryGraphStats):
+        self.out.write(json.dumps({"type": "summary", **stats.to_dict()}) + "\n")
+
+
+def explore_story_graph(domain_text: str, problem_text: str, lore: LoreDocument,
+                        output_path: Optional[str] = None, max_nodes: int = 1_000_000,
+                        seed: int = 0, max_ground_actions: Optional[int] = 50000) -> StoryGraph:
+    """Grounding del problema generato ed esplorazione del grafo, con scrittura JSONL opzionale."""
+    task = ground(parse_domain(domain_text), parse_problem(problem_text), max_actions=max_ground_actions)
+    explorer = StoryGraphExplorer(task, lore, max_nodes=max_nodes, seed=seed)
+    if output_path is None:
+        return explorer.explore()
+    with open(output_path, "w", encoding="utf-8") as out:
+        return explorer.explore(out)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Esplora il grafo ramificato della storia")
+    parser.add_argument("domain")
+    parser.add_argument("problem")
+    parser.add_argument("lore", help="File YAML della lore (branching_factor e depth_constraints)")
+    parser.add_argument("-o", "--output", default="output/story_graph.jsonl")
+    parser.add_argument("--max-nodes", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with open(args.domain, encoding="utf-8") as f:
+        domain_text = f.read()
+    with open(args.problem, encoding="utf-8") as f:
+        problem_text = f.read()
+    graph = explore_story_graph(domain_text, problem_text, LoreDocument.from_yaml(args.lore),
+                                args.output, args.max_nodes, args.seed)
+    s = graph.stats
+    print(f"🌳 {s.nodes} stati, {s.edges} archi, {s.goal_nodes} finali, profondità {s.max_depth}")
+    print(f"✂️ Potati: {s.pruned_dead_end} senza uscita, {s.pruned_too_deep} troppo profondi, "
+          f"{s.sampled_out} scartati dal campionamento")
+    if s.truncated:
+        print(f"⚠️ Esplorazione troncata: {s.truncated} stati oltre il limite di {args.max_nodes} nodi")
+    print(f"📂 Grafo salvato in {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,258 @@
+import asyncio
+import dataclasses
+import os
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Callable, Dict, Iterator, List, Optional
+
+from artifact_store import ArtifactStore
+from llm_interface import LLMInterface
+from llm_pddl_refiner import LLM_PDDLRefiner
+from lore import LoreDocument
+from pddl_inferencer import PDDLInferencer
+from pddl_parser import (
+    Action, Domain, Issue, PDDLParseError, check_domain, check_problem, parse_action, parse_domain, parse_problem,
+)
+from pddl_template_manager import PDDLTemplateManager
+from tracing import annotate, span
+from utils import read_file, write_to_file
+from validation import find_plan
+
+
+@dataclass
+class PipelineEvent:
+    """Evento della pipeline; elapsed è il tempo trascorso dall'avvio, in secondi."""
+    elapsed: float = field(default=0.0, init=False)
+
+
+@dataclass
+class PredicatesReady(PipelineEvent):
+    predicates: List[str]
+
+
+@dataclass
+class ActionReady(PipelineEvent):
+    """Azione riparata appena chiusa nello stream; issues è None se i predicati non sono ancora pronti."""
+    index: int
+    name: str
+    text: str
+    issues: Optional[List[Issue]] = None
+
+
+@dataclass
+class ActionChecked(PipelineEvent):
+    """Controlli di un'azione arrivata prima dei predicati, eseguiti appena questi sono pronti."""
+    index: int
+    name: str
+    issues: List[Issue]
+
+
+@dataclass
+class ActionDiscarded(PipelineEvent):
+    """Blocco (:action ...) scartato dalla riparazione (incompleto o non analizzabile)."""
+    text: str
+
+
+@dataclass
+class GoalReady(PipelineEvent):
+    goal: str
+
+
+@dataclass
+class DomainReady(PipelineEvent):
+    domain: str
+    issues: List[Issue]
+
+
+@dataclass
+class ProblemReady(PipelineEvent):
+    """Problema scritto a blocchi in path; il testo (problem) c'è solo senza cartella di output."""
+    path: Optional[str]
+    issues: List[Issue]
+    problem: Optional[str] = None
+
+
+@dataclass
+class PlanFound(PipelineEvent):
+    plan: List[str]
+
+
+@dataclass
+class PlanNotFound(PipelineEvent):
+    reason: str
+
+
+class StreamingPDDLPipeline:
+    """
+    Generazione a stadi che restituisce eventi man mano che i risultati sono disponibili:
+    predicati, azioni e goal partono in parallelo; ogni azione viene riparata e controllata
+    appena il suo blocco si chiude nello stream, mentre le successive sono ancora in arrivo.
+    Alla fine si assemblano dominio e problema e, se richiesto, si cerca un piano.
+    I risultati restano negli attributi (predicates, actions, goal, domain, problem_path, plan);
+    il problema è scritto a blocchi su file (problem_digest è il suo SHA-256) e resta in
+    memoria (problem) solo senza output_dir.
+    """
+
+    def __init__(self, lore: LoreDocument, llm: LLMInterface, template_manager: Optional[PDDLTemplateManager] = None,
+                 output_dir: Optional[str] = "output", plan: bool = True, store: Optional[ArtifactStore] = None,
+                 inferencer: Optional[PDDLInferencer] = None):
+        self.lore = lore
+        self.manager = template_manager or PDDLTemplateManager()
+        self.inferencer = inferencer or PDDLInferencer(lore, llm)
+        self.refiner = LLM_PDDLRefiner(llm)
+        self.output_dir = output_dir
+        self.plan_enabled = plan and output_dir is not None
+        self.store = store
+        self.predicates: Optional[List[str]] = None
+        self.actions: List[str] = []
+        self.goal: Optional[str] = None
+        self.domain: Optional[str] = None
+        self.problem: Optional[str] = None
+        self.problem_path: Optional[str] = None
+        self.problem_digest: Optional[str] = None
+        self.plan: Optional[List[str]] = None
+        self._base_domain: Optional[Domain] = None
+
+    def _start(self, stage: str, work: Callable[[], object], events: "queue.Queue"):
+        def target():
+            try:
+                events.put((stage, work()))
+            except BaseException as e:  # riportata e rilanciata nel thread che consuma gli eventi
+                events.put(("error", e))
+        threading.Thread(target=target, name=f"pipeline-{stage}", daemon=True).start()
+
+    def _check_action(self, action: Action) -> List[Issue]:
+        """Controlli semantici di una sola azione rispetto ai predicati (e ai tipi) del dominio."""
+        if self._base_domain is None:
+            self._base_domain = parse_domain(self.manager._build_domain(self.predicates, []))
+        domain = dataclasses.replace(self._base_domain, actions=[action])
+        return [i for i in check_domain(domain) if i.component == "action"]
+
+    def events(self) -> Iterator[PipelineEvent]:
+        start = time.perf_counter()
+
+        def stamp(event: PipelineEvent) -> PipelineEvent:
+            event.elapsed = time.perf_counter() - start
+            return event
+
+        with span("pipeline.stream", "pipeline"):
+            incoming: "queue.Queue" = queue.Queue()
+            self._start("predicates", lambda: self.manager._infer_predicates(self.inferencer, self.refiner), incoming)
+            self._start("goal", lambda: self.manager._infer_goal(self.inferencer, self.refiner), incoming)
+            self._start("actions", lambda: self.inferencer.infer_actions_streaming(
+                lambda text: incoming.put(("action", text))), incoming)
+
+            unchecked: Dict[int, Action] = {}
+            remaining = {"predicates", "goal", "actions"}
+            while remaining:
+                stage, value = incoming.get()
+                if stage == "error":
+                    raise value
+                if stage == "action":
+                    yield from (stamp(e) for e in self._accept_action(value, unchecked))
+                elif stage == "predicates":
+                    self.predicates = value
+                    yield stamp(PredicatesReady(value))
+                    for index, action in unchecked.items():
+                        yield stamp(ActionChecked(index, action.name, self._check_action(action)))
+                    unchecked.clear()
+                    remaining.discard(stage)
+                elif stage == "goal":
+                    self.goal = value
+                    yield stamp(GoalReady(value))
+                    remaining.discard(stage)
+                else:
+                    remaining.discard(stage)
+            annotate(actions=len(self.actions))
+
+            self.domain = self.manager._build_domain(self.predicates, self.actions)
+            if self.output_dir is not None:
+                write_to_file(self.domain, "domain.pddl", self.output_dir)
+                self.problem_path = os.path.join(self.output_dir, "problem.pddl")
+                self.problem_digest = self.manager.write_problem(self.lore, self.goal, self.problem_path)
+                problem_text = read_file(self.problem_path)
+            else:
+                self.problem = problem_text = self.manager._build_problem(self.lore, self.goal)
+            domain_issues, problem_issues = self._final_checks(problem_text)
+            yield stamp(DomainReady(self.domain, domain_issues))
+            yield stamp(ProblemReady(self.problem_path, problem_issues, self.problem))
+
+            if not self.plan_enabled:
+                return
+            if domain_issues or problem_issues:
+                yield stamp(PlanNotFound("errori semantici nel PDDL, planner non eseguito"))
+                return
+            self.plan = find_plan(os.path.join(self.output_dir, "domain.pddl"), self.problem_path,
+                                  lore=self.lore, store=self.store)
+            yield stamp(PlanFound(self.plan) if self.plan else PlanNotFound("nessun piano trovato"))
+
+    def _accept_action(self, text: str, unchecked: Dict[int, Action]) -> Iterator[PipelineEvent]:
+        repaired = self.manager.repairer.repair_actions([text])
+        if not repaired or repaired[0] in self.actions:
+            if not repaired:
+                yield ActionDiscarded(text)
+            return
+        self.actions.append(repaired[0])
+        index = len(self.actions) - 1
+        action = parse_action(repaired[0])  # già analizzata con successo dalla riparazione
+        if self.predicates is None:
+            unchecked[index] = action
+            yield ActionReady(index, action.name, repaired[0])
+        else:
+            yield ActionReady(index, action.name, repaired[0], self._check_action(action))
+
+    def _final_checks(self, problem_text: str):
+        try:
+            domain = parse_domain(self.domain)
+        except PDDLParseError as e:
+            return [Issue("domain", "", f"Dominio non analizzabile: {e}")], []
+        try:
+            problem = parse_problem(problem_text)
+        except PDDLParseError as e:
+            return check_domain(domain), [Issue("problem", "", f"Problema non analizzabile: {e}")]
+        return check_domain(domain), check_problem(problem, domain)
+
+
+def describe_event(event: PipelineEvent) -> str:
+    """Riga leggibile per un evento, per chi segue la pipeline da terminale."""
+    def problems(issues: Optional[List[Issue]]) -> str:
+        return f" ({len(issues)} problemi)" if issues else ""
+
+    if isinstance(event, PredicatesReady):
+        return f"Predicati pronti: {len(event.predicates)}"
+    if isinstance(event, ActionReady):
+        return f"Azione {event.index + 1}: {event.name}{problems(event.issues)}"
+    if isinstance(event, ActionChecked):
+        return f"Azione {event.index + 1} controllata: {event.name}{problems(event.issues)}"
+    if isinstance(event, ActionDiscarded):
+        return "Azione scartata (incompleta o non analizzabile)"
+    if isinstance(event, GoalReady):
+        return f"Goal pronto: {event.goal}"
+    if isinstance(event, DomainReady):
+        return f"Dominio assemblato{problems(event.issues)}"
+    if isinstance(event, ProblemReady):
+        return f"Problema pronto{problems(event.issues)}"
+    if isinstance(event, PlanFound):
+        return f"Piano trovato: {len(event.plan)} passi"
+    if isinstance(event, PlanNotFound):
+        return f"Nessun piano: {event.reason}"
+    return type(event).__name__
+
+
+def stream_pipeline(lore: LoreDocument, llm: LLMInterface, **options) -> Iterator[PipelineEvent]:
+    """Scorciatoia per StreamingPDDLPipeline(lore, llm, **options).events()."""
+    return StreamingPDDLPipeline(lore, llm, **options).events()
+
+
+async def astream_pipeline(lore: LoreDocument, llm: LLMInterface, **options) -> AsyncIterator[PipelineEvent]:
+    """Versione asincrona: ogni passo della pipeline gira in un thread dell'executor di default."""
+    loop = asyncio.get_running_loop()
+    events = stream_pipeline(lore, llm, **options)
+    done = object()
+    while True:
+        event = await loop.run_in_executor(None, next, events, done)
+        if event is done:
+            return
+        yield event
@@ -0,0 +1,168 @@
+import heapq
+import time
+from itertools import count
+from typing import Dict, List, Optional, Tuple
+
+from grounding import GroundTask, ground, iter_bits
+from pddl_parser import parse_domain, parse_problem
+from tracing import annotate, span
+
+INF = float("inf")
+
+
+class PlannerBudgetExceeded(Exception):
+    """La ricerca ha superato il limite di tempo o di espansioni."""
+    pass
+
+
+class RelaxedHeuristic:
+    """
+    Euristiche h_add e h_FF sul problema rilassato (cancellazioni ignorate).
+    Le strutture per fatto/azione sono precalcolate una sola volta per task.
+    """
+
+    def __init__(self, task: GroundTask):
+        self.task = task
+        n_facts = len(task.facts)
+        self.pre = [list(iter_bits(a.pre_pos)) for a in task.actions]
+        self.add = [list(iter_bits(a.add)) for a in task.actions]
+        self.goal = list(iter_bits(task.goal_pos))
+        self.pre_of: List[List[int]] = [[] for _ in range(n_facts)]
+        for i, facts in enumerate(self.pre):
+            for f in facts:
+                self.pre_of[f].append(i)
+        self.no_pre = [i for i, facts in enumerate(self.pre) if not facts]
+
+    def explore(self, state: int, use_max: bool = False) -> Tuple[List[float], List[int]]:
+        """Costi rilassati dei fatti (h_add, o h_max con use_max=True) e azione di supporto."""
+        cost = [INF] * len(self.task.facts)
+        supporter = [-1] * len(self.task.facts)
+        heap = []
+        for f in iter_bits(state):
+            cost[f] = 0
+            heap.append((0, f))
+        heapq.heapify(heap)
+
+        unsat = [len(p) for p in self.pre]
+        action_cost = [0.0] * len(self.pre)
+
+        def fire(a: int):
+            c = action_cost[a] + 1
+            for g in self.add[a]:
+                if c < cost[g]:
+                    cost[g] = c
+                    supporter[g] = a
+                    heapq.heappush(heap, (c, g))
+
+        for a in self.no_pre:
+            fire(a)
+        while heap:
+            c, f = heapq.heappop(heap)
+            if c > cost[f]:
+                continue
+            for a in self.pre_of[f]:
+                action_cost[a] = max(action_cost[a], c) if use_max else action_cost[a] + c
+                unsat[a] -= 1
+                if unsat[a] == 0:
+                    fire(a)
+        return cost, supporter
+
+    def h_add(self, state: int) -> float:
+        cost, _ = self.explore(state)
+        return sum(cost[g] for g in self.goal)
+
+    def h_max(self, state: int) -> float:
+        """Stima ammissibile: nessun piano dallo stato è più corto di h_max."""
+        cost, _ = self.explore(state, use_max=True)
+        return max((cost[g] for g in self.goal), default=0)
+
+    def h_ff(self, state: int) -> float:
+        cost, supporter = self.explore(state)
+        if any(cost[g] == INF for g in self.goal):
+            return INF
+        relaxed_plan = set()
+        stack = [g for g in self.goal if cost[g] > 0]
+        seen = set(stack)
+        while stack:
+            a = supporter[stack.pop()]
+            if a in relaxed_plan:
+                continue
+            relaxed_plan.add(a)
+            for f in self.pre[a]:
+                if cost[f] > 0 and f not in seen:
+                    seen.add(f)
+                    stack.append(f)
+        return len(relaxed_plan)
+
+
+def search(task: GroundTask, algorithm: str = "gbfs", heuristic: str = "hff",
+           max_expansions: int = 200000, time_limit: float = 10.0) -> Optional[List[str]]:
+    """
+    Ricerca nello spazio degli stati (GBFS o A*) guidata da h_add/h_FF.
+    Ritorna il piano come lista di azioni "(nome arg...)", None se il problema è irrisolvibile.
+    """
+    relaxed = RelaxedHeuristic(task)
+    h = relaxed.h_ff if heuristic == "hff" else relaxed.h_add
+    deadline = time.monotonic() + time_limit
+
+    h0 = h(task.init)
+    if h0 == INF:
+        return None
+    parents: Dict[int, Tuple[Optional[int], int]] = {task.init: (None, -1)}
+    g_values = {task.init: 0}
+    tie = count()
+    open_list = [(h0, next(tie), task.init)]
+    expansions = 0
+
+    while open_list:
+        _, _, state = heapq.heappop(open_list)
+        if task.is_goal(state):
+            return _extract_plan(task, parents, state)
+
+        expansions += 1
+        if expansions > max_expansions or (expansions % 256 == 0 and time.monotonic() > deadline):
+            raise PlannerBudgetExceeded(f"Budget superato dopo {expansions} espansioni")
+
+        g = g_values[state] + 1
+        for i in task.applicable_actions(state):
+            succ = task.apply(state, task.actions[i])
+            if succ in g_values and g_values[succ] <= g:
+                continue
+            hs = h(succ)
+            if hs == INF:
+                continue
+            g_values[succ] = g
+            parents[succ] = (state, i)
+            priority = hs if algorithm == "gbfs" else g + hs
+            heapq.heappush(open_list, (priority, next(tie), succ))
+    return None
+
+
+def _extract_plan(task: GroundTask, parents: Dict[int, Tuple[Optional[int], int]], state: int) -> List[str]:
+    plan = []
+    while True:
+        parent, action = parents[state]
+        if parent is None:
+            break
+        plan.append(task.actions[action].label())
+        state = parent
+    return list(reversed(plan))
+
+
+def plan_from_text(domain_text: str, problem_text: str, algorithm: str = "gbfs", heuristic: str = "hff",
+                   max_ground_actions: int = 20000, max_expansions: int = 200000,
+                   time_limit: float = 10.0) -> Optional[List[str]]:
+    """
+    Pianifica direttamente sul testo PDDL generato.
+    Solleva GroundingError / PlannerBudgetExceeded se il problema va passato a Fast Downward.
+    """
+    with span("planner.parse", "planner"):
+        domain = parse_domain(domain_text)
+        problem = parse_problem(problem_text)
+    with span("planner.ground", "planner"):
+        task = ground(domain, problem, max_actions=max_ground_actions)
+        annotate(facts=len(task.facts), actions=len(task.actions))
+    with span("planner.search", "planner", algorithm=algorithm, heuristic=heuristic):
+        plan = search(task, algorithm, heuristic, max_expansions, time_limit)
+        annotate(plan_length=len(plan) if plan is not None else None)
+    return plan
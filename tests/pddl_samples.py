@@ -0,0 +1,55 @@
+"""Dominio e problemi PDDL piccoli e noti, condivisi dai test."""
+from lore import LoreDocument
+
+DOMAIN = """
+; Dominio di prova: spostamenti e raccolta di oggetti
+(define (domain quest)
+  (:requirements :strips :typing :negative-preconditions)
+  (:types character location item)
+  (:predicates
+    (at ?c - character ?l - location)
+    (item_at ?i - item ?l - location)
+    (has ?c - character ?i - item)
+    (connected ?from - location ?to - location)
+    (alive ?c - character))
+  (:action move
+    :parameters (?c - character ?from - location ?to - location)
+    :precondition (and (at ?c ?from) (connected ?from ?to) (alive ?c))
+    :effect (and (not (at ?c ?from)) (at ?c ?to)))
+  (:action take
+    :parameters (?c - character ?i - item ?l - location)
+    :precondition (and (at ?c ?l) (item_at ?i ?l) (not (has ?c ?i)))
+    :effect (and (has ?c ?i) (not (item_at ?i ?l)))))
+"""
+
+# village <-> forest <-> camp; la spada è a camp. Piano ottimo di 4 passi.
+PROBLEM = """
+(define (problem fetch_sword)
+  (:domain quest)
+  (:objects hero - character sword - item village forest camp - location)
+  (:init
+    (at hero village) (alive hero) (item_at sword camp)
+    (connected village forest) (connected forest village)
+    (connected forest camp) (connected camp forest))
+  (:goal (and (has hero sword) (at hero forest))))
+"""
+
+# camp non è collegato: la spada non si può raggiungere
+UNSOLVABLE_PROBLEM = """
+(define (problem lost_sword)
+  (:domain quest)
+  (:objects hero - character sword - item village forest camp - location)
+  (:init
+    (at hero village) (alive hero) (item_at sword camp)
+    (connected village forest) (connected forest village))
+  (:goal (and (has hero sword))))
+"""
+
+PLAN = ["(move hero village forest)", "(move hero forest camp)", "(take hero sword camp)",
+        "(move hero camp forest)"]
+
+
+def make_lore(branching=(1, 4), depth=(1, 10)) -> LoreDocument:
+    return LoreDocument(quest_description="Recupera la spada nel campo", branching_factor=branching,
+                        depth_constraints=depth, characters=["hero"], locations=["village", "forest", "camp"],
+                        items=["sword"])
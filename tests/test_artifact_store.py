@@ -0,0 +1,119 @@
+"""Test della canonicalizzazione PDDL e dell'archivio di artefatti indirizzato per contenuto."""
+import os
+import sys
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from artifact_store import ArtifactStore, artifact_key, canonical_pddl, default_artifact_store  # noqa: E402
+from pddl_samples import DOMAIN, PLAN, PROBLEM, UNSOLVABLE_PROBLEM  # noqa: E402
+from validation import find_plan  # noqa: E402
+
+MOVE = DOMAIN[DOMAIN.index("  (:action move"):DOMAIN.index("  (:action take")]
+TAKE = DOMAIN[DOMAIN.index("  (:action take"):DOMAIN.rindex(")")]
+
+
+def reorder_domain(text: str) -> str:
+    """Stesso dominio con azioni, predicati e congiunzioni in altro ordine, maiuscole e commenti."""
+    text = text.replace(MOVE, "").replace(TAKE, TAKE + "\n" + MOVE)
+    text = text.replace("(at ?c - character ?l - location)\n    (item_at ?i - item ?l - location)",
+                        "(item_at ?i - item ?l - location) ; oggetti\n    (AT ?c - character ?l - location)")
+    return text.replace("(and (at ?c ?from) (connected ?from ?to) (alive ?c))",
+                        "(and   (alive ?c) (at ?c ?from)\n (connected ?from ?to))")
+
+
+class CanonicalPDDLTest(unittest.TestCase):
+    def test_reordered_domain_has_same_key(self):
+        reordered = reorder_domain(DOMAIN)
+        self.assertNotEqual(reordered, DOMAIN)
+        self.assertEqual(canonical_pddl(reordered), canonical_pddl(DOMAIN))
+        self.assertEqual(artifact_key(reordered, PROBLEM), artifact_key(DOMAIN, PROBLEM))
+
+    def test_objects_and_init_order_do_not_matter(self):
+        reordered = PROBLEM.replace("hero - character sword - item", "sword - item hero - character") \
+            .replace("(at hero village) (alive hero)", "(alive hero) (at hero village)")
+        self.assertEqual(artifact_key(DOMAIN, reordered), artifact_key(DOMAIN, PROBLEM))
+
+    def test_argument_order_matters(self):
+        swapped = DOMAIN.replace("(connected ?from ?to)", "(connected ?to ?from)")
+        self.assertNotEqual(artifact_key(swapped, PROBLEM), artifact_key(DOMAIN, PROBLEM))
+        self.assertNotEqual(artifact_key(DOMAIN, UNSOLVABLE_PROBLEM), artifact_key(DOMAIN, PROBLEM))
+
+    def test_unparsable_text_is_whitespace_normalized(self):
+        self.assertEqual(canonical_pddl("(define  (Domain\n x"), "(define (domain x")
+
+
+class ArtifactStoreTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = tmp.name
+
+    def test_put_and_get_reordered_pair(self):
+        store = ArtifactStore(self.root)
+        stored = store.put(DOMAIN, PROBLEM, PLAN)
+        self.assertEqual(stored.status, "solved")
+        self.assertTrue((stored.path / "plan.txt").exists())
+
+        found = store.get(reorder_domain(DOMAIN), PROBLEM)
+        self.assertEqual((found.key, found.plan, found.conclusive), (stored.key, PLAN, True))
+        self.assertIsNone(store.get(DOMAIN, UNSOLVABLE_PROBLEM))
+        self.assertEqual(store.stats()["hits"], 1)
+        self.assertEqual(store.stats()["misses"], 1)
+
+    def test_failed_status_is_not_conclusive(self):
+        store = ArtifactStore(self.root)
+        store.put(DOMAIN, PROBLEM, None)
+        self.assertFalse(store.get(DOMAIN, PROBLEM).conclusive)
+
+    def test_least_recently_used_is_evicted_by_size(self):
+        probe = ArtifactStore(os.path.join(self.root, "probe"))
+        probe.put(DOMAIN, PROBLEM, PLAN)
+        entry_size = probe.stats()["bytes"]
+
+        store = ArtifactStore(os.path.join(self.root, "store"), max_bytes=int(entry_size * 2.5))
+        problems = [PROBLEM.replace("fetch_sword", f"fetch_sword_{i}") for i in range(3)]
+        first = store.put(DOMAIN, problems[0], PLAN)
+        time.sleep(0.01)
+        second = store.put(DOMAIN, problems[1], PLAN)
+        time.sleep(0.01)
+        store.get(DOMAIN, problems[0])  # il primo diventa il più recente
+        time.sleep(0.01)
+        store.put(DOMAIN, problems[2], PLAN)
+
+        self.assertEqual(store.stats()["entries"], 2)
+        self.assertLessEqual(store.stats()["bytes"], store.max_bytes)
+        self.assertIsNotNone(store.get(DOMAIN, problems[0]))
+        self.assertIsNone(store.get(DOMAIN, problems[1]))
+        self.assertFalse(second.path.exists())
+        self.assertTrue(first.path.exists())
+
+    def test_find_plan_is_memoized(self):
+        store = ArtifactStore(os.path.join(self.root, "store"))
+        domain_file, problem_file = os.path.join(self.root, "domain.pddl"), os.path.join(self.root, "problem.pddl")
+        with open(domain_file, "w", encoding="utf-8") as f:
+            f.write(DOMAIN)
+        with open(problem_file, "w", encoding="utf-8") as f:
+            f.write(UNSOLVABLE_PROBLEM)
+
+        self.assertIsNone(find_plan(domain_file, problem_file, engine="builtin", store=store))
+        self.assertEqual(store.get(DOMAIN, UNSOLVABLE_PROBLEM).status, "unsolvable")
+        self.assertIsNone(find_plan(domain_file, problem_file, engine="builtin", store=store))
+        self.assertEqual(store.stats()["entries"], 1)
+        self.assertEqual(store.stats()["hits"], 2)
+
+    def test_default_store_is_shared_by_the_process(self):
+        with mock.patch.dict(os.environ, {"ARTIFACT_STORE": os.path.join(self.root, "shared")}):
+            store = default_artifact_store()
+            self.assertIs(default_artifact_store(), store)
+            with mock.patch.dict(os.environ, {"ARTIFACT_STORE_MAX_MB": "1"}):
+                self.assertIsNot(default_artifact_store(), store)
+        with mock.patch.dict(os.environ, {"ARTIFACT_STORE": "0"}):
+            self.assertIsNone(default_artifact_store())
+
+
+if __name__ == "__main__":
+    unittest.main()
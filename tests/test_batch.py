@@ -0,0 +1,52 @@
+"""Test dell'elaborazione batch: identificativi delle lore e isolamento degli errori."""
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from batch import iter_lore_files, lore_id, run_one  # noqa: E402
+from llm_interface import LLMInterface  # noqa: E402
+
+
+class UnusedLLM(LLMInterface):
+    model = "unused"
+
+    def run_prompt(self, prompt: str) -> str:
+        raise AssertionError("nessuna chiamata LLM attesa")
+
+
+class BatchTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = Path(tmp.name)
+        env = mock.patch.dict(os.environ, {"ARTIFACT_STORE": "0", "LORE_INDEX": "0"})
+        env.start()
+        self.addCleanup(env.stop)
+
+    def test_lore_id_follows_relative_path_and_content(self):
+        for folder in ("a", "b"):
+            (self.root / folder / "quests").mkdir(parents=True)
+            (self.root / folder / "quests" / "sword.yaml").write_text("quest_description: x\n")
+        (path_a, rel_a), = iter_lore_files([str(self.root / "a")])
+        (path_b, rel_b), = iter_lore_files([str(self.root / "b")])
+        self.assertEqual(rel_a, "quests/sword.yaml")
+        self.assertEqual(lore_id(path_a, rel_a), lore_id(path_b, rel_b))
+        path_b.write_text("quest_description: y\n")
+        self.assertNotEqual(lore_id(path_a, rel_a), lore_id(path_b, rel_b))
+
+    def test_unreadable_lore_becomes_error_record(self):
+        missing = self.root / "missing.yaml"
+        self.assertTrue(lore_id(missing, "missing.yaml").startswith("missing_"))
+        record = run_one(missing, str(self.root / "out"), llm=UnusedLLM(), relative="missing.yaml")
+        self.assertEqual(record["status"], "error")
+        self.assertIn("missing.yaml", record["error"])
+        self.assertEqual(record["lore_id"], lore_id(missing, "missing.yaml"))
+
+
+if __name__ == "__main__":
+    unittest.main()
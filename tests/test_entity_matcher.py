@@ -0,0 +1,65 @@
+"""Test della sostituzione in un solo passaggio dei nomi di entità (EntityMatcher, regex a trie)."""
+import os
+import random
+import re
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lore import LoreDocument  # noqa: E402
+from pddl_inferencer import EntityMatcher, PDDLInferencer, _trie_regex, compile_entity_matcher  # noqa: E402
+
+MAPPING = (("hero", "?char_hero"), ("bandit", "?char_bandit"), ("bandit_leader", "?char_bandit_leader"),
+           ("Dark Forest", "?loc_dark_forest"), ("forest", "?loc_forest"))
+
+
+class EntityMatcherTest(unittest.TestCase):
+    def setUp(self):
+        self.matcher = EntityMatcher(MAPPING)
+
+    def test_respects_word_boundaries(self):
+        self.assertEqual(self.matcher.replace("heroic superhero hero_x hero"), "heroic superhero hero_x ?char_hero")
+
+    def test_longest_name_wins(self):
+        self.assertEqual(self.matcher.replace("(attack bandit_leader bandit)"),
+                         "(attack ?char_bandit_leader ?char_bandit)")
+        self.assertEqual(self.matcher.replace("(at hero dark forest) forest"),
+                         "(at ?char_hero ?loc_dark_forest) ?loc_forest")
+
+    def test_case_insensitive(self):
+        self.assertEqual(self.matcher.replace("HERO Bandit"), "?char_hero ?char_bandit")
+
+    def test_single_pass(self):
+        # La variabile sostituita contiene "forest", ma non viene ritoccata
+        matcher = EntityMatcher((("woods", "forest"), ("forest", "?loc_forest")))
+        self.assertEqual(matcher.replace("woods forest"), "forest ?loc_forest")
+
+    def test_empty_mapping_leaves_text(self):
+        self.assertEqual(EntityMatcher(()).replace("hero"), "hero")
+
+    def test_trie_regex_matches_like_alternation(self):
+        rnd = random.Random(7)
+        words = sorted({"".join(rnd.choice("abc") for _ in range(rnd.randint(1, 4))) for _ in range(40)})
+        trie = re.compile(rf"\b{_trie_regex(words)}\b")
+        alternation = re.compile(r"\b(?:" + "|".join(sorted(words, key=len, reverse=True)) + r")\b")
+        for _ in range(200):
+            text = " ".join("".join(rnd.choice("abc") for _ in range(rnd.randint(1, 5))) for _ in range(5))
+            self.assertEqual(trie.findall(text), alternation.findall(text), text)
+
+
+class InferencerNormalizationTest(unittest.TestCase):
+    def test_lore_names_become_typed_variables(self):
+        lore = LoreDocument(quest_description="x", branching_factor=(1, 2), depth_constraints=(1, 2),
+                            characters=["Hero"], locations=["Dark Forest"], items=["sword"])
+        inferencer = PDDLInferencer(lore, llm=None)
+        self.assertEqual(inferencer._normalize_text("(has hero sword) (at HERO dark forest)"),
+                         "(has ?char_hero - character ?item_sword - item) "
+                         "(at ?char_hero - character ?loc_dark_forest - location)")
+        # Lo stesso matcher compilato è condiviso dagli inferencer della stessa lore
+        self.assertIs(PDDLInferencer(lore, llm=None).entity_matcher, inferencer.entity_matcher)
+        self.assertIs(compile_entity_matcher(tuple(inferencer.replacement_map.items())), inferencer.entity_matcher)
+
+
+if __name__ == "__main__":
+    unittest.main()
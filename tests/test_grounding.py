@@ -0,0 +1,78 @@
+"""Test del grounding guidato dalla raggiungibilità e dell'indice di applicabilità."""
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from grounding import GroundingError, ground, iter_bits, static_predicates  # noqa: E402
+from pddl_parser import parse_domain, parse_problem  # noqa: E402
+from pddl_samples import DOMAIN, PROBLEM  # noqa: E402
+
+# Variante con un predicato statico usato in negativo: nessuno entra in un luogo bloccato
+BLOCKED_DOMAIN = DOMAIN.replace("(alive ?c - character))", "(alive ?c - character)\n    (blocked ?l - location))") \
+    .replace("(connected ?from ?to) (alive ?c))", "(connected ?from ?to) (alive ?c) (not (blocked ?to)))")
+
+
+def ground_text(domain_text: str, problem_text: str, **options):
+    return ground(parse_domain(domain_text), parse_problem(problem_text), **options)
+
+
+def facts(task, mask: int):
+    return {task.facts[f] for f in iter_bits(mask)}
+
+
+class GroundingTest(unittest.TestCase):
+    def test_only_reachable_instances(self):
+        task = ground_text(DOMAIN, PROBLEM)
+        self.assertEqual(sorted(a.label() for a in task.actions), [
+            "(move hero camp forest)", "(move hero forest camp)", "(move hero forest village)",
+            "(move hero village forest)", "(take hero sword camp)",
+        ])
+
+    def test_static_literals_are_compiled_away(self):
+        self.assertEqual(static_predicates(parse_domain(DOMAIN)), {"connected", "alive"})
+        task = ground_text(DOMAIN, PROBLEM)
+        take = task.actions[task.action_by_label()["(take hero sword camp)"]]
+        self.assertEqual(facts(task, take.pre_pos), {("at", "hero", "camp"), ("item_at", "sword", "camp")})
+        self.assertEqual(facts(task, take.pre_neg), {("has", "hero", "sword")})
+        self.assertEqual(facts(task, take.add), {("has", "hero", "sword")})
+        self.assertEqual(facts(task, take.delete), {("item_at", "sword", "camp")})
+        move = task.actions[task.action_by_label()["(move hero village forest)"]]
+        self.assertEqual(facts(task, move.pre_pos), {("at", "hero", "village")})
+
+    def test_static_negative_preconditions(self):
+        task = ground_text(BLOCKED_DOMAIN, PROBLEM.replace("(alive hero)", "(alive hero) (blocked camp)"))
+        labels = {a.label() for a in task.actions}
+        self.assertNotIn("(move hero forest camp)", labels)
+        self.assertIn("(move hero forest village)", labels)
+        # blocked è statico: il suo valore è noto e non resta nelle precondizioni
+        self.assertTrue(all(not a.pre_neg for a in task.actions))
+
+    def test_unsupported_constructs_and_budget(self):
+        with self.assertRaisesRegex(GroundingError, "costrutto non supportato"):
+            ground_text(DOMAIN.replace("(and (at ?c ?from) (connected ?from ?to) (alive ?c))",
+                                       "(or (at ?c ?from) (alive ?c))"), PROBLEM)
+        with self.assertRaisesRegex(GroundingError, "Più di 2 azioni"):
+            ground_text(DOMAIN, PROBLEM, max_actions=2)
+
+    def test_applicable_actions_match_naive_check(self):
+        locations = [f"l{i}" for i in range(12)]
+        edges = " ".join(f"(connected {a} {b})" for i, a in enumerate(locations) for j, b in enumerate(locations)
+                         if i != j and (7 * i + j) % 3)
+        problem = PROBLEM.replace("village forest camp - location", " ".join(locations) + " - location") \
+            .replace("(connected village forest) (connected forest village)", edges) \
+            .replace("(connected forest camp) (connected camp forest)", "") \
+            .replace("village", "l0").replace("camp", "l5").replace("forest", "l7")
+        task = ground_text(DOMAIN, problem)
+        rnd = random.Random(3)
+        state = task.init
+        for _ in range(200):
+            fast = sorted(task.applicable_actions(state))
+            self.assertEqual(fast, [i for i, a in enumerate(task.actions) if task.is_applicable(state, a)])
+            state = task.apply(state, task.actions[rnd.choice(fast)]) if fast else task.init
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+"""Test della cache delle risposte LLM (CachedLLMClient) con un client finto in streaming."""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from llm_cache import CachedLLMClient, ResponseCache  # noqa: E402
+from llm_interface import LLMInterface  # noqa: E402
+from lore import LoreDocument  # noqa: E402
+from pddl_inferencer import PDDLInferencer  # noqa: E402
+
+GOAL = "(and (at hero camp) (has hero key))\nSpiegazione che non serve leggere."
+
+
+class StreamingStub(LLMInterface):
+    """Restituisce sempre response, a parole, interrompendosi come lo streaming reale."""
+    model = "stub"
+
+    def __init__(self, response: str):
+        self.response = response
+        self.calls = 0
+
+    def run_prompt(self, prompt: str) -> str:
+        self.calls += 1
+        return self.response
+
+    def run_prompt_streaming(self, prompt: str, stop_when=None) -> str:
+        self.calls += 1
+        text = ""
+        for word in self.response.split(" "):
+            text += word if not text else " " + word
+            if stop_when is not None and stop_when(text):
+                break
+        return text
+
+
+def make_lore() -> LoreDocument:
+    return LoreDocument(quest_description="Recupera la chiave", branching_factor=(1, 3), depth_constraints=(1, 5),
+                        characters=["hero"], locations=["camp", "cave"], items=["key"])
+
+
+class CachedLLMClientTest(unittest.TestCase):
+    def make_client(self, response: str):
+        stub = StreamingStub(response)
+        return stub, CachedLLMClient(stub, ResponseCache(":memory:"), enabled=True)
+
+    def test_goal_is_cached_across_inferencers(self):
+        stub, client = self.make_client(GOAL)
+        lore = make_lore()
+
+        goals = [PDDLInferencer(lore, client).infer_goal() for _ in range(3)]
+        self.assertEqual(stub.calls, 1)
+        self.assertEqual(len(set(goals)), 1)
+        self.assertNotIn("Spiegazione", goals[0])
+        self.assertEqual(client.stats(), {"hits": 2, "misses": 1, "entries": 1})
+
+    def test_truncated_response_does_not_answer_full_prompt(self):
+        stub, client = self.make_client(GOAL)
+
+        truncated = client.run_prompt_streaming("goal", stop_when=lambda text: text.endswith(")"))
+        self.assertEqual(client.run_prompt("goal"), GOAL)
+        self.assertNotEqual(truncated, GOAL)
+        self.assertEqual(stub.calls, 2)
+
+    def test_complete_stream_answers_full_prompt(self):
+        stub, client = self.make_client(GOAL)
+
+        self.assertEqual(client.run_prompt_streaming("goal", stop_when=lambda text: False), GOAL)
+        self.assertEqual(client.run_prompt("goal"), GOAL)
+        self.assertEqual(stub.calls, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+"""Test dell'indice di similarità delle lore e dell'adattamento dei domini riusati."""
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lore import LoreDocument  # noqa: E402
+from lore_index import LoreIndex, adapt_actions, lore_terms  # noqa: E402
+
+PREDICATES = ["(at ?c - character ?l - location)"]
+MOVE = ("(:action move :parameters (?c - character ?a - location ?b - location) "
+        ":precondition (at ?c ?a) :effect (and (not (at ?c ?a)) (at ?c ?b)))")
+GO_CAMP = "(:action go_camp :parameters (?c - character) :precondition (at ?c village) :effect (at ?c Camp))"
+
+
+def make_lore(description: str, characters, locations, items) -> LoreDocument:
+    return LoreDocument(quest_description=description, branching_factor=(1, 3), depth_constraints=(1, 5),
+                        characters=characters, locations=locations, items=items)
+
+
+CAMP = make_lore("L'eroe deve recuperare la spada magica nel campo dei banditi",
+                 ["hero", "bandit_leader"], ["village", "forest", "camp"], ["sword"])
+CAVE = make_lore("L'eroe deve recuperare la spada magica nella grotta dei banditi",
+                 ["hero", "bandit_leader"], ["village", "cave"], ["sword"])
+BALL = make_lore("Una principessa organizza un ballo a corte", ["princess"], ["castle"], ["dress"])
+
+
+class AdaptActionsTest(unittest.TestCase):
+    def test_terms_prefix_entities_and_skip_stopwords(self):
+        terms = lore_terms(CAMP)
+        self.assertIn("location:camp", terms)
+        self.assertIn("character:bandit", terms)
+        self.assertIn("spada", terms)
+        self.assertNotIn("dei", terms)
+
+    def test_actions_with_unknown_constants_are_dropped(self):
+        self.assertEqual(adapt_actions([MOVE, GO_CAMP], CAMP), [MOVE, GO_CAMP])  # Camp ~ camp
+        self.assertEqual(adapt_actions([MOVE, GO_CAMP], CAVE), [MOVE])
+        self.assertEqual(adapt_actions(["azione senza parentesi"], CAMP), [])
+
+    def test_names_are_normalized(self):
+        lore = make_lore("x", ["Bandit Leader"], ["Dark-Forest"], [])
+        action = "(:action hide :parameters () :precondition (at bandit_leader dark_forest) :effect (hidden))"
+        self.assertEqual(adapt_actions([action], lore), [action])
+
+
+class LoreIndexTest(unittest.TestCase):
+    def test_similar_lore_reuses_domain(self):
+        index = LoreIndex(":memory:")
+        self.assertTrue(index.add(CAMP, PREDICATES, [MOVE, GO_CAMP]))
+        self.assertFalse(index.add(CAMP, PREDICATES, [MOVE, GO_CAMP]))
+
+        reused = index.find_domain(CAVE)
+        self.assertIsNotNone(reused)
+        self.assertGreaterEqual(reused.similarity, index.threshold)
+        self.assertEqual((reused.predicates, reused.actions, reused.dropped), (PREDICATES, [MOVE], 1))
+        self.assertIsNone(index.find_domain(BALL))
+        self.assertEqual(index.stats(), {"hits": 1, "misses": 1, "entries": 1})
+
+    def test_search_ranks_by_similarity(self):
+        index = LoreIndex(":memory:")
+        index.add(BALL, PREDICATES, [MOVE])
+        index.add(CAMP, PREDICATES, [MOVE])
+        ranked = index.search(CAVE)
+        self.assertEqual([run_id for _, run_id in ranked], [2])  # il ballo non condivide termini
+        self.assertEqual(index.search(CAMP)[0][0], max(s for s, _ in index.search(CAMP)))
+        self.assertAlmostEqual(index.search(CAMP)[0][0], 1.0)
+
+    def test_too_many_dropped_actions_is_a_miss(self):
+        index = LoreIndex(":memory:", min_kept=0.75)
+        index.add(CAMP, PREDICATES, [MOVE, GO_CAMP])
+        self.assertIsNone(index.find_domain(CAVE))
+
+    def test_rows_added_by_other_processes_are_seen(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "index.sqlite")
+            reader = LoreIndex(path)
+            self.assertIsNone(reader.find_domain(CAVE))
+            LoreIndex(path).add(CAMP, PREDICATES, [MOVE])
+            self.assertIsNotNone(reader.find_domain(CAVE))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,156 @@
+"""
+Test di OnlineLLMClient contro un server http.server locale che simula il provider:
+token in streaming (SSE), chiusura della connessione con lo stop anticipato, 429 con Retry-After
+ed errori di sovraccarico (503, connessione rifiutata) fino all'ultimo tentativo.
+
+    python -m pytest -q tests
+"""
+import json
+import os
+import sys
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from online_llm_client import OnlineLLMClient  # noqa: E402
+from rate_limiter import RateLimiter  # noqa: E402
+
+TOKENS = ["(:action", " muovi", "\n", ")", " (:action", " prendi", ")"]
+
+
+class _ProviderStub(BaseHTTPRequestHandler):
+    """
+    Risponde secondo server.mode: "sse", "endless" (stream senza fine), "throttle" (429 poi 200)
+    o "overloaded" (sempre 503).
+    """
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        server.requests.append((time.monotonic(), body))
+        if server.mode == "throttle" and len(server.requests) == 1:
+            self.send_response(429)
+            self.send_header("Retry-After", "1")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if server.mode == "overloaded":
+            self.send_response(503)
+            self.send_header("Retry-After", "0")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if not body.get("stream"):
+            payload = json.dumps({"choices": [{"message": {"content": "ok"}}],
+                                  "usage": {"prompt_tokens": 3, "completion_tokens": 1}}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        tokens = TOKENS if server.mode == "sse" else (f" t{i}" for i in range(500))
+        try:
+            for token in tokens:
+                chunk = {"choices": [{"delta": {"content": token}}]}
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                self.wfile.flush()
+                server.sent += 1
+                if server.mode == "endless":
+                    time.sleep(0.01)
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            server.disconnected.set()
+
+
+class OnlineLLMClientTest(unittest.TestCase):
+    def start_server(self, mode: str):
+        server = ThreadingHTTPServer(("127.0.0.1", 0), _ProviderStub)
+        server.daemon_threads = True
+        server.mode = mode
+        server.requests = []
+        server.sent = 0
+        server.disconnected = threading.Event()
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return server
+
+    def make_client(self, server, limiter: RateLimiter = None, **options) -> OnlineLLMClient:
+        client = OnlineLLMClient(model="stub", api_key="test", timeout=10,
+                                 api_url=f"http://127.0.0.1:{server.server_port}/v1/chat/completions",
+                                 rate_limiter=limiter or RateLimiter(), **options)
+        self.addCleanup(client.session.close)
+        return client
+
+    def test_stream_delivers_sse_tokens_in_order(self):
+        server = self.start_server("sse")
+        client = self.make_client(server)
+
+        self.assertEqual(list(client.stream_prompt("azioni")), TOKENS)
+        self.assertTrue(server.requests[0][1]["stream"])
+        self.assertEqual(client.run_prompt_streaming("azioni"), "".join(TOKENS).strip())
+
+    def test_early_stop_closes_connection(self):
+        server = self.start_server("endless")
+        client = self.make_client(server)
+
+        text = client.run_prompt_streaming("azioni", stop_when=lambda t: t.count(" t") >= 3)
+        self.assertEqual(text, "t0 t1 t2")
+        # Chiusa la connessione, il server non riesce più a scrivere e smette di generare
+        self.assertTrue(server.disconnected.wait(5), "il server non ha visto chiudere la connessione")
+        self.assertLess(server.sent, 500)
+
+    def test_429_waits_for_retry_after(self):
+        server = self.start_server("throttle")
+        client = self.make_client(server, max_retries=2)
+
+        self.assertEqual(client.run_prompt("ciao"), "ok")
+        self.assertEqual(len(server.requests), 2)
+        self.assertGreaterEqual(server.requests[1][0] - server.requests[0][0], 1.0)
+        self.assertEqual(client.limiter.stats()["throttled"], 1)
+
+    def test_rejected_attempts_are_refunded(self):
+        server = self.start_server("overloaded")
+        client = self.make_client(server, RateLimiter(rpm=60, tpm=60000), max_retries=2)
+
+        with self.assertRaises(RuntimeError):
+            client.run_prompt("ciao")
+        # Tre tentativi respinti con 503: nessuna richiesta né token restano addebitati
+        self.assertAlmostEqual(client.limiter.requests.level, 60, delta=0.5)
+        self.assertAlmostEqual(client.limiter.tokens.level, 60000, delta=5)
+
+    def test_last_throttled_attempt_raises(self):
+        server = self.start_server("overloaded")
+        client = self.make_client(server, max_retries=2)
+
+        with self.assertRaisesRegex(RuntimeError, "Troppi tentativi"):
+            client.run_prompt("ciao")
+        self.assertEqual(len(server.requests), 3)
+        self.assertEqual(client.limiter.stats()["throttled"], 3)
+
+    def test_connection_errors_are_retried_as_overload(self):
+        server = self.start_server("sse")
+        server.shutdown()
+        server.server_close()  # la porta resta libera: la connessione viene rifiutata
+        client = self.make_client(server, max_retries=1)
+
+        with self.assertRaisesRegex(RuntimeError, "Errore di connessione"):
+            client.run_prompt("ciao")
+        self.assertEqual(client.limiter.stats()["throttled"], 2)
+        self.assertLess(client.limiter.concurrency.limit, 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+"""Test del parser di s-espressioni, dell'AST PDDL e dei controlli semantici."""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pddl_parser import (  # noqa: E402
+    And, Atom, Not, PDDLParseError, check_domain, check_problem, parse_action, parse_domain, parse_problem,
+    parse_sexprs, tokenize,
+)
+from pddl_samples import DOMAIN, PROBLEM  # noqa: E402
+
+
+class SExprTest(unittest.TestCase):
+    def test_tokenize_drops_comments(self):
+        self.assertEqual(tokenize("(at ?c ; commento (non chiuso\n ?l)"), ["(", "at", "?c", "?l", ")"])
+
+    def test_keywords_are_lowercased(self):
+        self.assertEqual(parse_sexprs("(:Action Move)"), [[":action", "Move"]])
+
+    def test_strict_mode_rejects_unbalanced_parens(self):
+        with self.assertRaises(PDDLParseError):
+            parse_sexprs("(and (at a b)")
+        with self.assertRaises(PDDLParseError):
+            parse_sexprs("(at a b))")
+
+    def test_tolerant_mode_closes_and_ignores_parens(self):
+        self.assertEqual(parse_sexprs("(and (at a b)", tolerant=True), [["and", ["at", "a", "b"]]])
+        self.assertEqual(parse_sexprs("(at a b))", tolerant=True), [["at", "a", "b"]])
+
+
+class RoundTripTest(unittest.TestCase):
+    def test_domain_round_trip(self):
+        domain = parse_domain(DOMAIN)
+        self.assertEqual(domain.name, "quest")
+        self.assertEqual([a.name for a in domain.actions], ["move", "take"])
+        self.assertEqual(parse_domain(domain.to_pddl()), domain)
+
+    def test_problem_round_trip(self):
+        problem = parse_problem(PROBLEM)
+        self.assertEqual(problem.objects["sword"], "item")
+        self.assertIn(Atom("at", ["hero", "village"]), problem.init)
+        self.assertEqual(parse_problem(problem.to_pddl()), problem)
+
+    def test_action_formulas(self):
+        action = parse_action(DOMAIN[DOMAIN.index("(:action take"):DOMAIN.rindex(")")])
+        self.assertIsInstance(action.precondition, And)
+        self.assertEqual(action.precondition.args[2], Not(Atom("has", ["?c", "?i"])))
+        self.assertEqual([p.type for p in action.parameters], ["character", "item", "location"])
+
+
+class SemanticCheckTest(unittest.TestCase):
+    def test_valid_pair_has_no_issues(self):
+        domain = parse_domain(DOMAIN)
+        self.assertEqual(check_domain(domain), [])
+        self.assertEqual(check_problem(parse_problem(PROBLEM), domain), [])
+
+    def test_domain_issues_are_localized(self):
+        broken = DOMAIN.replace("(alive ?c))\n    :effect", "(alive ?c ?to) (rested ?x))\n    :effect")
+        issues = check_domain(parse_domain(broken))
+        self.assertEqual({i.component for i in issues}, {"action"})
+        self.assertEqual({i.subject for i in issues}, {"move"})
+        messages = " | ".join(map(str, issues))
+        self.assertIn("'alive' usa 2 argomenti invece di 1", messages)
+        self.assertIn("predicato non dichiarato 'rested'", messages)
+        self.assertIn("variabile non dichiarata '?x'", messages)
+
+    def test_problem_issues_are_localized(self):
+        broken = PROBLEM.replace("(has hero sword)", "(has hero shield)")
+        issues = check_problem(parse_problem(broken), parse_domain(DOMAIN))
+        self.assertEqual([(i.component, i.subject) for i in issues], [("goal", "shield")])
+
+
+if __name__ == "__main__":
+    unittest.main()
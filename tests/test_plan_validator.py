@@ -0,0 +1,78 @@
+"""Test del validatore di piani (con i vincoli della lore) e della diagnostica di raggiungibilità."""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pddl_samples import DOMAIN, PLAN, PROBLEM, UNSOLVABLE_PROBLEM, make_lore  # noqa: E402
+from plan_validator import normalize_step, validate_plan, validate_plans  # noqa: E402
+from reachability import analyze_pddl  # noqa: E402
+
+
+class PlanValidatorTest(unittest.TestCase):
+    def test_valid_plan(self):
+        result = validate_plan(DOMAIN, PROBLEM, PLAN, make_lore())
+        self.assertTrue(result.ok)
+        self.assertEqual(result.depth, 4)
+        self.assertEqual(result.branching, [1, 2, 2, 1])
+
+    def test_steps_are_normalized(self):
+        self.assertEqual(normalize_step("(MOVE hero  village forest) ; costo 1"), "(move hero village forest)")
+        self.assertEqual(normalize_step("move hero village forest"), "(move hero village forest)")
+
+    def test_inapplicable_step_reports_missing_precondition(self):
+        result = validate_plan(DOMAIN, PROBLEM, ["(take hero sword camp)"])
+        self.assertFalse(result.executable)
+        self.assertEqual((result.failed_step, result.failed_action), (0, "(take hero sword camp)"))
+        self.assertIn("manca (at hero camp)", result.errors[0])
+
+    def test_unknown_action(self):
+        result = validate_plan(DOMAIN, PROBLEM, ["(move hero village forest)", "(fly hero)"])
+        self.assertEqual(result.failed_step, 1)
+        self.assertIn("non esiste nel dominio", result.errors[0])
+
+    def test_goal_not_reached(self):
+        result = validate_plan(DOMAIN, PROBLEM, PLAN[:3])
+        self.assertTrue(result.executable)
+        self.assertFalse(result.valid)
+        self.assertEqual(result.errors, ["Goal non raggiunto: manca (at hero forest)"])
+
+    def test_lore_depth_and_branching_violations(self):
+        result = validate_plan(DOMAIN, PROBLEM, PLAN, make_lore(branching=(2, 4), depth=(1, 3)))
+        self.assertTrue(result.valid)
+        self.assertFalse(result.ok)
+        self.assertEqual(len(result.lore_violations), 2)
+        self.assertIn("Profondità 4", result.lore_violations[0])
+        self.assertIn("in 2 stati", result.lore_violations[1])
+
+    def test_many_plans_share_grounding(self):
+        results = validate_plans(DOMAIN, PROBLEM, [PLAN, PLAN[:1], list(reversed(PLAN))])
+        self.assertEqual([r.valid for r in results], [True, False, False])
+
+
+class ReachabilityTest(unittest.TestCase):
+    def test_solvable_problem_is_clean(self):
+        report = analyze_pddl(DOMAIN, PROBLEM)
+        self.assertFalse(report.hopeless)
+        self.assertEqual(report.summary(), "")
+
+    def test_unreachable_goal_is_explained(self):
+        report = analyze_pddl(DOMAIN, UNSOLVABLE_PROBLEM)
+        self.assertTrue(report.hopeless)
+        self.assertEqual(report.unreachable_goals, ["(has hero sword)"])
+        self.assertEqual(report.unreachable_locations, ["camp"])
+        self.assertEqual([(i.component, i.subject) for i in report.issues], [("action", "take")])
+
+    def test_type_errors_and_unused_predicates(self):
+        domain = DOMAIN.replace("(alive ?c - character))", "(alive ?c - character)\n    (rested ?c - character))")
+        report = analyze_pddl(domain, PROBLEM.replace("(alive hero)", "(alive hero) (alive sword)"))
+        self.assertEqual(report.unused_predicates, ["rested"])
+        self.assertEqual(report.type_errors, ["Init: (alive sword) usa 'sword' di tipo item, atteso character"])
+
+    def test_unparsable_text(self):
+        self.assertIsNone(analyze_pddl(DOMAIN, "(define (problem"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,102 @@
+"""Test del limitatore di richieste: bucket a ricarica, concorrenza adattiva e backoff."""
+import os
+import sys
+import time
+import unittest
+from email.utils import formatdate
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rate_limiter import (AdaptiveConcurrency, RateLimiter, TokenBucket, backoff_delay,  # noqa: E402
+                          retry_after_seconds)
+
+
+class TokenBucketTest(unittest.TestCase):
+    def test_reserve_goes_into_debt(self):
+        bucket = TokenBucket(per_minute=60, capacity=2)
+        self.assertEqual(bucket.reserve(2), 0.0)
+        wait = bucket.reserve(3)
+        self.assertAlmostEqual(wait, 3.0, delta=0.1)  # 3 token di debito a 1 token/s
+        self.assertLess(bucket.level, 0)
+
+    def test_refill_over_time(self):
+        bucket = TokenBucket(per_minute=6000, capacity=10)
+        bucket.reserve(10)
+        time.sleep(0.05)
+        self.assertEqual(bucket.reserve(1), 0.0)  # ~5 token ricaricati
+        time.sleep(0.2)
+        bucket.reserve(0)
+        self.assertEqual(bucket.level, 10)  # mai oltre la capacità
+
+    def test_refund_is_capped_at_capacity(self):
+        bucket = TokenBucket(per_minute=60, capacity=5)
+        bucket.reserve(3)
+        bucket.refund(2)
+        self.assertAlmostEqual(bucket.level, 4, delta=0.1)
+        bucket.refund(100)
+        self.assertEqual(bucket.level, 5)
+
+
+class AdaptiveConcurrencyTest(unittest.TestCase):
+    def test_additive_increase_multiplicative_decrease(self):
+        concurrency = AdaptiveConcurrency(initial=4, minimum=1, maximum=8)
+        concurrency.acquire()
+        concurrency.release()
+        self.assertAlmostEqual(concurrency.limit, 4.25)
+        concurrency.acquire()
+        concurrency.release(throttled=True)
+        self.assertAlmostEqual(concurrency.limit, 2.125)
+        concurrency.acquire()
+        concurrency.release(throttled=True, cooldown=60)  # un solo dimezzamento per finestra
+        self.assertAlmostEqual(concurrency.limit, 2.125)
+        self.assertEqual(concurrency.in_flight, 0)
+
+    def test_limit_stays_within_bounds(self):
+        concurrency = AdaptiveConcurrency(initial=20, minimum=2, maximum=3)
+        self.assertEqual(concurrency.limit, 3)
+        for _ in range(5):
+            concurrency.acquire()
+            concurrency.release(throttled=True, cooldown=0)
+        self.assertEqual(concurrency.limit, 2)
+
+
+class RateLimiterTest(unittest.TestCase):
+    def test_slot_reserves_and_settles_tokens(self):
+        limiter = RateLimiter(rpm=600, tpm=6000)
+        with limiter.slot(1000) as slot:
+            self.assertAlmostEqual(limiter.tokens.level, 5000, delta=5)
+            slot.settle(200)
+        self.assertAlmostEqual(limiter.tokens.level, 5800, delta=5)
+        self.assertAlmostEqual(limiter.requests.level, 599, delta=0.1)
+        self.assertEqual(limiter.stats()["requests"], 1)
+
+    def test_throttle_pauses_and_halves_concurrency(self):
+        limiter = RateLimiter(initial_concurrency=4)
+        with limiter.slot() as slot:
+            slot.throttle(0.05)
+        self.assertEqual(limiter.stats()["throttled"], 1)
+        self.assertEqual(limiter.stats()["concurrency_limit"], 2)
+        start = time.monotonic()
+        with limiter.slot():
+            pass
+        self.assertGreaterEqual(time.monotonic() - start, 0.03)
+
+
+class BackoffTest(unittest.TestCase):
+    def test_retry_after_header(self):
+        self.assertEqual(retry_after_seconds({"Retry-After": "7"}), 7.0)
+        self.assertEqual(retry_after_seconds({"retry-after": "-3"}), 0.0)
+        self.assertIsNone(retry_after_seconds({}))
+        self.assertIsNone(retry_after_seconds({"Retry-After": "presto"}))
+        http_date = formatdate(time.time() + 30, usegmt=True)
+        self.assertAlmostEqual(retry_after_seconds({"Retry-After": http_date}), 30, delta=2)
+
+    def test_backoff_bounds(self):
+        for attempt in range(8):
+            delay = min(60.0, 2 ** attempt)
+            self.assertTrue(delay / 2 <= backoff_delay(attempt) <= delay)
+        self.assertTrue(5.0 <= backoff_delay(0, retry_after=5.0) <= 5.6)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+"""Test dell'esploratore del grafo della storia e della sua memoria compatta degli stati."""
+import io
+import json
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from grounding import ground  # noqa: E402
+from pddl_parser import parse_domain, parse_problem  # noqa: E402
+from pddl_samples import DOMAIN, PROBLEM, UNSOLVABLE_PROBLEM, make_lore  # noqa: E402
+from story_graph import StoryGraph, StoryGraphExplorer, explore_story_graph  # noqa: E402
+
+
+class StoryGraphStorageTest(unittest.TestCase):
+    def test_dedup_and_unpacking_across_growth(self):
+        graph = StoryGraph(300)
+        rnd = random.Random(1)
+        known = {}
+        for _ in range(5000):
+            state = rnd.getrandbits(rnd.choice([3, 64, 300]))
+            self.assertEqual(graph.find(state), known.get(state))
+            if state not in known:
+                known[state] = graph.add_node(state, 0, -1, False)
+        self.assertEqual(len(graph), len(known))
+        self.assertEqual(len(graph.states), len(known) * graph.width)
+        for state, node in known.items():
+            self.assertEqual(graph.state(node), state)
+
+
+class StoryGraphExplorerTest(unittest.TestCase):
+    def test_full_exploration(self):
+        graph = explore_story_graph(DOMAIN, PROBLEM, make_lore(depth=(1, 6)))
+        s = graph.stats
+        self.assertEqual((s.nodes, s.edges, s.goal_nodes, s.max_depth), (5, 6, 1, 4))
+        # Gli stati goal chiudono la storia: nessun arco in uscita
+        goals = [n for n in range(len(graph)) if graph.goal[n]]
+        self.assertFalse(set(graph.edge_src) & set(goals))
+        self.assertEqual(list(graph.h), [3, 2, 1, 1, 0])
+
+    def test_prunes_branches_that_cannot_finish_in_time(self):
+        s = explore_story_graph(DOMAIN, PROBLEM, make_lore(depth=(1, 4))).stats
+        self.assertEqual((s.nodes, s.edges, s.pruned_too_deep), (5, 4, 2))
+
+    def test_dead_ends_are_pruned(self):
+        s = explore_story_graph(DOMAIN, UNSOLVABLE_PROBLEM, make_lore(depth=(1, 4))).stats
+        self.assertEqual((s.nodes, s.pruned_dead_end, s.under_branching), (1, 1, 1))
+
+    def test_sampling_keeps_closest_branch(self):
+        graph = explore_story_graph(DOMAIN, PROBLEM, make_lore(branching=(1, 1), depth=(1, 6)))
+        self.assertEqual(graph.stats.sampled_out, 2)
+        self.assertEqual(graph.stats.goal_nodes, 1)
+        self.assertTrue(all(list(graph.edge_src).count(n) <= 1 for n in range(len(graph))))
+
+    def test_max_nodes_truncation_is_counted(self):
+        s = explore_story_graph(DOMAIN, PROBLEM, make_lore(depth=(1, 6)), max_nodes=3).stats
+        self.assertEqual((s.nodes, s.truncated), (3, 1))
+
+    def test_rejects_zero_branching(self):
+        task = ground(parse_domain(DOMAIN), parse_problem(PROBLEM))
+        with self.assertRaises(ValueError):
+            StoryGraphExplorer(task, make_lore(branching=(0, 0)))
+
+    def test_jsonl_records(self):
+        task = ground(parse_domain(DOMAIN), parse_problem(PROBLEM))
+        out = io.StringIO()
+        StoryGraphExplorer(task, make_lore(depth=(1, 6))).explore(out)
+        records = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual([r["type"] for r in records].count("node"), 5)
+        self.assertEqual([r["type"] for r in records].count("edge"), 6)
+        self.assertIn("(at hero village)", records[0]["facts"])
+        first_move = next(r for r in records if r["type"] == "node" and r["id"] == 1)
+        self.assertEqual((first_move["add"], first_move["del"]), (["(at hero forest)"], ["(at hero village)"]))
+        self.assertEqual(records[-1]["type"], "summary")
+
+
+if __name__ == "__main__":
+    unittest.main()
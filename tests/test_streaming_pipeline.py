@@ -0,0 +1,99 @@
+"""Test della generazione in streaming, con risposte LLM registrate e riprodotte da fixture."""
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from interactive_story_generator import InteractiveStoryGenerator  # noqa: E402
+from llm_interface import LLMInterface  # noqa: E402
+from pddl_samples import make_lore  # noqa: E402
+from replay_llm import ReplayLLMClient  # noqa: E402
+from streaming_pipeline import ActionReady, DomainReady, GoalReady, PredicatesReady, ProblemReady  # noqa: E402
+
+PREDICATES = "(at ?c - character ?l - location)\n(item_at ?i - item ?l - location)\n(has ?c - character ?i - item)"
+ACTIONS = """(:action move
+  :parameters (?c - character ?from - location ?to - location)
+  :precondition (and (at ?c ?from) (connected ?from ?to))
+  :effect (and (not (at ?c ?from)) (at ?c ?to)))
+(:action take
+  :parameters (?c - character ?i - item ?l - location)
+  :precondition (and (at ?c ?l) (item_at ?i ?l))
+  :effect (and (has ?c ?i) (not (item_at ?i ?l))))"""
+GOAL = "(and (has hero sword))"
+
+
+class ScriptedLLM(LLMInterface):
+    """Risponde in base al tipo di prompt (predicati, azioni, goal); conta le chiamate."""
+    model = "scripted"
+
+    def __init__(self):
+        self.calls = 0
+
+    def run_prompt(self, prompt: str) -> str:
+        self.calls += 1
+        if "Azioni:" in prompt:
+            return ACTIONS
+        if "Goal:" in prompt:
+            return GOAL
+        return PREDICATES
+
+
+class StreamingGenerationTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = tmp.name
+        self.fixture = os.path.join(self.root, "fixture.json")
+        env = mock.patch.dict(os.environ, {"ARTIFACT_STORE": "0", "LORE_INDEX": "0"})
+        env.start()
+        self.addCleanup(env.stop)
+
+    def generator(self, llm: LLMInterface, name: str) -> InteractiveStoryGenerator:
+        generator = InteractiveStoryGenerator(llm=llm, output_dir=os.path.join(self.root, name), stream=True)
+        generator.current_lore = make_lore()
+        return generator
+
+    def test_replayed_stream_matches_recording(self):
+        scripted = ScriptedLLM()
+        recorder = self.generator(ReplayLLMClient(self.fixture, scripted, mode="record"), "record")
+        recorder.generate_initial_pddl()
+        self.assertGreater(scripted.calls, 0)
+
+        replay = ReplayLLMClient(self.fixture, nearest=False)
+        generator = self.generator(replay, "replay")
+        events = list(generator.stream_initial_pddl())
+        self.assertEqual(replay.stats()["misses"], 0)
+        self.assertEqual(generator.current_domain, recorder.current_domain)
+        self.assertEqual(generator.current_problem, recorder.current_problem)
+
+        kinds = [type(e) for e in events]
+        self.assertEqual(kinds.count(ActionReady), 2)
+        for kind in (PredicatesReady, GoalReady, DomainReady, ProblemReady):
+            self.assertIn(kind, kinds)
+        self.assertEqual([e.issues for e in events if isinstance(e, (DomainReady, ProblemReady))], [[], []])
+        self.assertIn("(:action take", generator.current_domain)
+        self.assertIn("(has hero sword)", generator.current_problem)
+
+    def test_builder_adopts_pipeline_results(self):
+        scripted = ScriptedLLM()
+        generator = self.generator(scripted, "adopt")
+        manager = generator.template_manager
+        with mock.patch.object(manager, "write_problem", wraps=manager.write_problem) as write_problem, \
+                mock.patch.object(manager, "_build_domain", wraps=manager._build_domain) as build_domain:
+            generator.generate_initial_pddl()
+            calls = scripted.calls
+            domain, problem_path = generator.builder.build()
+        # Dominio e problema assemblati una sola volta, dalla pipeline (l'altra chiamata è il
+        # dominio senza azioni usato per controllare le azioni una alla volta)
+        self.assertEqual(write_problem.call_count, 1)
+        self.assertEqual([call.args[1] != [] for call in build_domain.call_args_list].count(True), 1)
+        self.assertEqual(generator.builder.graph.rebuilt, [])
+        self.assertEqual(domain, generator.current_domain)
+        self.assertEqual(problem_path, os.path.join(generator.output_dir, "problem.pddl"))
+        self.assertEqual(scripted.calls, calls)
+
+if __name__ == "__main__":
+    unittest.main()
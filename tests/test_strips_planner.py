@@ -0,0 +1,82 @@
+"""Test del planner integrato (GBFS/A*), delle euristiche rilassate e di find_plan con engine builtin."""
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from grounding import ground  # noqa: E402
+from pddl_parser import parse_domain, parse_problem  # noqa: E402
+from pddl_samples import DOMAIN, PLAN, PROBLEM, UNSOLVABLE_PROBLEM  # noqa: E402
+from strips_planner import INF, PlannerBudgetExceeded, RelaxedHeuristic, plan_from_text, search  # noqa: E402
+from validation import find_plan  # noqa: E402
+
+
+def ground_text(domain_text: str, problem_text: str):
+    return ground(parse_domain(domain_text), parse_problem(problem_text))
+
+
+class HeuristicTest(unittest.TestCase):
+    def test_values_on_initial_state(self):
+        task = ground_text(DOMAIN, PROBLEM)
+        relaxed = RelaxedHeuristic(task)
+        # (has hero sword) costa 3 (due spostamenti e la presa), (at hero forest) 1
+        self.assertEqual(relaxed.h_max(task.init), 3)
+        self.assertEqual(relaxed.h_add(task.init), 4)
+        self.assertEqual(relaxed.h_ff(task.init), 3)  # il primo spostamento serve a entrambi i goal
+
+    def test_goal_state_and_dead_end(self):
+        task = ground_text(DOMAIN, PROBLEM)
+        state = task.init
+        for label in PLAN:
+            state = task.apply(state, task.actions[task.action_by_label()[label]])
+        self.assertTrue(task.is_goal(state))
+        self.assertEqual(RelaxedHeuristic(task).h_ff(state), 0)
+
+        unsolvable = ground_text(DOMAIN, UNSOLVABLE_PROBLEM)
+        self.assertEqual(RelaxedHeuristic(unsolvable).h_max(unsolvable.init), INF)
+
+
+class SearchTest(unittest.TestCase):
+    def test_astar_finds_optimal_plan(self):
+        self.assertEqual(plan_from_text(DOMAIN, PROBLEM, algorithm="astar", heuristic="hadd"), PLAN)
+
+    def test_gbfs_plan_reaches_goal(self):
+        plan = plan_from_text(DOMAIN, PROBLEM)
+        self.assertEqual(plan[-1], "(move hero camp forest)")
+        self.assertIn("(take hero sword camp)", plan)
+
+    def test_unsolvable_returns_none(self):
+        self.assertIsNone(plan_from_text(DOMAIN, UNSOLVABLE_PROBLEM))
+
+    def test_goal_already_true_gives_empty_plan(self):
+        self.assertEqual(plan_from_text(DOMAIN, PROBLEM.replace("(has hero sword) (at hero forest)",
+                                                                "(at hero village)")), [])
+
+    def test_budget_is_enforced(self):
+        with self.assertRaises(PlannerBudgetExceeded):
+            search(ground_text(DOMAIN, PROBLEM), max_expansions=1)
+
+
+class FindPlanBuiltinTest(unittest.TestCase):
+    def find(self, problem_text: str):
+        with tempfile.TemporaryDirectory() as tmp:
+            domain_file, problem_file = os.path.join(tmp, "domain.pddl"), os.path.join(tmp, "problem.pddl")
+            with open(domain_file, "w", encoding="utf-8") as f:
+                f.write(DOMAIN)
+            with open(problem_file, "w", encoding="utf-8") as f:
+                f.write(problem_text)
+            return find_plan(domain_file, problem_file, engine="builtin")
+
+    def test_solvable(self):
+        plan = self.find(PROBLEM)
+        self.assertIsNotNone(plan)
+        self.assertIn("(take hero sword camp)", plan)
+
+    def test_unsolvable(self):
+        self.assertIsNone(self.find(UNSOLVABLE_PROBLEM))
+
+
+if __name__ == "__main__":
+    unittest.main()
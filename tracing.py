@@ -0,0 +1,201 @@
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from itertools import count
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+
+@dataclass
+class Span:
+    name: str
+    category: str
+    start: float            # secondi dall'inizio del tracer
+    duration: float = 0.0
+    thread: int = 0
+    span_id: int = 0
+    parent_id: Optional[int] = None
+    attrs: Dict[str, Any] = field(default_factory=dict)
+    error: Optional[str] = None
+
+
+class Tracer:
+    """
+    Raccoglie gli span delle fasi della pipeline (chiamate LLM, inferenza, riparazioni,
+    planner, iterazioni). Gli span si annidano per thread; quelli aperti nei worker
+    di un pool diventano radici sul proprio thread.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.origin = time.perf_counter()
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._ids = count(1)
+
+    def _stack(self) -> List[Span]:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    @contextmanager
+    def span(self, name: str, category: str = "pipeline", **attrs) -> Iterator[Optional[Span]]:
+        if not self.enabled:
+            yield None
+            return
+        stack = self._stack()
+        current = Span(
+            name, category, time.perf_counter() - self.origin,
+            thread=threading.get_ident(), span_id=next(self._ids),
+            parent_id=stack[-1].span_id if stack else None, attrs=dict(attrs),
+        )
+        stack.append(current)
+        try:
+            yield current
+        except BaseException as e:
+            current.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            stack.pop()
+            current.duration = time.perf_counter() - self.origin - current.start
+            with self._lock:
+                self.spans.append(current)
+
+    def record(self, name: str, category: str, duration: float, **attrs):
+        """Registra uno span già concluso (es. tempi letti dal log di un processo esterno)."""
+        if not self.enabled:
+            return
+        stack = self._stack()
+        end = time.perf_counter() - self.origin
+        with self._lock:
+            self.spans.append(Span(
+                name, category, max(0.0, end - duration), duration,
+                thread=threading.get_ident(), span_id=next(self._ids),
+                parent_id=stack[-1].span_id if stack else None, attrs=dict(attrs),
+            ))
+
+    def current(self) -> Optional[Span]:
+        stack = self._stack()
+        return stack[-1] if stack else None
+
+    def annotate(self, **attrs):
+        """Aggiunge attributi allo span aperto più interno del thread corrente."""
+        current = self.current()
+        if current is not None:
+            current.attrs.update(attrs)
+
+    def increment(self, key: str, amount: float = 1):
+        current = self.current()
+        if current is not None:
+            current.attrs[key] = current.attrs.get(key, 0) + amount
+
+    def reset(self):
+        with self._lock:
+            self.spans = []
+        self.origin = time.perf_counter()
+
+    def summary(self) -> List[Dict[str, Any]]:
+        """Aggrega gli span per nome: numero, tempo totale/medio/massimo e somma dei token."""
+        with self._lock:
+            spans = list(self.spans)
+        groups: Dict[str, List[Span]] = {}
+        for s in spans:
+            groups.setdefault(s.name, []).append(s)
+        rows = []
+        for name, group in groups.items():
+            durations = sorted(s.duration for s in group)
+            rows.append({
+                "name": name,
+                "category": group[0].category,
+                "count": len(group),
+                "total": sum(durations),
+                "mean": sum(durations) / len(durations),
+                "p95": durations[min(len(durations) - 1, int(0.95 * len(durations)))],
+                "max": durations[-1],
+                "errors": sum(1 for s in group if s.error),
+                "retries": sum(s.attrs.get("retries", 0) for s in group),
+                "prompt_tokens": sum(s.attrs.get("prompt_tokens", 0) for s in group),
+                "completion_tokens": sum(s.attrs.get("completion_tokens", 0) for s in group),
+            })
+        return sorted(rows, key=lambda r: r["total"], reverse=True)
+
+    def format_summary(self) -> str:
+        header = f"{'span':<34}{'n':>5}{'totale s':>10}{'medio s':>9}{'p95 s':>8}{'max s':>8}{'retry':>6}{'tok in':>8}{'tok out':>8}"
+        lines = [header, "-" * len(header)]
+        for r in self.summary():
+            lines.append(
+                f"{r['name'][:33]:<34}{r['count']:>5}{r['total']:>10.3f}{r['mean']:>9.3f}{r['p95']:>8.3f}"
+                f"{r['max']:>8.3f}{r['retries']:>6}{r['prompt_tokens']:>8}{r['completion_tokens']:>8}"
+            )
+        return "\n".join(lines)
+
+    def print_summary(self):
+        if self.spans:
+            print("\n⏱️ Tempi per fase:")
+            print(self.format_summary())
+
+    def export_json(self, path: str):
+        with self._lock:
+            data = [asdict(s) for s in self.spans]
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"spans": data, "summary": self.summary()}, f, ensure_ascii=False, indent=2, default=str)
+
+    def export_chrome_trace(self, path: str):
+        """Formato Trace Event, apribile con chrome://tracing o Perfetto."""
+        with self._lock:
+            spans = list(self.spans)
+        pid = os.getpid()
+        events = [
+            {
+                "name": s.name, "cat": s.category, "ph": "X", "pid": pid, "tid": s.thread,
+                "ts": round(s.start * 1e6), "dur": round(s.duration * 1e6),
+                "args": dict(s.attrs, **({"error": s.error} if s.error else {})),
+            }
+            for s in spans
+        ]
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f, ensure_ascii=False, default=str)
+
+    def export(self, directory: str, prefix: str = "trace"):
+        self.export_json(os.path.join(directory, f"{prefix}.json"))
+        self.export_chrome_trace(os.path.join(directory, f"{prefix}.chrome.json"))
+
+
+_tracer = Tracer(enabled=os.getenv("PIPELINE_TRACE", "1") not in ("0", "false", "no"))
+
+
+def get_tracer() -> Tracer:
+    return _tracer
+
+
+def span(name: str, category: str = "pipeline", **attrs):
+    return _tracer.span(name, category, **attrs)
+
+
+def record(name: str, category: str, duration: float, **attrs):
+    _tracer.record(name, category, duration, **attrs)
+
+
+def annotate(**attrs):
+    _tracer.annotate(**attrs)
+
+
+def traced(name: Optional[str] = None, category: str = "pipeline") -> Callable:
+    """Decoratore: esegue la funzione dentro uno span (di default col nome qualificato)."""
+    def decorator(func: Callable) -> Callable:
+        span_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with _tracer.span(span_name, category):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -2,10 +2,20 @@
 from pathlib import Path
 import os
 
-def write_to_file(content: str, filename: str) -> bool:
+_env_loaded = False
+
+def load_env() -> None:
+    """Carica le variabili da .env una sola volta per processo (dotenv importato solo qui)."""
+    global _env_loaded
+    if not _env_loaded:
+        from dotenv import load_dotenv
+        load_dotenv()
+        _env_loaded = True
+
+def write_to_file(content: str, filename: str, output_dir: str = "output") -> bool:
     try:
-        os.makedirs("output", exist_ok=True)
-        full_path = Path("output") / filename
+        os.makedirs(output_dir, exist_ok=True)
+        full_path = Path(output_dir) / filename
         full_path.write_text(content.strip(), encoding='utf-8')
         print(f"📂 File salvato: {full_path}")
         return True
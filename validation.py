@@ -1,66 +1,142 @@
 # validation.py (run_fast_downward + validate_pddl_syntax)
 import os
-import subprocess
-from pathlib import Path
+import time
 from typing import List, Optional
 from lore import LoreDocument
+from pddl_parser import Issue, PDDLParseError, check_domain, check_problem, parse_domain, parse_problem, parse_sexpr
+from grounding import GroundingError
+from strips_planner import PlannerBudgetExceeded, plan_from_text
+from utils import read_file
+from planner_runner import PlannerRunner
+from plan_validator import validate_plan
+from artifact_store import ArtifactStore
 
 def validate_pddl_syntax(pddl_content: str) -> bool:
-    """Controlla se il contenuto PDDL ha parentesi bilanciate e contiene 'define'."""
-    return "(define" in pddl_content and pddl_content.count('(') == pddl_content.count(')')
+    """Controlla che il contenuto PDDL sia un (define ...) sintatticamente ben formato."""
+    try:
+        expr = parse_sexpr(pddl_content)
+    except PDDLParseError:
+        return False
+    return expr[:1] == ["define"]
+
+def find_pddl_issues(domain_content: str, problem_content: str) -> List[Issue]:
+    """
+    Analizza dominio e problema con il parser PDDL e restituisce gli errori semantici
+    (predicati non dichiarati, arità errate, variabili/oggetti sconosciuti), localizzati
+    sul componente (azione, goal, init...).
+    """
+    try:
+        domain = parse_domain(domain_content)
+    except PDDLParseError as e:
+        return [Issue("domain", "", f"Dominio: {e}")]
+    try:
+        problem = parse_problem(problem_content)
+    except PDDLParseError as e:
+        return [Issue("goal", "", f"Problema: {e}")]
+    return check_domain(domain) + check_problem(problem, domain)
 
-def run_fast_downward(domain_file: str, problem_file: str, timeout: int = 30, lore: Optional[LoreDocument] = None) -> Optional[List[str]]:
+def run_fast_downward(domain_file: str, problem_file: str, timeout: int = 30, lore: Optional[LoreDocument] = None,
+                      runner: Optional[PlannerRunner] = None, portfolio: bool = False,
+                      improve: bool = False) -> Optional[List[str]]:
     """
     Esegue Fast Downward per risolvere il problema PDDL.
+    Con portfolio=True lancia in parallelo più configurazioni e tiene il primo piano trovato
+    (o il più corto entro il timeout, con improve=True).
     Ritorna lista di azioni se successo, None altrimenti.
     """
-    output_dir = Path("output")
-    plan_file = output_dir / "sas_plan"
-
     domain_path = os.path.abspath(domain_file)
     problem_path = os.path.abspath(problem_file)
-    fd_script_path = "C:/Users/Alessandro/fast_downward/downward/fast-downward.py"
+    runner = runner or PlannerRunner()
 
     try:
-        if plan_file.exists():
-            plan_file.unlink()
-
         if not os.path.exists(domain_path) or not os.path.exists(problem_path):
             print(f"❌ File PDDL mancanti:\n  ➤ {domain_path}\n  ➤ {problem_path}")
             return None
 
-        # Esegui Fast Downward
-        print(f"🔍 Eseguo Fast Downward da: {fd_script_path}")
+        # Esegui Fast Downward in una cartella temporanea dedicata
+        print(f"🔍 Eseguo Fast Downward: {' '.join(runner.command)}")
+        if portfolio:
+            result = runner.run_portfolio(read_file(domain_path), read_file(problem_path),
+                                          timeout=timeout, improve=improve)
+            if result.plan:
+                print(f"🏁 Piano trovato dalla configurazione '{result.config}' in {result.elapsed:.1f}s")
+        else:
+            result = runner.run_files(domain_path, problem_path, timeout=timeout)
 
-        result = subprocess.run(
-            [
-                "python", fd_script_path,
-                domain_path,
-                problem_path,
-                "--search", "astar(lmcut())"
-            ],
-            cwd=".",
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            timeout=timeout,
-            text=True
-        )
-
-        if not plan_file.exists():
-            print("⚠️ Fast Downward non ha generato un piano.")
+        if not result.plan:
+            reason = "timeout" if result.timed_out else f"exit {result.returncode}"
+            print(f"⚠️ Fast Downward non ha generato un piano ({reason}, {result.elapsed:.1f}s).")
             print("STDOUT:\n", result.stdout)
             print("STDERR:\n", result.stderr)
             return None
 
-        plan_lines = plan_file.read_text(encoding="utf-8").splitlines()
-        actions = [line.strip() for line in plan_lines if line and not line.startswith(";")]
-
-        # Salva anche output/plan.txt
-        plan_txt = output_dir / "plan.txt"
-        plan_txt.write_text("\n".join(actions), encoding="utf-8")
+        # Il piano scritto dal planner esterno viene riverificato in-process
+        try:
+            check = validate_plan(read_file(domain_path), read_file(problem_path), result.plan,
+                                  check_branching=False)
+            if not check.valid:
+                print("❌ Il piano di Fast Downward non supera la validazione:")
+                for error in check.errors:
+                    print(f"  ➤ {error}")
+                return None
+        except (PDDLParseError, GroundingError) as e:
+            print(f"↪️ Validazione del piano saltata ({e}).")
 
-        return actions if actions else None
+        return result.plan
 
     except Exception as e:
         print(f"❌ Errore durante esecuzione Fast Downward: {e}")
         return None
+
+def find_plan(domain_file: str, problem_file: str, timeout: int = 30, lore: Optional[LoreDocument] = None,
+              engine: Optional[str] = None, builtin_time_limit: float = 5.0,
+              max_ground_actions: int = 20000, portfolio: bool = True,
+              improve: bool = False, store: Optional[ArtifactStore] = None) -> Optional[List[str]]:
+    """
+    Cerca un piano con il motore scelto ("builtin" o "fast_downward", default da PLANNER_ENGINE).
+    Il planner integrato lavora in-process sul testo PDDL; se il dominio non è STRIPS puro
+    o supera il budget di dimensione/tempo si ripiega su Fast Downward.
+    Con uno store, una coppia dominio/problema già risolta (a meno di spazi e ordinamento)
+    restituisce subito l'esito memorizzato; ogni nuovo esito viene archiviato.
+    """
+    domain_text, problem_text = read_file(domain_file), read_file(problem_file)
+    if store is not None:
+        known = store.get(domain_text, problem_text)
+        if known is not None and known.conclusive:
+            print(f"📦 Esito già noto per questa coppia dominio/problema ({known.key[:12]}): {known.status}")
+            return known.plan or None
+
+    start = time.perf_counter()
+    status, engine_used = "failed", engine or os.getenv("PLANNER_ENGINE", "builtin")
+    plan = None
+    if engine_used == "builtin":
+        try:
+            plan = plan_from_text(
+                domain_text, problem_text,
+                max_ground_actions=max_ground_actions,
+                time_limit=min(builtin_time_limit, timeout),
+            )
+            if plan is None:
+                print("⚠️ Il planner integrato ha dimostrato che il problema non ha soluzione.")
+                status = "unsolvable"
+            elif not plan:
+                print("⚠️ Il goal è già soddisfatto nello stato iniziale: piano vuoto.")
+            else:
+                status = "solved"
+            plan = plan or None
+        except (PDDLParseError, GroundingError, PlannerBudgetExceeded) as e:
+            print(f"↪️ Planner integrato non applicabile ({e}), passo a Fast Downward.")
+            engine_used = "fast_downward"
+
+    if engine_used != "builtin":
+        plan = run_fast_downward(domain_file, problem_file, timeout=timeout, lore=lore,
+                                 portfolio=portfolio, improve=improve)
+        status = "solved" if plan else "failed"  # senza piano può essere un timeout: non è un esito definitivo
+
+    if store is not None:
+        stored = store.put(domain_text, problem_text, plan, status, lore=lore, stats={
+            "engine": engine_used, "elapsed": round(time.perf_counter() - start, 3),
+            "plan_length": len(plan) if plan else 0,
+        })
+        print(f"📦 Artefatti archiviati in {stored.path}")
+    return plan
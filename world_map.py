@@ -0,0 +1,61 @@
+import math
+import random
+from typing import Iterator, Tuple
+
+from lore import LoreDocument
+
+
+def iter_connections(lore: LoreDocument) -> Iterator[Tuple[str, str]]:
+    """
+    Archi (da, a) della mappa della lore, generati uno alla volta: memoria costante oltre
+    alla lore stessa e tempo lineare nel numero di luoghi e archi, senza duplicati.
+    """
+    locations = [l.strip() for l in lore.locations]
+    topology = lore.topology
+    both = topology.bidirectional
+    if topology.kind == "chain":
+        for a, b in zip(locations, locations[1:]):
+            yield a, b
+            if both:
+                yield b, a
+    elif topology.kind == "adjacency":
+        adjacency = {a.strip(): [b.strip() for b in bs] for a, bs in topology.adjacency.items()}
+        for a, neighbours in adjacency.items():
+            for b in dict.fromkeys(neighbours):
+                yield a, b
+                # Il verso opposto solo se la lista di b non lo dichiara già
+                if both and a not in adjacency.get(b, ()):
+                    yield b, a
+    elif topology.kind == "grid":
+        n = len(locations)
+        width = topology.width or max(1, math.ceil(math.sqrt(n)))
+        for i, a in enumerate(locations):
+            for j in ((i + 1) if (i + 1) % width else n, i + width):
+                if j < n:
+                    yield a, locations[j]
+                    if both:
+                        yield locations[j], a
+    else:
+        # Albero casuale (connesso) più archi extra: ogni arco è emesso dal suo estremo di
+        # indice maggiore, così i duplicati si scartano localmente, senza insiemi globali
+        rng = random.Random(topology.seed)
+        whole, fraction = divmod(topology.extra_edges, 1)
+        for i in range(1, len(locations)):
+            targets = {rng.randrange(i)}
+            extra = int(whole) + (rng.random() < fraction)
+            for _ in range(min(extra, i - 1)):
+                targets.add(rng.randrange(i))
+            for j in sorted(targets):
+                yield locations[i], locations[j]
+                if both:
+                    yield locations[j], locations[i]
+
+
+def iter_placements(lore: LoreDocument) -> Iterator[Tuple[str, str]]:
+    """(entità, luogo) iniziali: prima i personaggi, poi gli oggetti."""
+    placements = {e.strip(): l.strip() for e, l in lore.placements.items()}
+    start, end = lore.locations[0].strip(), lore.locations[-1].strip()
+    for c in lore.characters:
+        yield c.strip(), placements.get(c.strip(), start)
+    for i in lore.items:
+        yield i.strip(), placements.get(i.strip(), end)